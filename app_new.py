@@ -10,11 +10,12 @@ os.environ["CREWAI_DISABLE_TELEMETRY"] = "true"
 os.environ["OTEL_SDK_DISABLED"] = "true"
 os.environ["CREWAI_TRACING_ENABLED"] = "false"
 
+import html
 import json
 import time
 from pathlib import Path
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import streamlit as st
 from dotenv import load_dotenv
@@ -32,9 +33,45 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 CREWAI_STORE = (DATA_DIR / "crewai_memory").resolve()
 os.environ["CREWAI_STORAGE_DIR"] = str(CREWAI_STORE)
-
-from src.ml_learning_assistant.crew import MLLearningAssistantCrew
-from src.ml_learning_assistant.tools.upload_to_chromadb import upload_document_to_chromadb
+os.environ.setdefault("TRACE_FILE", str(DATA_DIR / "traces" / "spans.jsonl"))
+os.environ.setdefault("CATALOG_DB_PATH", str(DATA_DIR / "catalog" / "catalog.db"))
+os.environ.setdefault("RESEARCH_NOTES_DB_PATH", str(DATA_DIR / "notes" / "notes.db"))
+
+from src.ml_learning_assistant.catalog import SourceCatalog, get_catalog
+from src.ml_learning_assistant.jobs import JobQueue
+from src.ml_learning_assistant.lazy import Preloader
+from src.ml_learning_assistant.memory_maintenance import MemoryMaintainer
+from src.ml_learning_assistant.model_lifecycle import ModelLifecycle
+from src.ml_learning_assistant.quiz_schema import parse_quiz_json
+from src.ml_learning_assistant.speculation import QuizSpeculator
+from src.ml_learning_assistant.tools.upload_to_chromadb import save_upload_stream
+from src.ml_learning_assistant.metrics import (
+    CHROMA_SECONDS,
+    JOBS,
+    LLM_STAGE_TOKENS,
+    LLM_TOKENS,
+    MEMORY_LOOKUP_SECONDS,
+    MODEL_GEN_SECONDS,
+    MODEL_LOAD_SECONDS,
+    REQUESTS,
+    SPECULATIONS,
+    STAGE_SECONDS,
+    cache_hit_ratio,
+    record_cache,
+    start_metrics_server,
+)
+from src.ml_learning_assistant.tracing import load_traces, span_depths
+from src.ml_learning_assistant.vector_store import configured_location
+if TYPE_CHECKING:
+    from src.ml_learning_assistant.crew import MLLearningAssistantCrew
+from src.ml_learning_assistant.tenancy import (
+    TenantQuotaExceeded,
+    check_quota,
+    collection_name_for,
+    get_collection,
+    normalize_tenant_id,
+    tenant_dir,
+)
 
 APP_STATE_DIR = DATA_DIR / "ui_state"
 APP_STATE_DIR.mkdir(parents=True, exist_ok=True)
@@ -44,6 +81,9 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 UPLOADED_TRACK_FILE = APP_STATE_DIR / "uploaded_docs.json"
 
+# Chroma status is cached this long instead of re-queried on every rerun
+CHROMA_STATUS_TTL = float(os.getenv("CHROMA_STATUS_TTL", "15"))
+
 # Page config with custom theme
 st.set_page_config(
     page_title="ML Learning Assistant",
@@ -443,33 +483,121 @@ code {
 </style>
 """, unsafe_allow_html=True)
 
+# Tenancy: every browser session maps to one tenant (workspace)
+# ?tenant=... lets anyone pick a workspace from the URL, so it is for local development only
+TENANT_FROM_QUERY = os.getenv("TENANT_FROM_QUERY", "false").lower() == "true"
+
+def resolve_tenant_id() -> str:
+    """Tenant for this session: logged-in user > TENANT_ID env > default (?tenant=... first with TENANT_FROM_QUERY)."""
+    if "tenant_id" not in st.session_state:
+        tenant = st.query_params.get("tenant") if TENANT_FROM_QUERY else None
+        if not tenant:
+            try:
+                if st.user.is_logged_in:
+                    tenant = st.user.get("email")
+            except Exception:
+                tenant = None
+        st.session_state.tenant_id = normalize_tenant_id(tenant or os.getenv("TENANT_ID"))
+    return st.session_state.tenant_id
+
+def _uploaded_track_file(tenant_id: str) -> Path:
+    if tenant_id == normalize_tenant_id(None):
+        return UPLOADED_TRACK_FILE
+    return tenant_dir(APP_STATE_DIR, tenant_id) / "uploaded_docs.json"
+
 # Utility functions remain the same
-def _load_uploaded_docs() -> list[str]:
-    if UPLOADED_TRACK_FILE.exists():
+def _load_uploaded_docs(tenant_id: str) -> list[str]:
+    track_file = _uploaded_track_file(tenant_id)
+    if track_file.exists():
         try:
-            return json.loads(UPLOADED_TRACK_FILE.read_text(encoding="utf-8"))
+            return json.loads(track_file.read_text(encoding="utf-8"))
         except Exception:
             return []
     return []
 
-def _save_uploaded_docs(docs: list[str]) -> None:
+def _save_uploaded_docs(docs: list[str], tenant_id: str) -> None:
     try:
-        UPLOADED_TRACK_FILE.write_text(json.dumps(sorted(list(set(docs))), indent=2), encoding="utf-8")
+        _uploaded_track_file(tenant_id).write_text(json.dumps(sorted(list(set(docs))), indent=2), encoding="utf-8")
     except Exception:
         pass
 
 @st.cache_resource
-def get_crew() -> MLLearningAssistantCrew:
-    return MLLearningAssistantCrew()
+def get_crew_preloader() -> Preloader:
+    return Preloader(thread_name_prefix="crew-warmup")
+
+def _build_crew(tenant_id: str) -> MLLearningAssistantCrew:
+    # crewai / MCP are imported here, not when the app module loads
+    from src.ml_learning_assistant.crew import MLLearningAssistantCrew
+    return MLLearningAssistantCrew(tenant_id=tenant_id)
+
+def warm_crew(tenant_id: str) -> None:
+    """Start building the tenant's crew in the background (first render does not wait)."""
+    get_crew_preloader().submit(tenant_id, lambda: _build_crew(tenant_id))
+
+def get_crew(tenant_id: str) -> MLLearningAssistantCrew:
+    return get_crew_preloader().get(tenant_id, lambda: _build_crew(tenant_id))
+
+def _record_indexed_doc(job: dict) -> None:
+    """Job-queue hook: runs in a worker thread when an indexing job finishes."""
+    _index_summary_cache().pop(job["tenant_id"], None)
+    docs = _load_uploaded_docs(job["tenant_id"])
+    if job["filename"] not in docs:
+        docs.append(job["filename"])
+        _save_uploaded_docs(docs, job["tenant_id"])
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    return JobQueue(str(DATA_DIR / "jobs" / "jobs.db"), on_complete=_record_indexed_doc).start()
+
+@st.cache_resource
+def get_metrics_server():
+    return start_metrics_server()
+
+@st.cache_resource
+def get_model_lifecycle() -> ModelLifecycle | None:
+    """Warm the Ollama chat/embedding models in the background and keep them loaded."""
+    if os.getenv("OLLAMA_WARMUP", "true").strip().lower() == "false":
+        return None
+    return ModelLifecycle.from_env().start()
+
+@st.cache_resource
+def get_quiz_speculator() -> QuizSpeculator:
+    # its own crews: the foreground crew may be answering at the same time
+    return QuizSpeculator(crew_factory=_build_crew)
+
+def speculation_key() -> str:
+    """Speculated quizzes belong to the current chat session of this workspace."""
+    return f"{resolve_tenant_id()}:{st.session_state.current_session_id}"
+
+@st.cache_resource
+def get_memory_maintainer() -> MemoryMaintainer | None:
+    """Cap and compact the CrewAI memory stores at startup and periodically."""
+    if os.getenv("CREW_MEMORY", "true").strip().lower() == "false":
+        return None
+    return MemoryMaintainer(str(CREWAI_STORE)).start()
+
+@st.cache_resource
+def get_source_catalog() -> SourceCatalog:
+    return get_catalog().start_reconciler(tenants=[resolve_tenant_id()])
+
+@st.cache_resource
+def _index_summary_cache() -> dict:
+    """tenant -> (fetched_at, summary); shared across reruns and sessions."""
+    return {}
 
 def reset_crew():
-    try:
-        c = get_crew()
-        if hasattr(c, "close"):
-            c.close()
-    except Exception:
-        pass
-    st.cache_resource.clear()
+    # only the crews (and the warmed models, which depend on the provider) are
+    # rebuilt; the job queue, metrics server and catalog keep running
+    old = get_crew_preloader()
+    get_crew_preloader.clear()
+    # every tenant's crew goes, so close them all, not only this session's;
+    # crews still being built are closed as soon as they finish
+    old.shutdown(on_result=lambda c: c.close() if hasattr(c, "close") else None)
+    get_quiz_speculator().close()
+    lifecycle = get_model_lifecycle()
+    if lifecycle is not None:
+        lifecycle.stop()
+    get_model_lifecycle.clear()
 
 def get_file_icon(filename: str) -> str:
     ext = Path(filename).suffix.lower()
@@ -484,86 +612,37 @@ def get_file_icon(filename: str) -> str:
     }
     return icons.get(ext, "📄")
 
-def _extract_json_object(text: str) -> str:
-    if not text:
-        return ""
-    s = text.strip()
-    if s.startswith("{") and s.endswith("}"):
-        return s
-    a = s.find("{")
-    b = s.rfind("}")
-    if a != -1 and b != -1 and b > a:
-        return s[a : b + 1]
-    return s
-
-def validate_quiz_schema(obj: dict, expected_n: int) -> tuple[bool, str]:
-    if not isinstance(obj, dict):
-        return False, "Quiz JSON is not an object."
-    if obj.get("num_questions") != expected_n:
-        return False, f"num_questions mismatch"
-    qs = obj.get("questions")
-    if not isinstance(qs, list) or len(qs) != expected_n:
-        return False, f"questions length mismatch"
-    for i, q in enumerate(qs, start=1):
-        if not isinstance(q, dict):
-            return False, f"Question {i} is not an object"
-        if q.get("id") != i:
-            return False, f"Question id mismatch at {i}"
-        if not isinstance(q.get("choices"), dict):
-            return False, f"choices not dict at {i}"
-        for k in ["A", "B", "C", "D"]:
-            if k not in q["choices"] or not q["choices"][k].strip():
-                return False, f"Invalid choice {k} at {i}"
-        if q.get("answer") not in ["A", "B", "C", "D"]:
-            return False, f"Invalid answer at {i}"
-        if not q.get("question", "").strip():
-            return False, f"Missing question text at {i}"
-        if not q.get("explanation", "").strip():
-            return False, f"Missing explanation at {i}"
-    return True, "OK"
-
-def parse_quiz_json(raw: str, expected_n: int) -> tuple[dict | None, str | None]:
-    if not raw:
-        return None, "Empty quiz output"
-    candidate = _extract_json_object(raw)
-    try:
-        obj = json.loads(candidate)
-    except Exception as e:
-        return None, f"Invalid JSON: {e}"
-    ok, reason = validate_quiz_schema(obj, expected_n)
-    if not ok:
-        return None, f"Schema invalid: {reason}"
-    return obj, None
-
-def get_chroma_index_summary():
-    host = os.getenv("CHROMA_HOST", "localhost")
-    port = int(os.getenv("CHROMA_PORT", "8000"))
-    collection_name = os.getenv("CHROMA_COLLECTION", "ml_materials")
+def get_chroma_index_summary(tenant_id: str | None = None):
+    tenant_id = tenant_id or resolve_tenant_id()
+    cache = _index_summary_cache()
+    cached = cache.get(tenant_id)
+    if cached and time.time() - cached[0] < CHROMA_STATUS_TTL:
+        record_cache("chroma_status", True)
+        return cached[1]
+    record_cache("chroma_status", False)
+
+    collection_name = collection_name_for(tenant_id)
     try:
-        import chromadb
-        client = chromadb.HttpClient(host=host, port=port)
-        col = client.get_or_create_collection(name=collection_name)
-        n = col.count()
-        sources = []
-        try:
-            got = col.get(include=["metadatas"], limit=min(50, max(1, n)))
-            for md in got.get("metadatas", []) or []:
-                if isinstance(md, dict) and md.get("source"):
-                    sources.append(md["source"])
-            sources = sorted(list(set(sources)))
-        except Exception:
-            sources = []
-        return {"ok": True, "collection": collection_name, "count": n, "sources": sources[:25], "error": None}
+        col = get_collection(tenant_id)
+        with CHROMA_SECONDS.time(op="count"):
+            n = col.count()
+        # per-source statistics come from the ingestion catalog, not a collection scan
+        sources = get_source_catalog().list_sources(tenant_id)
+        summary = {"ok": True, "collection": collection_name, "count": n, "sources": sources, "error": None}
     except Exception as e:
+        # failures are not cached, so the page recovers as soon as Chroma is back
         return {"ok": False, "collection": collection_name, "count": None, "sources": [], "error": str(e)}
+    cache[tenant_id] = (time.time(), summary)
+    return summary
 
 # Session state
 def init_session_state():
+    tenant_id = resolve_tenant_id()
     defaults = {
         "page": "chat",
         "sessions": {},
         "current_session_id": None,
-        "uploaded_docs": _load_uploaded_docs(),
+        "uploaded_docs": _load_uploaded_docs(tenant_id),
         "total_questions": 0,
         "total_quizzes": 0,
         "quiz_topic": "gradient descent",
@@ -574,6 +653,7 @@ def init_session_state():
         "quiz_submitted": False,
         "quiz_score": None,
         "llm_provider": os.getenv("ACTIVE_LLM_PROVIDER", "ollama"),
+        "quiz_speculation": get_quiz_speculator().enabled,
     }
     for k, v in defaults.items():
         if k not in st.session_state:
@@ -654,7 +734,14 @@ def render_sidebar():
             time.sleep(0.5)
             st.rerun()
 
-        st.caption(f"Collection: `{os.getenv('CHROMA_COLLECTION', 'ml_materials')}`")
+        st.toggle(
+            "⚡ Pre-generate quizzes",
+            key="quiz_speculation",
+            help="After an answer, prepare a quiz on the same topic in the background while the system is idle.",
+        )
+
+        st.caption(f"Workspace: `{resolve_tenant_id()}`")
+        st.caption(f"Collection: `{collection_name_for(resolve_tenant_id())}`")
 
         st.markdown("---")
 
@@ -749,13 +836,23 @@ def render_chat_page():
         with st.chat_message("assistant"):
             with st.spinner("🔍 Analyzing your question..."):
                 try:
-                    crew = get_crew()
+                    crew = get_crew(resolve_tenant_id())
+                    speculator = get_quiz_speculator()
+                    notes = {}
                     t0 = time.time()
-                    ans = crew.ask_question(query=prompt, topic=prompt)
+                    with speculator.foreground():
+                        ans = crew.ask_question(
+                            query=prompt, topic=prompt, on_research=lambda n: notes.update(text=n)
+                        )
                     dt = time.time() - t0
                     st.markdown(ans)
                     st.caption(f"⏱️ Response time: {dt:.1f}s")
                     add_message("assistant", ans)
+                    if st.session_state.quiz_speculation and notes.get("text") and not ans.startswith(("❌", "⏳", "⏱️", "🔌")):
+                        speculator.submit(
+                            speculation_key(), prompt, int(st.session_state.quiz_num_questions), notes["text"],
+                            resolve_tenant_id(),
+                        )
                 except Exception as e:
                     msg = f"❌ Error: {str(e)[:200]}"
                     st.error(msg)
@@ -809,50 +906,30 @@ def render_upload_page():
                     st.markdown(f"{icon} **{f.name}** ({size_kb:.1f} KB)")
 
             if st.button("🚀 Index All Files", use_container_width=True, type="primary"):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                ok = 0
-                total_chunks = 0
-
-                for idx, uf in enumerate(files):
-                    progress = (idx + 1) / len(files)
-                    progress_bar.progress(progress)
-                    status_text.text(f"Processing {idx + 1}/{len(files)}: {uf.name}")
-
-                    path = UPLOAD_DIR / uf.name
-                    path.write_bytes(uf.getbuffer())
-
-                    with st.spinner(f"Indexing {uf.name}..."):
-                        res = upload_document_to_chromadb(str(path))
-
-                    if res.get("success"):
-                        ok += 1
-                        total_chunks += int(res.get("chunks", 0))
-                        if uf.name not in st.session_state.uploaded_docs:
-                            st.session_state.uploaded_docs.append(uf.name)
-
-                        icon = get_file_icon(uf.name)
-                        pages_label = "Slides" if uf.name.endswith(".pptx") else "Pages" if uf.name.endswith(".pdf") else "Rows" if uf.name.endswith(".csv") else "Sections"
-                        st.success(
-                            f"✅ {icon} **{uf.name}** • "
-                            f"{pages_label}: {res.get('pages')} • "
-                            f"Chunks: {res.get('chunks')}"
-                        )
-                    else:
-                        st.error(f"❌ {uf.name} • {res.get('message')}")
-
-                _save_uploaded_docs(st.session_state.uploaded_docs)
-                progress_bar.progress(1.0)
-                status_text.empty()
+                tenant_id = resolve_tenant_id()
+                tenant_upload_dir = tenant_dir(UPLOAD_DIR, tenant_id)
+                new_docs = [f.name for f in files if f.name not in st.session_state.uploaded_docs]
+                try:
+                    check_quota(tenant_id, new_chunks=0, current_chunks=0,
+                                new_documents=len(new_docs),
+                                current_documents=len(st.session_state.uploaded_docs))
+                except TenantQuotaExceeded as e:
+                    st.error(f"❌ {e}")
+                    st.stop()
+
+                queue = get_job_queue()
+                for uf in files:
+                    path = tenant_upload_dir / uf.name
+                    save_upload_stream(uf, path)
+                    queue.enqueue(str(path), tenant_id=tenant_id)
 
-                if ok == len(files):
-                    st.balloons()
                 st.success(
-                    f"🎉 **Indexing Complete!** • "
-                    f"Success: {ok}/{len(files)} • "
-                    f"Total Chunks: {total_chunks}"
+                    f"📥 **Queued {len(files)} file(s) for indexing** • "
+                    f"You can leave this page; indexing continues in the background."
                 )
 
+        render_indexing_jobs(resolve_tenant_id())
+
         st.markdown("---")
 
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
@@ -876,7 +953,7 @@ def render_upload_page():
 
         if st.button("🗑️ Clear Document List", use_container_width=True):
             st.session_state.uploaded_docs = []
-            _save_uploaded_docs([])
+            _save_uploaded_docs([], resolve_tenant_id())
             st.success("Document list cleared")
             st.rerun()
 
@@ -898,9 +975,14 @@ def render_upload_page():
 
             if summary["sources"]:
                 with st.expander(f"📚 Indexed Sources ({len(summary['sources'])})"):
-                    for s in summary["sources"]:
-                        icon = get_file_icon(s)
-                        st.markdown(f"{icon} {s}")
+                    for src in summary["sources"]:
+                        icon = get_file_icon(src["source"])
+                        indexed = datetime.fromtimestamp(src["indexed_at"]).strftime("%Y-%m-%d %H:%M")
+                        st.markdown(f"{icon} {src['source']}")
+                        st.caption(
+                            f"Chunks: {src['chunks']} • Pages: {src['pages']} • "
+                            f"{src['bytes'] / 1024:.0f} KB • Indexed: {indexed}"
+                        )
         else:
             st.error("⚠️ Could not connect to ChromaDB")
             with st.expander("Error Details"):
@@ -922,6 +1004,31 @@ def render_upload_page():
         """)
         st.markdown('</div>', unsafe_allow_html=True)
 
+@st.fragment(run_every=float(os.getenv("JOB_POLL_SECONDS", "2")))
+def render_indexing_jobs(tenant_id: str):
+    """Polls the background queue so progress updates without a full rerun."""
+    jobs = get_job_queue().list_jobs(tenant_id, limit=10)
+    if not jobs:
+        return
+
+    st.markdown("### ⏳ Indexing Jobs")
+    state_icons = {"queued": "🕒", "running": "⚙️", "done": "✅", "failed": "❌", "cancelled": "🚫"}
+    for job in jobs:
+        icon = get_file_icon(job["filename"])
+        label = f"{state_icons.get(job['state'], '•')} {icon} **{job['filename']}** • {job['state']}"
+        if job["state"] == "running":
+            st.progress(job["progress"], text=f"{job['filename']} • batch {job['batches_done']}/{job['total_batches'] or '?'}")
+        elif job["state"] == "done":
+            name = job["filename"]
+            pages_label = "Slides" if name.endswith(".pptx") else "Pages" if name.endswith(".pdf") else "Rows" if name.endswith(".csv") else "Sections"
+            st.markdown(f"{label} • {pages_label}: {job['pages']} • Chunks: {job['chunks']}")
+            if name not in st.session_state.uploaded_docs:
+                st.session_state.uploaded_docs = _load_uploaded_docs(tenant_id)
+        elif job["state"] == "failed":
+            st.markdown(f"{label} • {job['message']}")
+        else:
+            st.markdown(label)
+
 def render_quiz_page():
     st.markdown('<div class="header-section"><h1>📝 Interactive Quiz</h1></div>', unsafe_allow_html=True)
     st.markdown(
@@ -948,27 +1055,51 @@ def render_quiz_page():
             int(st.session_state.quiz_num_questions)
         )
 
+        speculator = get_quiz_speculator()
+        spec = speculator.peek(speculation_key()) if st.session_state.quiz_speculation else None
+        if spec is not None and not st.session_state.quiz_obj:
+            col_i, col_j = st.columns([0.65, 0.35])
+            if spec.state == "ready":
+                col_i.info(f"⚡ A {spec.num_questions}-question quiz on “{spec.topic[:60]}” is ready.")
+                if col_j.button("▶️ Start it", use_container_width=True):
+                    st.session_state.quiz_topic = spec.topic
+                    st.session_state.quiz_num_questions = spec.num_questions
+                    st.session_state.quiz_generate = True
+                    st.rerun()
+            else:
+                col_i.caption(f"⏳ Preparing a quiz on “{spec.topic[:60]}” in the background...")
+                if col_j.button("✖️ Cancel", use_container_width=True):
+                    speculator.cancel(speculation_key())
+                    st.rerun()
+
         col_a, col_b = st.columns([0.65, 0.35])
         with col_a:
-            if st.button("🚀 Generate Quiz", use_container_width=True, type="primary"):
+            generate = st.button("🚀 Generate Quiz", use_container_width=True, type="primary")
+            if generate or st.session_state.pop("quiz_generate", False):
                 st.session_state.quiz_submitted = False
                 st.session_state.quiz_score = None
                 st.session_state.quiz_answers = {}
                 st.session_state.quiz_obj = None
                 st.session_state.quiz_raw_output = None
+                topic = st.session_state.quiz_topic
+                n = int(st.session_state.quiz_num_questions)
+
+                # a matching pre-generated quiz is served instantly
+                obj, err = None, "no speculative quiz"
+                raw = speculator.take(speculation_key(), topic, n)
+                if st.session_state.quiz_speculation:
+                    record_cache("quiz_speculation", raw is not None)
+                if raw is not None:
+                    obj, err = parse_quiz_json(raw, expected_n=n)
+                if err:
+                    speculator.cancel(speculation_key(), topic)
+                    with st.spinner("🧠 Generating quiz..."):
+                        crew = get_crew(resolve_tenant_id())
+                        with speculator.foreground():
+                            raw = crew.generate_quiz(topic=topic, num_questions=n)
+                    obj, err = parse_quiz_json(raw or "", expected_n=n)
+                st.session_state.quiz_raw_output = raw
 
-                with st.spinner("🧠 Generating quiz..."):
-                    crew = get_crew()
-                    raw = crew.generate_quiz(
-                        topic=st.session_state.quiz_topic,
-                        num_questions=int(st.session_state.quiz_num_questions)
-                    )
-                    st.session_state.quiz_raw_output = raw
-
-                obj, err = parse_quiz_json(
-                    st.session_state.quiz_raw_output or "",
-                    expected_n=int(st.session_state.quiz_num_questions)
-                )
                 if err:
                     st.error(f"❌ {err}")
                 else:
@@ -1088,19 +1219,190 @@ def render_quiz_page():
                 st.metric("Last Score", f"{st.session_state.quiz_score}/{st.session_state.quiz_num_questions}")
             st.markdown('</div>', unsafe_allow_html=True)
 
+SPAN_COLORS = {"llm": "#8b5cf6", "tool": "#06b6d4", "agent": "#6366f1", "memory": "#f59e0b"}
+
+def render_trace_waterfall(trace: dict) -> None:
+    """One bar per span, offset and sized relative to the whole request."""
+    total = max(trace["duration_ms"], 1e-6)
+    depths = span_depths(trace["spans"])
+    rows = []
+    for sp in trace["spans"]:
+        left = (sp["start"] - trace["start"]) * 1000 / total * 100
+        width = max(sp["duration_ms"] / total * 100, 0.4)
+        attrs = sp.get("attrs", {})
+        color = SPAN_COLORS.get(attrs.get("kind"), "#10b981")
+        extra = ""
+        if attrs.get("kind") == "llm":
+            approx = "~" if attrs.get("tokens_estimated") else ""
+            extra = f" • {approx}{attrs.get('prompt_tokens', 0)}→{approx}{attrs.get('completion_tokens', 0)} tok"
+        if attrs.get("error"):
+            extra += " • ⚠️"
+        indent = depths.get(sp["span_id"], 0) * 12
+        rows.append(
+            '<div style="display:flex;align-items:center;font-size:0.75rem;margin:2px 0;">'
+            f'<div style="width:34%;padding-left:{indent}px;white-space:nowrap;overflow:hidden;'
+            f'text-overflow:ellipsis;color:var(--text-secondary);">{html.escape(sp["name"])}{html.escape(extra)}</div>'
+            '<div style="position:relative;flex:1;height:12px;background:rgba(255,255,255,0.04);border-radius:3px;">'
+            f'<div style="position:absolute;left:{left:.2f}%;width:{width:.2f}%;height:100%;'
+            f'background:{color};border-radius:3px;"></div></div>'
+            f'<div style="width:80px;text-align:right;color:var(--text-muted);">{sp["duration_ms"] / 1000:.2f}s</div>'
+            '</div>'
+        )
+    st.markdown("".join(rows), unsafe_allow_html=True)
+
+def render_operational_metrics() -> None:
+    """Process-wide numbers from the metrics registry (also served on /metrics)."""
+    st.markdown('<div class="glass-card-strong">', unsafe_allow_html=True)
+    st.markdown("### 📈 Operational Metrics")
+
+    errors = sum(n for (_p, status), n in REQUESTS.values().items() if status == "error")
+    total = sum(REQUESTS.values().values())
+    jobs = {k[0]: int(v) for k, v in JOBS.values().items()}
+    tool_ratio = cache_hit_ratio("tool")
+    status_ratio = cache_hit_ratio("chroma_status")
+    notes_ratio = cache_hit_ratio("research_notes")
+
+    m1, m2, m3, m4, m5 = st.columns(5)
+    m1.metric("Error Rate", f"{errors / total:.0%}" if total else "—")
+    m2.metric("Queue Depth", jobs.get("queued", 0), help=f"Running: {jobs.get('running', 0)}")
+    m3.metric("Tool Cache Hits", f"{tool_ratio:.0%}" if tool_ratio is not None else "—")
+    m4.metric("Chroma Status Cache Hits", f"{status_ratio:.0%}" if status_ratio is not None else "—")
+    m5.metric("Research Notes Reuse", f"{notes_ratio:.0%}" if notes_ratio is not None else "—",
+              help="Share of research stages served from stored notes instead of re-running the researcher")
+    spec = {k[0]: int(v) for k, v in SPECULATIONS.values().items()}
+    if spec:
+        st.caption(
+            "⚡ Quiz pre-generation: "
+            + ", ".join(f"{r} {spec.get(r, 0)}" for r in ("submitted", "ready", "served", "skipped", "cancelled", "expired", "failed"))
+        )
+
+    col_a, col_b = st.columns(2, gap="large")
+    with col_a:
+        st.markdown("**Stage latency**")
+        rows = []
+        for (stage,) in sorted(STAGE_SECONDS.snapshot().keys()):
+            summ = STAGE_SECONDS.summary(stage=stage)
+            rows.append({"Stage": stage, "Count": summ["count"], "Mean (s)": round(summ["mean"], 3),
+                         "p50 (s)": round(summ["p50"], 3), "p95 (s)": round(summ["p95"], 3)})
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("No requests traced yet.")
+    with col_b:
+        st.markdown("**LLM tokens by provider**")
+        tokens = {}
+        for (provider, kind), n in LLM_TOKENS.values().items():
+            tokens.setdefault(provider, {"Provider": provider, "prompt": 0, "completion": 0})[kind] = int(n)
+        if tokens:
+            st.dataframe(list(tokens.values()), hide_index=True, use_container_width=True)
+        else:
+            st.caption("No LLM calls yet.")
+
+        st.markdown("**Generation by agent**")
+        gen_rows = []
+        for (agent,), completion in sorted(LLM_STAGE_TOKENS.values().items()):
+            summ = STAGE_SECONDS.summary(stage=f"llm:{agent}")
+            calls = summ["count"] or 1
+            gen_rows.append({"Agent": agent, "Calls": summ["count"], "Mean (s)": round(summ["mean"], 2),
+                             "Tokens / call": round(completion / calls)})
+        if gen_rows:
+            st.dataframe(gen_rows, hide_index=True, use_container_width=True)
+            st.caption("Generation limits per agent: src/ml_learning_assistant/config/llm_profiles.yaml")
+
+        st.markdown("**Chroma call latency**")
+        chroma_rows = []
+        for (op,) in sorted(CHROMA_SECONDS.snapshot().keys()):
+            summ = CHROMA_SECONDS.summary(op=op)
+            chroma_rows.append({"Op": op, "Count": summ["count"], "Mean (ms)": round(summ["mean"] * 1000, 1),
+                                "p95 (ms)": round(summ["p95"] * 1000, 1)})
+        if chroma_rows:
+            st.dataframe(chroma_rows, hide_index=True, use_container_width=True)
+
+        lifecycle = get_model_lifecycle()
+        if lifecycle is not None and lifecycle.models:
+            st.markdown("**Model warm-up (Ollama)**")
+            model_rows = []
+            for m in lifecycle.status():
+                model_rows.append({
+                    "Model": m["model"],
+                    "Kind": m["kind"],
+                    "Loaded": "✓" if m["loaded"] else "—",
+                    "Expires in (s)": m["expires_in_s"],
+                    "Load (s)": round(MODEL_LOAD_SECONDS.summary(model=m["model"], kind=m["kind"])["mean"], 2),
+                    "Generation (s)": round(MODEL_GEN_SECONDS.summary(model=m["model"], kind=m["kind"])["mean"], 3),
+                })
+            st.dataframe(model_rows, hide_index=True, use_container_width=True)
+            st.caption("Load time is measured separately from prompt + generation time.")
+    port = os.getenv("METRICS_PORT", "9108")
+    if port != "0":
+        st.caption(f"Prometheus endpoint: http://localhost:{port}/metrics")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def render_memory_store() -> None:
+    """CrewAI memory size on disk, lookup latency and the last maintenance run."""
+    st.markdown("### 🧠 Memory Store")
+    maintainer = get_memory_maintainer()
+    if maintainer is None:
+        st.caption("Crew memory is disabled (CREW_MEMORY=false).")
+        return
+
+    sizes = maintainer.sizes()
+    lookup = MEMORY_LOOKUP_SECONDS.summary(source="all")
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Memory Size", f"{sizes['total_bytes'] / (1024 * 1024):.1f} MB",
+              help=f"Long-term: {sizes['ltm_bytes'] / 1024:.0f} KB, short-term/entity: {sizes['rag_bytes'] / 1024:.0f} KB")
+    m2.metric("Long-term Entries", sizes["ltm_rows"] if sizes["ltm_rows"] is not None else "—")
+    m3.metric("Lookup p50", f"{lookup['p50'] * 1000:.0f} ms" if lookup["count"] else "—")
+    m4.metric("Lookup p95", f"{lookup['p95'] * 1000:.0f} ms" if lookup["count"] else "—",
+              help=f"{lookup['count']} memory retrievals since server start")
+
+    rows = []
+    for (source,) in sorted(MEMORY_LOOKUP_SECONDS.snapshot().keys()):
+        if source == "all":
+            continue
+        summ = MEMORY_LOOKUP_SECONDS.summary(source=source)
+        rows.append({"Store": source, "Queries": summ["count"], "Mean (ms)": round(summ["mean"] * 1000, 1),
+                     "p95 (ms)": round(summ["p95"] * 1000, 1)})
+    if rows:
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    last = maintainer.last_run
+    col_a, col_b = st.columns([0.7, 0.3])
+    with col_a:
+        if last:
+            ltm = last.get("ltm", {})
+            rag = last.get("rag", {}).get("collections", {})
+            removed = (ltm.get("deleted", 0) or 0) + sum(c.get("deleted", 0) for c in rag.values())
+            st.caption(
+                f"Last maintenance {datetime.fromtimestamp(last['at']).strftime('%H:%M:%S')}: "
+                f"removed {removed} entries in {last['seconds']}s"
+                + (" • vacuumed" if ltm.get("vacuumed") else "")
+            )
+    with col_b:
+        if st.button("🧹 Compact now", use_container_width=True):
+            with st.spinner("Compacting memory..."):
+                maintainer.run()
+            st.rerun()
+
 def render_stats_page():
     st.markdown('<div class="header-section"><h1>📊 Statistics & System Info</h1></div>', unsafe_allow_html=True)
 
     col1, col2, col3, col4 = st.columns(4)
 
+    requests = {}
+    for (pipeline, _status), n in REQUESTS.values().items():
+        requests[pipeline] = requests.get(pipeline, 0) + int(n)
+
     with col1:
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.metric("💬 Questions Asked", st.session_state.total_questions)
+        st.metric("💬 Questions Asked", requests.get("ask_question", 0),
+                  help=f"Since server start (this session: {st.session_state.total_questions})")
         st.markdown('</div>', unsafe_allow_html=True)
 
     with col2:
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.metric("📝 Quizzes Generated", st.session_state.total_quizzes)
+        st.metric("📝 Quizzes Generated", requests.get("generate_quiz", 0),
+                  help=f"Since server start (this session: {st.session_state.total_quizzes})")
         st.markdown('</div>', unsafe_allow_html=True)
 
     with col3:
@@ -1124,9 +1426,10 @@ def render_stats_page():
         config_data = {
             "LLM Provider": st.session_state.llm_provider.capitalize(),
             "Ollama URL": os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-            "ChromaDB Host": os.getenv("CHROMA_HOST", "localhost"),
-            "ChromaDB Port": os.getenv("CHROMA_PORT", "8000"),
-            "Collection": os.getenv("CHROMA_COLLECTION", "ml_materials"),
+            "Vector Store": os.getenv("VECTOR_STORE", "http"),
+            "Vector Store Location": configured_location(),
+            "Workspace": resolve_tenant_id(),
+            "Collection": collection_name_for(resolve_tenant_id()),
             "Storage Dir": os.getenv("CREWAI_STORAGE_DIR", "N/A")[:50] + "...",
         }
         for key, value in config_data.items():
@@ -1163,19 +1466,47 @@ def render_stats_page():
 
         st.markdown('<div class="glass-card" style="margin-top: 1.5rem;">', unsafe_allow_html=True)
         st.markdown("### 🗄️ ChromaDB Details")
-        chroma = get_chroma_index_summary()
         if chroma["ok"]:
             st.markdown(f"**Status:** <span class='badge-success'>✓ Connected</span>", unsafe_allow_html=True)
             st.markdown(f"**Collection:** {chroma['collection']}")
             st.markdown(f"**Total Chunks:** {chroma['count']}")
             st.markdown(f"**Unique Sources:** {len(chroma['sources'])}")
+            st.markdown(f"**Catalogued Size:** {sum(src['bytes'] for src in chroma['sources']) / (1024 * 1024):.1f} MB")
         else:
             st.error("⚠️ Not connected")
         st.markdown('</div>', unsafe_allow_html=True)
 
+    st.markdown("---")
+    render_operational_metrics()
+
+    st.markdown("---")
+    render_memory_store()
+
+    st.markdown("---")
+    st.markdown('<div class="glass-card-strong">', unsafe_allow_html=True)
+    st.markdown("### ⏱️ Request Traces")
+    traces = [t for t in load_traces(limit=30) if t["name"] in ("ask_question", "generate_quiz")]
+    if traces:
+        labels = {
+            f"{datetime.fromtimestamp(t['start']).strftime('%H:%M:%S')} • {t['name']} • {t['duration_ms'] / 1000:.1f}s": t
+            for t in traces
+        }
+        choice = st.selectbox("Trace", list(labels.keys()))
+        render_trace_waterfall(labels[choice])
+        st.caption(f"Spans are written to {os.getenv('TRACE_FILE')}")
+    else:
+        st.info("No traces yet. Ask a question or generate a quiz.")
+    st.markdown('</div>', unsafe_allow_html=True)
+
 # Main app
 def main():
     init_session_state()
+    get_metrics_server()
+    get_job_queue()
+    get_source_catalog()
+    get_model_lifecycle()
+    get_memory_maintainer()
+    warm_crew(resolve_tenant_id())
     render_sidebar()
 
     pages = {
@@ -0,0 +1 @@
+"""Offline benchmarks for the ML Learning Assistant (run with `python -m benchmarks.<name>`)."""
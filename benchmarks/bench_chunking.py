@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Chunking benchmark: retrieval hit rate vs. chunk count and ingest time.
+
+Each configuration (strategy[:chunk_tokens[:overlap_tokens]]) chunks the same
+corpus through the uploader's `iter_chunks`. The chunks are embedded into a
+fresh local vector store, and a fixed question set is run against each store:
+
+    chunks / tokens   how many chunks (embeddings) and tokens were embedded
+    ingest s          chunking + embedding + upsert time
+    hit@k             share of questions whose passage is in a top-k chunk
+    mrr               mean reciprocal rank of the first hit
+
+Questions come from --questions (JSONL: {"query", "source", "answer"}, where
+`answer` is a snippet the right chunk contains). Without that file, passages
+are sampled from the corpus: the query is the passage with a third of its
+words dropped, and the answer is the passage's middle words.
+
+    python -m benchmarks.bench_chunking --corpus data/uploads
+    python -m benchmarks.bench_chunking --corpus . --configs recursive structure:256 structure:384:0
+"""
+import argparse
+import json
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.ml_learning_assistant.ingest import walk
+from src.ml_learning_assistant.local_vector_store import LocalVectorStore
+from src.ml_learning_assistant.tools.chunking import count_tokens
+from src.ml_learning_assistant.tools.upload_to_chromadb import SUPPORTED_EXTENSIONS, iter_chunks, iter_documents
+
+from .fakes import HashEmbeddingFunction
+
+DEFAULT_CONFIGS = ["recursive", "structure:128", "structure:256", "structure:384", "structure:512"]
+_WS = re.compile(r"\s+")
+
+
+def parse_config(spec: str) -> Dict[str, Any]:
+    parts = spec.split(":")
+    cfg: Dict[str, Any] = {"strategy": parts[0]}
+    if len(parts) > 1 and parts[1]:
+        cfg["chunk_tokens"] = int(parts[1])
+    if len(parts) > 2 and parts[2]:
+        cfg["overlap_tokens"] = int(parts[2])
+    return cfg
+
+
+def sample_questions(files: List[Path], n: int, seed: int = 0) -> List[Dict[str, str]]:
+    """Passages of 16 words from the corpus, asked with a third of the words missing."""
+    rng = random.Random(seed)
+    passages = []
+    for f in files:
+        for page in iter_documents(str(f)):
+            words = _WS.sub(" ", page.page_content).split(" ")
+            for lo in range(0, max(0, len(words) - 16), 40):
+                window = words[lo:lo + 16]
+                if sum(w.isalpha() for w in window) >= 10:
+                    passages.append((f.name, window))
+    questions = []
+    for source, window in rng.sample(passages, min(n, len(passages))):
+        kept = [w for w in window if rng.random() > 0.33]
+        questions.append({"query": " ".join(kept), "source": source, "answer": " ".join(window[6:10])})
+    return questions
+
+
+def bench_config(files: List[Path], questions: List[Dict[str, str]], cfg: Dict[str, Any], k: int,
+                 embedding_function, workdir: Path) -> Dict[str, Any]:
+    store = LocalVectorStore(str(workdir))
+    col = store.collection("bench_chunking", embedding_function=embedding_function)
+    t0 = time.perf_counter()
+    chunk_s = 0.0
+    n_chunks = tokens = 0
+    for f in files:
+        t = time.perf_counter()
+        chunks = list(iter_chunks(str(f), **cfg))
+        chunk_s += time.perf_counter() - t
+        if not chunks:
+            continue
+        texts = [c.page_content for c in chunks]
+        col.upsert(ids=[f"{f.name}_{i}" for i in range(len(chunks))], documents=texts,
+                   metadatas=[{"source": f.name} for _ in chunks])
+        n_chunks += len(chunks)
+        tokens += sum(count_tokens(t) for t in texts)
+    ingest_s = time.perf_counter() - t0
+
+    hits = 0
+    rr = 0.0
+    for lo in range(0, len(questions), 64):
+        batch = questions[lo:lo + 64]
+        res = col.query(query_texts=[q["query"] for q in batch], n_results=k, include=["documents", "metadatas"])
+        for q, docs, metas in zip(batch, res["documents"], res["metadatas"]):
+            answer = _WS.sub(" ", q["answer"]).strip()
+            for rank, (doc, meta) in enumerate(zip(docs, metas), 1):
+                if meta.get("source") == q["source"] and answer in _WS.sub(" ", doc or ""):
+                    hits += 1
+                    rr += 1.0 / rank
+                    break
+    store.close()
+    return {"chunks": n_chunks, "tokens": tokens, "chunk_s": round(chunk_s, 3), "ingest_s": round(ingest_s, 3),
+            "hit_rate": round(hits / max(1, len(questions)), 4), "mrr": round(rr / max(1, len(questions)), 4)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", default=".", help="directory of course materials")
+    ap.add_argument("--configs", nargs="*", default=DEFAULT_CONFIGS,
+                    help="strategy[:chunk_tokens[:overlap_tokens]] per run")
+    ap.add_argument("--questions", help="JSONL question set (default: sampled from the corpus)")
+    ap.add_argument("--n-questions", type=int, default=300)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--embedder", choices=("hash", "default"), default="hash",
+                    help="hash = offline bag-of-words; default = Chroma's MiniLM model")
+    ap.add_argument("--json", help="Write results to this JSON file")
+    args = ap.parse_args()
+
+    files = [f for f in walk(Path(args.corpus)) if f.suffix.lower() in SUPPORTED_EXTENSIONS]
+    if not files:
+        raise SystemExit(f"No supported documents under {args.corpus}")
+    if args.questions:
+        questions = [json.loads(line) for line in Path(args.questions).read_text().splitlines() if line.strip()]
+    else:
+        questions = sample_questions(files, args.n_questions)
+    ef: Optional[Any] = HashEmbeddingFunction(dim=384) if args.embedder == "hash" else None
+    print(f"📚 {len(files)} files, {len(questions)} questions, k={args.k}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, spec in enumerate(args.configs):
+            results[spec] = bench_config(files, questions, parse_config(spec), args.k, ef, Path(tmp) / str(i))
+
+    print(f"{'config':<22}{'chunks':>8}{'tokens':>9}{'ingest s':>10}{'hit@' + str(args.k):>8}{'mrr':>8}")
+    for spec, r in results.items():
+        print(f"{spec:<22}{r['chunks']:>8}{r['tokens']:>9}{r['ingest_s']:>10}{r['hit_rate']:>8}{r['mrr']:>8}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"benchmark": "chunking", "files": len(files),
+                                               "questions": len(questions), "k": args.k,
+                                               "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup import budget for the Streamlit app.
+
+Imports exactly what `app_new.py` imports at module level (read from its AST,
+so the app itself is not executed) in a fresh interpreter with
+`-X importtime`. It then checks two things:
+
+* the median wall time stays under the budget, and
+* none of the heavy dependencies (crewai, crewai_tools, mcp, chromadb,
+  langchain loaders, ...) are loaded at startup. They must stay lazy.
+
+    python -m benchmarks.bench_importtime
+    python -m benchmarks.bench_importtime --budget-ms 800 --runs 7 --json
+
+Exits with status 1 when the budget or the lazy-import rule is violated.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+APP = ROOT / "app_new.py"
+
+# must not be imported while the app module loads
+HEAVY_MODULES = (
+    "crewai", "crewai_tools", "mcp", "chromadb", "litellm",
+    "langchain_community", "langchain_text_splitters", "pypdf", "pptx",
+)
+
+
+def app_startup_imports(path: Path = APP) -> List[str]:
+    """Module-level import statements of the app (skips `if TYPE_CHECKING:` blocks)."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    lines = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            lines.extend(f"import {a.name}" for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module != "__future__":
+            lines.append(f"import {node.module}")
+    return lines
+
+
+def run_once(imports: List[str]) -> Dict:
+    code = "\n".join(imports + [
+        "import json, sys",
+        f"print(json.dumps(sorted(m for m in {list(HEAVY_MODULES)!r} if m in sys.modules)))",
+    ])
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=str(ROOT), env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+
+    # "import time: self [us] | cumulative | imported package"
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cum_us = int(parts[0]), int(parts[1])
+        except (ValueError, IndexError):
+            continue
+        # nesting is shown by extra indentation after the column's single space
+        modules.append((parts[2][1:], self_us, cum_us))
+    top_level = [m for m in modules if not m[0].startswith(" ")]
+    total_ms = sum(cum for _, _, cum in top_level) / 1000
+    return {
+        "total_ms": total_ms,
+        "top": sorted(((n.strip(), round(c / 1000, 1)) for n, _, c in top_level), key=lambda x: -x[1])[:15],
+        "heavy_loaded": json.loads(proc.stdout.strip().splitlines()[-1]),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")))
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = ap.parse_args()
+
+    imports = app_startup_imports()
+    runs = [run_once(imports) for _ in range(max(1, args.runs))]
+    median_ms = statistics.median(r["total_ms"] for r in runs)
+    last = runs[-1]
+    report = {
+        "median_ms": round(median_ms, 1),
+        "budget_ms": args.budget_ms,
+        "runs": [round(r["total_ms"], 1) for r in runs],
+        "heavy_loaded": last["heavy_loaded"],
+        "top": last["top"],
+    }
+    ok = median_ms <= args.budget_ms and not last["heavy_loaded"]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"App startup imports: median {median_ms:.0f} ms over {len(runs)} run(s) (budget {args.budget_ms:.0f} ms)")
+        for name, ms in report["top"]:
+            print(f"  {ms:>8.1f} ms  {name}")
+        if last["heavy_loaded"]:
+            print(f"❌ Heavy modules imported at startup: {', '.join(last['heavy_loaded'])}")
+        print("✅ Within budget" if ok else "❌ Startup import budget exceeded")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
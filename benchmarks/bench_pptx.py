@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+PPTX extraction benchmark: python-pptx serial walk (the original load_pptx)
+vs. the XML extractor in tools/pptx_loader.py, serial and with a process pool
+of each --workers size. The pool is started (and warmed up) before timing;
+its start-up time is reported separately.
+
+    python -m benchmarks.bench_pptx --slides 300 --repeat 3
+    python -m benchmarks.bench_pptx --deck path/to/lecture.pptx --workers 2 4 8
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from src.ml_learning_assistant.tools import pptx_loader
+from src.ml_learning_assistant.tools.pptx_loader import iter_pptx_documents
+
+
+def legacy_load_pptx(filepath: str) -> list:
+    """The original load_pptx: python-pptx, top-level shapes only, no notes."""
+    from pptx import Presentation
+
+    prs = Presentation(filepath)
+    out = []
+    for slide_idx, slide in enumerate(prs.slides, 1):
+        slide_text = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                text = shape.text.strip()
+                if text:
+                    slide_text.append(text)
+        if slide_text:
+            out.append((slide_idx, "\n".join(slide_text)))
+    return out
+
+
+def build_deck(path: Path, n_slides: int) -> None:
+    """Synthetic lecture deck: title, bullets, a table, a grouped shape and notes per slide."""
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    prs = Presentation()
+    layout = prs.slide_layouts[1]
+    for i in range(n_slides):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"Lecture slide {i}: gradient descent"
+        body = slide.placeholders[1].text_frame
+        body.text = "Learning rate controls the step size"
+        for j in range(4):
+            body.add_paragraph().text = f"Bullet {j}: loss surface, momentum and convergence ({i})"
+        table = slide.shapes.add_table(4, 3, Inches(1), Inches(4), Inches(6), Inches(1.5)).table
+        for r in range(4):
+            for c in range(3):
+                table.cell(r, c).text = f"cell {r},{c} / slide {i}"
+        group = slide.shapes.add_group_shape()
+        for k in range(2):
+            tb = group.shapes.add_textbox(Inches(1 + k * 3), Inches(6), Inches(2), Inches(0.5))
+            tb.text_frame.text = f"Grouped caption {k} on slide {i}"
+        slide.notes_slide.notes_text_frame.text = f"Speaker notes for slide {i}: mention SGD vs Adam."
+    prs.save(str(path))
+
+
+def timed(fn, repeat: int) -> dict:
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return {"median_s": statistics.median(times), "min_s": min(times), "result": result}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--deck", help="Existing .pptx to benchmark (default: generate one)")
+    ap.add_argument("--slides", type=int, default=300, help="Slides in the generated deck")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--workers", type=int, nargs="*", default=[2, 4],
+                    help="pool sizes for the parallel runs (more than the CPU count only adds overhead)")
+    ap.add_argument("--json", help="Write results to this JSON file")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = Path(args.deck) if args.deck else Path(tmp) / "bench_deck.pptx"
+        if not args.deck:
+            build_deck(deck, args.slides)
+
+        legacy = timed(lambda: legacy_load_pptx(str(deck)), args.repeat)
+        runs = {"xml_serial": timed(lambda: list(iter_pptx_documents(str(deck), parallel=False)), args.repeat)}
+        startup = {}
+        for workers in args.workers:
+            pptx_loader.PPTX_WORKERS = workers
+            t0 = time.perf_counter()
+            list(iter_pptx_documents(str(deck), parallel=True))  # starts the pool
+            startup[workers] = time.perf_counter() - t0
+            runs[f"xml_parallel_{workers}w"] = timed(
+                lambda: list(iter_pptx_documents(str(deck), parallel=True)), args.repeat)
+
+    rows = {"legacy_python_pptx": {"slides": len(legacy["result"]),
+                                   "chars": sum(len(t) for _, t in legacy["result"]),
+                                   "median_s": round(legacy["median_s"], 4), "min_s": round(legacy["min_s"], 4)}}
+    for name, res in runs.items():
+        rows[name] = {"slides": len(res["result"]), "chars": sum(len(d.page_content) for d in res["result"]),
+                      "median_s": round(res["median_s"], 4), "min_s": round(res["min_s"], 4)}
+    for workers, seconds in startup.items():
+        rows[f"xml_parallel_{workers}w"]["first_call_s"] = round(seconds, 4)
+
+    print(f"{'extractor':<22}{'slides':>8}{'chars':>10}{'median s':>11}{'speedup':>9}{'1st call s':>12}")
+    base = rows["legacy_python_pptx"]["median_s"]
+    for name, r in rows.items():
+        first = f"{r['first_call_s']:>12.3f}" if "first_call_s" in r else ""
+        print(f"{name:<22}{r['slides']:>8}{r['chars']:>10}{r['median_s']:>11.3f}{base / r['median_s']:>8.1f}x{first}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"benchmark": "pptx", "deck": str(deck), "cpus": os.cpu_count(),
+                                               "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Recall vs. memory for the local vector store's quantized search.
+
+Every mode (float32, int8, binary) indexes the same vectors. For each rescore
+factor, queries are run through it and the results are compared with exact
+float32 search:
+
+    recall@k        share of the exact top-k that the quantized search returns
+    scan MB         bytes the first pass reads (float32 rows or codes)
+    p50 ms          single-query latency
+
+The vectors come from the course corpus itself:
+
+    --snapshot DIR  embeddings from `snapshot export` (the production embedder)
+    --corpus DIR    files chunked like the uploader, embedded with the hash
+                    embedder at --dim (1024 = mxbai-embed-large)
+
+With neither, dense clustered random vectors stand in for an embedded corpus.
+The hash embedder's bag-of-words vectors are mostly zeros, so their sign bits
+say little and understate binary recall; prefer --snapshot for decisions.
+Queries are stored chunk vectors with Gaussian noise added and renormalized.
+That keeps the benchmark independent of the embedding model, and the nearest
+chunks are then its neighbourhood in the corpus.
+
+    python -m benchmarks.bench_quantization --snapshot backups/ml_materials-2026-10
+    python -m benchmarks.bench_quantization --corpus data/uploads --dim 1024
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from src.ml_learning_assistant import local_vector_store as lvs
+
+from .fakes import HashEmbeddingFunction
+from .run_suite import summarize
+
+COLLECTION = "bench_quantization"
+
+
+def load_snapshot(path: Path) -> np.ndarray:
+    manifest = json.loads((path / "manifest.json").read_text())
+    return np.concatenate([np.load(path / s["embeddings"]) for s in manifest["shards"]]).astype(np.float32)
+
+
+def load_corpus(root: Path, dim: int) -> np.ndarray:
+    from src.ml_learning_assistant.ingest import walk
+    from src.ml_learning_assistant.tools.upload_to_chromadb import SUPPORTED_EXTENSIONS, iter_chunks
+
+    texts = [c.page_content for f in walk(root) if f.suffix.lower() in SUPPORTED_EXTENSIONS
+             for c in iter_chunks(str(f))]
+    if not texts:
+        raise SystemExit(f"No supported documents under {root}")
+    return np.asarray(HashEmbeddingFunction(dim=dim)(texts), dtype=np.float32)
+
+
+def clustered_vectors(n: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Dense unit vectors around `clusters` topic centres (a stand-in for real embeddings)."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + rng.normal(0.0, 0.8, (n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, n: int, noise: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), n)]
+    noisy = picked + rng.normal(0.0, noise / np.sqrt(vectors.shape[1]), picked.shape).astype(np.float32)
+    return noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+
+def run_queries(col, queries: np.ndarray, k: int):
+    lat: List[float] = []
+    ids: List[List[str]] = []
+    t0 = time.perf_counter()
+    for q in queries:
+        s = time.perf_counter()
+        res = col.query(query_embeddings=q[None, :], n_results=k, include=[])
+        lat.append(time.perf_counter() - s)
+        ids.append(res["ids"][0])
+    return ids, lat, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--snapshot", help="snapshot directory with the corpus embeddings")
+    src.add_argument("--corpus", help="directory of documents to chunk and hash-embed")
+    ap.add_argument("--dim", type=int, default=1024, help="hash embedding size for --corpus / synthetic")
+    ap.add_argument("--vectors", type=int, default=20000, help="synthetic vectors when no corpus is given")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--noise", type=float, default=0.5, help="query noise (relative to a unit vector)")
+    ap.add_argument("--factors", type=int, nargs="*", default=[1, 2, 4, 8, 16], help="rescore factors")
+    ap.add_argument("--json", help="Write results to this JSON file")
+    args = ap.parse_args()
+
+    if args.snapshot:
+        vectors = load_snapshot(Path(args.snapshot))
+    elif args.corpus:
+        vectors = load_corpus(Path(args.corpus), args.dim)
+    else:
+        vectors = clustered_vectors(args.vectors, args.dim)
+    n, dim = vectors.shape
+    queries = make_queries(vectors, args.queries, args.noise)
+    ids = [f"c{i}" for i in range(n)]
+    print(f"📐 {n} vectors x {dim} dims, {len(queries)} queries, k={args.k}")
+
+    results: Dict[str, Dict] = {}
+    truth: List[set] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in lvs.QUANTIZATION_MODES:
+            store = lvs.LocalVectorStore(str(Path(tmp) / mode), quantization=mode)
+            col = store.collection(COLLECTION, embedding_function=HashEmbeddingFunction(dim=dim))
+            for lo in range(0, n, 5000):
+                col.upsert(ids=ids[lo:lo + 5000], embeddings=vectors[lo:lo + 5000])
+            scan_mb = round(n * lvs.bytes_per_vector(dim, mode) / 1e6, 2)
+            for factor in ([0] if mode == "none" else args.factors):
+                lvs.RESCORE_FACTOR = factor
+                got, lat, wall = run_queries(col, queries, args.k)
+                if mode == "none":
+                    truth = [set(g) for g in got]
+                recall = float(np.mean([len(t & set(g)) / max(1, len(t)) for t, g in zip(truth, got)]))
+                name = mode if mode == "none" else f"{mode} x{factor}"
+                results[name] = {"recall": round(recall, 4), "scan_mb": scan_mb,
+                                 "bytes_per_vector": lvs.bytes_per_vector(dim, mode), **summarize(lat, wall)}
+            store.close()
+
+    print(f"{'mode':<14}{'recall@' + str(args.k):>10}{'scan MB':>10}{'B/vector':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['recall']:>10}{r['scan_mb']:>10}{r['bytes_per_vector']:>10}"
+              f"{r['p50_ms']:>9}{r['p99_ms']:>9}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"benchmark": "quantization", "vectors": n, "dimension": dim,
+                                               "k": args.k, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Vector-store backend benchmark: the local NumPy engine, embedded persistent
+Chroma and the HTTP server.
+
+All backends get the same synthetic chunks and the same queries, embedded
+client side with the benchmark hash embedder, so the difference is the
+engine, the transport (HTTP + JSON) and the server hop. By default a throwaway server is
+started with `chroma run` on a free port; --http-host/--http-port use a
+running server instead.
+
+    python -m benchmarks.bench_vector_store --chunks 5000 --queries 500
+    python -m benchmarks.bench_vector_store --http-host localhost --http-port 8000
+"""
+import argparse
+import json
+import logging
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.ml_learning_assistant.local_vector_store import LocalVectorStore
+from src.ml_learning_assistant.vector_store import ChromaVectorStore, VectorStore
+
+from .fakes import HashEmbeddingFunction, synthetic_corpus
+from .run_suite import QUERIES, summarize, time_calls
+
+COLLECTION = "bench_vector_store"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(path: Path, port: int, timeout: float = 30.0) -> subprocess.Popen:
+    proc = subprocess.Popen(["chroma", "run", "--path", str(path), "--port", str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("chroma server did not start")
+
+
+def bench_store(store: VectorStore, chunks: list, queries: int, n_results: int, batch: int) -> Dict:
+    try:
+        store.delete_collection(COLLECTION)
+    except Exception:
+        pass
+    col = store.collection(COLLECTION, embedding_function=HashEmbeddingFunction())
+    ids = [f"c{i}" for i in range(len(chunks))]
+    metas = [{"source": f"doc_{i % 50}.md", "page": i % 20} for i in range(len(chunks))]
+
+    t0 = time.perf_counter()
+    for lo in range(0, len(chunks), batch):
+        col.upsert(ids=ids[lo:lo + batch], documents=chunks[lo:lo + batch], metadatas=metas[lo:lo + batch])
+    upsert_s = time.perf_counter() - t0
+
+    def query(i: int):
+        return col.query(query_texts=[QUERIES[i % len(QUERIES)]], n_results=n_results,
+                         include=["documents", "metadatas", "distances"])
+
+    query(0)  # warm-up (index load)
+    lat, wall, _ = time_calls(query, queries)
+    return {"upsert": {"chunks": len(chunks), "seconds": round(upsert_s, 3),
+                       "chunks_per_s": round(len(chunks) / upsert_s, 1)},
+            "query": summarize(lat, wall)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chunks", type=int, default=5000, help="chunks to index")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--n-results", type=int, default=5)
+    ap.add_argument("--batch", type=int, default=256, help="chunks per upsert")
+    ap.add_argument("--http-host", help="use a running Chroma server instead of starting one")
+    ap.add_argument("--http-port", type=int, default=8000)
+    ap.add_argument("--json", help="Write results to this JSON file")
+    args = ap.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per request otherwise
+
+    docs = max(1, args.chunks // 40)
+    chunks = [p for _, text in synthetic_corpus(docs, 40) for p in text.split("\n\n")][:args.chunks]
+
+    results: Dict[str, Dict] = {}
+    server: Optional[subprocess.Popen] = None
+    with tempfile.TemporaryDirectory() as tmp:
+        local = LocalVectorStore(str(Path(tmp) / "local"))
+        results["local"] = bench_store(local, chunks, args.queries, args.n_results, args.batch)
+        local.close()
+        results["persistent"] = bench_store(ChromaVectorStore.persistent(str(Path(tmp) / "embedded")),
+                                            chunks, args.queries, args.n_results, args.batch)
+        host, port = args.http_host, args.http_port
+        try:
+            if not host:
+                if not shutil.which("chroma"):
+                    raise RuntimeError("`chroma` CLI not found; pass --http-host")
+                host, port = "127.0.0.1", _free_port()
+                server = start_server(Path(tmp) / "server", port)
+            results["http"] = bench_store(ChromaVectorStore.http(host, port),
+                                          chunks, args.queries, args.n_results, args.batch)
+        except Exception as e:
+            print(f"⚠️ HTTP backend skipped: {e}")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+    print(f"{'backend':<12}{'upsert/s':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'qps':>9}")
+    for name, r in results.items():
+        q = r["query"]
+        print(f"{name:<12}{r['upsert']['chunks_per_s']:>10}{q['p50_ms']:>9}{q['p90_ms']:>9}"
+              f"{q['p99_ms']:>9}{q['throughput_per_s']:>9}")
+    if "http" in results:
+        ratio = results["http"]["query"]["p50_ms"] / max(results["persistent"]["query"]["p50_ms"], 1e-6)
+        print(f"\nPersistent p50 query latency is {ratio:.1f}x lower than HTTP")
+    ratio = results["persistent"]["query"]["p50_ms"] / max(results["local"]["query"]["p50_ms"], 1e-6)
+    print(f"Local p50 query latency is {ratio:.1f}x lower than persistent Chroma")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"benchmark": "vector_store", "chunks": len(chunks),
+                                               "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
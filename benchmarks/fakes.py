@@ -0,0 +1,195 @@
+"""
+Offline stand-ins for the external services: a scripted LLM with configurable
+latency / token rate, a deterministic embedding function for an in-process
+Chroma, and a Tavily tool that never leaves the process.
+"""
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from typing import Any, List, Optional
+
+from crewai.llms.base_llm import BaseLLM
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from .stub_tavily_mcp import fake_search
+
+
+def approx_tokens(text: str) -> int:
+    return max(1, int(len(re.findall(r"\S+", text or "")) * 1.3))
+
+
+class FakeLLM(BaseLLM):
+    """
+    Scripted ReAct-style LLM.
+
+    Latency per call = latency_s + completion_tokens / tokens_per_s. The
+    researcher first calls the RAG tool, then answers; the quiz agent returns
+    schema-valid JSON; everything else gets a short markdown answer of
+    answer_tokens (capped by max_tokens, so per-agent profiles show up).
+    Copies made for per-agent profiles share the call counter and token usage.
+    """
+
+    def __init__(self, latency_s: float = 0.2, tokens_per_s: float = 200.0,
+                 answer_tokens: int = 150, model: str = "fake/scripted",
+                 max_tokens: Optional[int] = None, **kwargs: Any):
+        super().__init__(model=model, temperature=0.0, provider="fake", **kwargs)
+        self.latency_s = latency_s
+        self.tokens_per_s = tokens_per_s
+        self.answer_tokens = answer_tokens
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0}
+
+    @property
+    def calls(self) -> int:
+        return self._stats["calls"]
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def get_context_window_size(self) -> int:
+        return 32768
+
+    def _respond(self, prompt: str, role: str, after_tool: bool) -> str:
+        n_tokens = min(self.answer_tokens, self.max_tokens) if self.max_tokens else self.answer_tokens
+        filler = " ".join(["detail"] * max(1, int(n_tokens / 1.3)))
+        if "Quiz Generator" in role:
+            n_match = re.search(r"Number of questions:\s*(\d+)", prompt)
+            topic_match = re.search(r'Topic:\s*"([^"]*)"', prompt)
+            n = int(n_match.group(1)) if n_match else 5
+            topic = topic_match.group(1) if topic_match else "topic"
+            quiz = {
+                "topic": topic,
+                "num_questions": n,
+                "questions": [
+                    {
+                        "id": i,
+                        "question": f"Question {i} about {topic}?",
+                        "choices": {k: f"Option {k}" for k in "ABCD"},
+                        "answer": "A",
+                        "explanation": f"Because of {topic} fact {i}.",
+                    }
+                    for i in range(1, n + 1)
+                ],
+            }
+            return "Final Answer: " + json.dumps(quiz)
+        if "Researcher" in role and not after_tool:
+            topic_match = re.search(r'Topic[^:]*:\s*"([^"]*)"', prompt)
+            query = topic_match.group(1) if topic_match else "machine learning"
+            # follow the task's tool policy: quiz research asks for one expanded call
+            args = {"query": query, "n_results": 5}
+            if re.search(r"-\s*expand:\s*true", prompt):
+                args.update(n_results=8, expand=True)
+            return (
+                "Thought: I should search the knowledge base first.\n"
+                "Action: chroma_rag_search\n"
+                f"Action Input: {json.dumps(args)}"
+            )
+        return f"Thought: I now know the final answer\nFinal Answer: ## Notes\n- {filler}"
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None) -> str:
+        self._emit_call_started_event(messages=messages, tools=tools, callbacks=callbacks,
+                                      available_functions=available_functions,
+                                      from_task=from_task, from_agent=from_agent)
+        prompt = messages if isinstance(messages, str) else "\n".join(
+            str(m.get("content", "")) for m in messages
+        )
+        role = getattr(from_agent, "role", "") or ""
+        # an assistant turn in the history means the tool observation came back
+        after_tool = not isinstance(messages, str) and any(m.get("role") == "assistant" for m in messages)
+        answer = self._respond(prompt, role, after_tool)
+        completion_tokens = approx_tokens(answer)
+        time.sleep(self.latency_s + completion_tokens / max(self.tokens_per_s, 1e-6))
+        with self._lock:
+            self._stats["calls"] += 1
+            self._track_token_usage_internal(
+                {"prompt_tokens": approx_tokens(prompt), "completion_tokens": completion_tokens}
+            )
+        from crewai.events.types.llm_events import LLMCallType
+        self._emit_call_completed_event(response=answer, call_type=LLMCallType.LLM_CALL,
+                                        from_task=from_task, from_agent=from_agent, messages=messages)
+        return answer
+
+
+class HashEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Deterministic bag-of-words hashing embedder (no model download, no network)."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, input: Documents) -> Embeddings:
+        out = []
+        for text in input:
+            vec = [0.0] * self.dim
+            for tok in re.findall(r"[a-z0-9]+", text.lower()):
+                h = int(hashlib.md5(tok.encode()).hexdigest()[:8], 16)
+                vec[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+            norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+            out.append([v / norm for v in vec])
+        return out
+
+    @staticmethod
+    def name() -> str:
+        return "bench-hash"
+
+    def get_config(self) -> dict:
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "HashEmbeddingFunction":
+        return HashEmbeddingFunction(dim=config.get("dim", 256))
+
+
+class TavilyInput(BaseModel):
+    query: str = Field(..., description="Search query")
+    topic: str = Field(default="general")
+    max_results: int = Field(default=5)
+
+
+class StubTavilyTool(BaseTool):
+    """In-process replacement for the MCP `tavily-search` tool."""
+    name: str = "tavily-search"
+    description: str = "Search the web for up-to-date information (offline stub)."
+    args_schema: type[BaseModel] = TavilyInput
+    latency_s: float = 0.05
+
+    def _run(self, query: str, topic: str = "general", max_results: int = 5) -> str:
+        time.sleep(self.latency_s)
+        return fake_search(query, max_results)
+
+
+def make_chroma(embedding_dim: int = 256, persist_dir: Optional[str] = None):
+    """In-process Chroma client + embedding function, wired into tenancy."""
+    import chromadb
+    from src.ml_learning_assistant.tenancy import configure_client
+
+    settings = chromadb.config.Settings(anonymized_telemetry=False)
+    client = (chromadb.PersistentClient(path=persist_dir, settings=settings)
+              if persist_dir else chromadb.EphemeralClient(settings=settings))
+    ef = HashEmbeddingFunction(dim=embedding_dim)
+    configure_client(client, embedding_function=ef)
+    return client, ef
+
+
+def synthetic_corpus(n_docs: int, paragraphs: int = 20) -> List[tuple]:
+    """(filename, text) pairs of ML-flavoured filler text."""
+    topics = ["gradient descent", "attention", "backpropagation", "regularization",
+              "transformers", "word embeddings", "convolution", "decision trees"]
+    docs = []
+    for d in range(n_docs):
+        topic = topics[d % len(topics)]
+        paras = [
+            f"Section {p} on {topic}. The {topic} method relates learning rate, loss, "
+            f"optimization and generalization; example {d}-{p} shows how {topic} behaves "
+            f"on held-out data with batch size {2 ** (p % 8)}."
+            for p in range(paragraphs)
+        ]
+        docs.append((f"bench_doc_{d}.md", f"# {topic.title()}\n\n" + "\n\n".join(paras)))
+    return docs
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite.
+
+Runs ingestion, retrieval, ask_question and generate_quiz against an in-process
+Chroma, a scripted FakeLLM and a stub Tavily tool - no Docker, Ollama or network
+needed. Results (latency percentiles + throughput) are written as JSON so runs
+on different commits can be compared:
+
+    python -m benchmarks.run_suite --iterations 10
+    python -m benchmarks.run_suite --compare benchmarks/results/latest.json
+    python -m benchmarks.run_suite --mcp stdio        # Tavily via the stub MCP server
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from src.ml_learning_assistant.metrics import percentile
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+STAGES = ("ingest", "retrieval", "multi_retrieval", "ask_question", "generate_quiz")
+QUERIES = [
+    "gradient descent learning rate", "attention mechanism", "backpropagation chain rule",
+    "regularization overfitting", "transformers self attention", "word embeddings similarity",
+    "convolution filters", "decision trees splits",
+]
+
+
+def summarize(latencies: List[float], wall_s: float, **extra) -> Dict:
+    return {
+        "n": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        "throughput_per_s": round(len(latencies) / wall_s, 3) if wall_s else 0.0,
+        **extra,
+    }
+
+
+def time_calls(fn: Callable[[int], object], n: int) -> tuple:
+    latencies, outputs = [], []
+    t_start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        outputs.append(fn(i))
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - t_start, outputs
+
+
+def stage_breakdown(root_name: str) -> Dict[str, float]:
+    """Mean ms per span name across the traces of one pipeline (from the tracing sink)."""
+    from src.ml_learning_assistant.tracing import load_traces
+
+    totals: Dict[str, List[float]] = {}
+    for trace in load_traces(limit=10_000, tail_bytes=64 * 1024 * 1024):
+        if trace["name"] != root_name:
+            continue
+        for sp in trace["spans"]:
+            name = sp["name"]
+            if name.startswith("llm:"):
+                name = f"llm:{(sp.get('attrs') or {}).get('agent') or '?'}"
+            totals.setdefault(name, []).append(sp["duration_ms"])
+    return {name: round(statistics.fmean(v), 2) for name, v in sorted(totals.items())}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def configure_env(workdir: Path, args: argparse.Namespace) -> None:
+    os.environ.update({
+        "CREWAI_TELEMETRY": "false",
+        "CREWAI_TRACING_ENABLED": "false",
+        "OTEL_SDK_DISABLED": "true",
+        # skips crewai's interactive first-run trace prompt
+        "CREWAI_TESTING": "true",
+        "CREW_MEMORY": "false",
+        "RATE_LIMIT_MIN_DELAY": "0",
+        "CHROMA_COLLECTION": "bench_materials",
+        "CREWAI_STORAGE_DIR": str(workdir / "crewai_memory"),
+        "TRACE_FILE": str(workdir / "traces" / "spans.jsonl"),
+        "CATALOG_DB_PATH": str(workdir / "catalog.db"),
+        "DEDUP_DB_PATH": str(workdir / "dedup.db"),
+        "RESEARCH_NOTES_DB_PATH": str(workdir / "notes.db"),
+        # every iteration measures the full pipeline unless --reuse-notes is given
+        "RESEARCH_NOTES_REUSE": "true" if args.reuse_notes else "false",
+    })
+    if args.mcp == "stdio":
+        os.environ.update({
+            "MCP_MODE": "local",
+            "MCP_COMMAND": sys.executable,
+            "MCP_ARGS": "-m benchmarks.stub_tavily_mcp",
+            "STUB_TAVILY_LATENCY_S": str(args.tool_latency),
+        })
+
+
+def run(args: argparse.Namespace) -> Dict:
+    from .fakes import FakeLLM, StubTavilyTool, make_chroma, synthetic_corpus
+
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        configure_env(workdir, args)
+        make_chroma()
+
+        from src.ml_learning_assistant.tools.chroma_rag_tool import ChromaRAGTool
+        from src.ml_learning_assistant.tools.upload_to_chromadb import upload_document_to_chromadb
+
+        stages = set(args.only or STAGES)
+
+        # Ingestion always runs: the other stages need a populated collection.
+        corpus_dir = workdir / "corpus"
+        corpus_dir.mkdir()
+        files = []
+        for name, text in synthetic_corpus(args.docs, args.paragraphs):
+            path = corpus_dir / name
+            path.write_text(text, encoding="utf-8")
+            files.append(path)
+        lat, wall, outs = time_calls(lambda i: upload_document_to_chromadb(str(files[i])), len(files))
+        failed = [o for o in outs if not o.get("success")]
+        if failed:
+            raise RuntimeError(f"Ingestion failed: {failed[0].get('message')}")
+        chunks = sum(int(o.get("chunks", 0)) for o in outs)
+        if "ingest" in stages:
+            results["ingest"] = summarize(lat, wall, files=len(files), chunks=chunks,
+                                          chunks_per_s=round(chunks / wall, 2),
+                                          embeddings_saved=sum(int(o.get("embeddings_saved", 0)) for o in outs))
+
+        if "retrieval" in stages:
+            tool = ChromaRAGTool()
+            lat, wall, _ = time_calls(lambda i: tool._run(QUERIES[i % len(QUERIES)], n_results=5),
+                                      args.queries)
+            results["retrieval"] = summarize(lat, wall)
+
+        if "multi_retrieval" in stages:
+            from src.ml_learning_assistant.retrieval import expand_queries
+
+            tool = ChromaRAGTool()
+            # the same sub-queries as one batched call vs. one tool call each
+            lat_seq, wall_seq, _ = time_calls(
+                lambda i: [tool._run(q, n_results=8) for q in expand_queries(QUERIES[i % len(QUERIES)])],
+                args.queries)
+            lat, wall, _ = time_calls(
+                lambda i: tool._run(QUERIES[i % len(QUERIES)], n_results=8, expand=True), args.queries)
+            results["multi_retrieval"] = summarize(
+                lat, wall, sub_queries=len(expand_queries(QUERIES[0])),
+                sequential_p50_ms=summarize(lat_seq, wall_seq)["p50_ms"])
+
+        if stages & {"ask_question", "generate_quiz"}:
+            from src.ml_learning_assistant.crew import MLLearningAssistantCrew
+
+            llm = FakeLLM(latency_s=args.llm_latency, tokens_per_s=args.tokens_per_s,
+                          answer_tokens=args.answer_tokens)
+            web_tools = [StubTavilyTool(latency_s=args.tool_latency)] if args.mcp == "inprocess" else None
+            crew = MLLearningAssistantCrew(llm=llm, web_tools=web_tools)
+            try:
+                if "ask_question" in stages:
+                    calls_before = llm.calls
+                    lat, wall, _ = time_calls(
+                        lambda i: crew.ask_question(f"Explain {QUERIES[i % len(QUERIES)]}"), args.iterations)
+                    results["ask_question"] = summarize(
+                        lat, wall, llm_calls_per_request=round((llm.calls - calls_before) / max(1, args.iterations), 2),
+                        stage_mean_ms=stage_breakdown("ask_question"))
+                if "generate_quiz" in stages:
+                    calls_before = llm.calls
+                    lat, wall, outs = time_calls(
+                        lambda i: crew.generate_quiz(QUERIES[i % len(QUERIES)], num_questions=5), args.iterations)
+                    valid = sum(1 for o in outs if o.lstrip().startswith("{"))
+                    results["generate_quiz"] = summarize(
+                        lat, wall, valid_json=valid,
+                        llm_calls_per_request=round((llm.calls - calls_before) / max(1, args.iterations), 2),
+                        stage_mean_ms=stage_breakdown("generate_quiz"))
+                results["llm_tokens"] = llm.get_token_usage_summary().model_dump()
+                if args.reuse_notes:
+                    from src.ml_learning_assistant.metrics import cache_hit_ratio
+                    results["research_notes"] = {"reuse_ratio": cache_hit_ratio("research_notes")}
+            finally:
+                crew.close()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> None:
+    print(f"\nComparison vs {baseline['meta'].get('git_commit')} ({baseline['meta'].get('timestamp')})")
+    print(f"{'stage':<16}{'metric':<18}{'baseline':>12}{'current':>12}{'delta':>9}")
+    for stage, cur in current["results"].items():
+        base = baseline.get("results", {}).get(stage)
+        if not base or stage == "llm_tokens":
+            continue
+        for metric in ("p50_ms", "p90_ms", "p99_ms", "throughput_per_s"):
+            if metric in cur and metric in base and base[metric]:
+                delta = (cur[metric] - base[metric]) / base[metric] * 100
+                print(f"{stage:<16}{metric:<18}{base[metric]:>12}{cur[metric]:>12}{delta:>8.1f}%")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=5, help="ask_question / generate_quiz runs")
+    ap.add_argument("--queries", type=int, default=200, help="retrieval queries")
+    ap.add_argument("--docs", type=int, default=20, help="synthetic documents to ingest")
+    ap.add_argument("--paragraphs", type=int, default=40, help="paragraphs per document")
+    ap.add_argument("--llm-latency", type=float, default=0.2, help="fixed seconds per LLM call")
+    ap.add_argument("--tokens-per-s", type=float, default=200.0, help="simulated generation rate")
+    ap.add_argument("--answer-tokens", type=int, default=150, help="tokens per scripted answer")
+    ap.add_argument("--tool-latency", type=float, default=0.05, help="stub Tavily latency (s)")
+    ap.add_argument("--mcp", choices=("inprocess", "stdio"), default="inprocess",
+                    help="stub Tavily as an in-process tool or via the stub MCP server")
+    ap.add_argument("--reuse-notes", action="store_true",
+                    help="let ask_question / generate_quiz reuse research notes across iterations")
+    ap.add_argument("--only", nargs="*", choices=STAGES, help="run only these stages")
+    ap.add_argument("--out", default=str(RESULTS_DIR), help="results directory")
+    ap.add_argument("--compare", help="baseline results JSON to diff against")
+    args = ap.parse_args()
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    report = run(args)
+
+    print(json.dumps(report["results"], indent=2))
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_file = out_dir / f"{stamp}_{report['meta']['git_commit']}.json"
+    out_file.write_text(json.dumps(report, indent=2))
+    (out_dir / "latest.json").write_text(json.dumps(report, indent=2))
+    print(f"\n📄 Results written to {out_file}")
+
+    if baseline:
+        compare(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Stub Tavily MCP server (stdio) for offline benchmarks.
+
+Exposes a `tavily-search` tool with the same arguments as the real server and
+returns canned results after a configurable delay. Point the crew at it with:
+
+    MCP_MODE=local MCP_COMMAND=python MCP_ARGS="-m benchmarks.stub_tavily_mcp"
+"""
+import os
+import time
+
+from mcp.server.fastmcp import FastMCP
+
+LATENCY_S = float(os.getenv("STUB_TAVILY_LATENCY_S", "0.05"))
+
+mcp = FastMCP("tavily-stub")
+
+
+def fake_search(query: str, max_results: int = 5) -> str:
+    """Deterministic Tavily-shaped results for a query."""
+    lines = [f"Answer: {query} is a core machine learning concept (stub result)."]
+    for i in range(1, max(1, int(max_results)) + 1):
+        lines.append(
+            f"[{i}] {query} - overview {i}\n"
+            f"URL: https://example.org/{query.replace(' ', '-')}/{i}\n"
+            f"Content: Stub web content #{i} about {query}: definitions, intuition and a worked example."
+        )
+    return "\n\n".join(lines)
+
+
+@mcp.tool(name="tavily-search", description="Search the web (stub).")
+def tavily_search(query: str, topic: str = "general", max_results: int = 5) -> str:
+    time.sleep(LATENCY_S)
+    return fake_search(query, max_results)
+
+
+if __name__ == "__main__":
+    mcp.run()
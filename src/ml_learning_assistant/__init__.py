@@ -1,5 +1,11 @@
 """ML Learning Assistant - Package initialization"""
 
-from .crew import MLLearningAssistantCrew
-
 __all__ = ['MLLearningAssistantCrew']
+
+
+def __getattr__(name):
+    # crew.py pulls in crewai / crewai_tools / mcp; import it only when asked for
+    if name == "MLLearningAssistantCrew":
+        from .crew import MLLearningAssistantCrew
+        return MLLearningAssistantCrew
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
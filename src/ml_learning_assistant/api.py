@@ -0,0 +1,370 @@
+"""
+HTTP/JSON API for the crew, for clients other than Streamlit (LMS integration,
+scripts, load-balanced deployments).
+
+    uvicorn src.ml_learning_assistant.api:app --host 0.0.0.0 --port 8080 --workers 4
+    python -m src.ml_learning_assistant.api          # same, API_WORKERS / API_PORT
+
+Endpoints (tenant from the X-Tenant-ID header, else TENANT_ID / default):
+
+    GET  /health
+    POST /ask            {"query": "...", "topic": "..."}            -> answer
+    POST /ask/stream     same body, Server-Sent Events: stage, answer, done
+    POST /quiz           {"topic": "...", "num_questions": 5}         -> validated quiz
+    POST /upload         multipart file(s)                            -> queued job ids
+    GET  /jobs/{job_id}  indexing job status (404 for another tenant's job)
+    GET  /index/status   catalog totals and recent jobs for the tenant
+    GET  /metrics        Prometheus metrics of this worker
+
+Each worker process keeps its own crews per tenant. A crew memoizes its
+agents and tasks, so it serves one call at a time: a call checks out an idle
+crew (a new one is built when none is free), so a tenant has at most
+API_MAX_CONCURRENCY crews. Crew calls run in a thread pool of
+API_MAX_CONCURRENCY threads. A request that cannot get a slot
+within API_QUEUE_TIMEOUT seconds gets 503 with Retry-After. A request running
+longer than API_REQUEST_TIMEOUT gets 504. Its crew call cannot be interrupted:
+it finishes in the background and holds its slot until then, so the
+concurrency limit also covers timed-out work.
+
+CrewAI memory (CREW_MEMORY) lives in one on-disk store that only one process
+should write; with it on, `main` runs a single worker.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, Header, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+load_dotenv()
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from .catalog import get_catalog
+from .jobs import JobQueue
+from .metrics import REGISTRY
+from .quiz_schema import parse_quiz_json
+from .tenancy import TenantQuotaExceeded, check_quota, normalize_tenant_id, tenant_dir
+from .tools.upload_to_chromadb import SUPPORTED_EXTENSIONS, save_upload_stream
+
+MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "2"))
+QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "10"))
+REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "300"))
+SSE_KEEPALIVE = float(os.getenv("API_SSE_KEEPALIVE", "15"))
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./data/uploaded_docs")).resolve()
+
+# crew error strings -> HTTP status
+_ERROR_STATUS = (("⏳", 429), ("⏱️", 504), ("🔌", 503), ("❌", 502))
+
+
+class AskRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=4000)
+    topic: Optional[str] = Field(default=None, max_length=500)
+
+
+class QuizRequest(BaseModel):
+    topic: str = Field(..., min_length=1, max_length=500)
+    num_questions: int = Field(default=5, ge=3, le=10)
+
+
+def _build_crew(tenant_id: str):
+    from .crew import MLLearningAssistantCrew
+    return MLLearningAssistantCrew(tenant_id=tenant_id)
+
+
+class _CrewPool:
+    """Idle crews per tenant; a checked-out crew is used by one thread only."""
+
+    def __init__(self):
+        self._idle: Dict[str, List[Any]] = {}
+        self._all: List[Any] = []
+        self._lock = threading.Lock()
+
+    def _take(self, tenant_id: str):
+        with self._lock:
+            idle = self._idle.get(tenant_id)
+            if idle:
+                return idle.pop()
+        crew = _build_crew(tenant_id)  # slow, so outside the lock
+        with self._lock:
+            self._all.append(crew)
+        return crew
+
+    def _give(self, tenant_id: str, crew) -> None:
+        with self._lock:
+            self._idle.setdefault(tenant_id, []).append(crew)
+
+    @contextmanager
+    def crew(self, tenant_id: str) -> Iterator[Any]:
+        crew = self._take(tenant_id)
+        try:
+            yield crew
+        finally:
+            self._give(tenant_id, crew)
+
+    def warm(self, tenant_id: str) -> None:
+        """Build one crew in the background so the first request does not wait for it."""
+        def build() -> None:
+            try:
+                self._give(tenant_id, self._take(tenant_id))
+            except Exception as e:
+                print(f"⚠️ Crew warm-up failed: {e}")
+
+        threading.Thread(target=build, name="api-crew-warmup", daemon=True).start()
+
+    def close(self) -> None:
+        with self._lock:
+            crews, self._all, self._idle = self._all, [], {}
+        for crew in crews:
+            try:
+                crew.close()
+            except Exception:
+                pass
+
+
+class _State:
+    semaphore: Optional[asyncio.Semaphore] = None
+    executor: Optional[ThreadPoolExecutor] = None
+    crews = _CrewPool()
+    jobs: Optional[JobQueue] = None
+
+
+def _tenant(x_tenant_id: Optional[str]) -> str:
+    return normalize_tenant_id(x_tenant_id or os.getenv("TENANT_ID"))
+
+
+def _call_crew(tenant_id: str, method: str, **kwargs: Any) -> Any:
+    """One crew call (runs in the executor) on a crew no other thread is using."""
+    with _State.crews.crew(tenant_id) as crew:
+        return getattr(crew, method)(**kwargs)
+
+
+def _error_status(text: str) -> Optional[int]:
+    for prefix, status in _ERROR_STATUS:
+        if (text or "").startswith(prefix):
+            return status
+    return None
+
+
+async def _run_limited(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking crew call in the pool, bounded by the semaphore and the request timeout."""
+    try:
+        await asyncio.wait_for(_State.semaphore.acquire(), timeout=QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(503, "Server busy, try again shortly.", headers={"Retry-After": "10"})
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry context variables (the current trace span) over
+    ctx = contextvars.copy_context()
+    fut = loop.run_in_executor(_State.executor, lambda: ctx.run(fn, *args, **kwargs))
+    # the slot is freed when the work finishes, not when the client gives up
+    fut.add_done_callback(lambda _: _State.semaphore.release())
+    try:
+        return await asyncio.wait_for(asyncio.shield(fut), timeout=REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(504, f"Request exceeded {REQUEST_TIMEOUT:.0f}s.")
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    _State.semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    _State.executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="api-crew-call")
+    if os.getenv("API_RUN_INDEXER", "true").strip().lower() != "false":
+        _State.jobs = JobQueue().start()
+    # build the default tenant's crew in the background
+    _State.crews.warm(_tenant(None))
+    print(f"🌐 API ready: concurrency={MAX_CONCURRENCY}, timeout={REQUEST_TIMEOUT:.0f}s, pid={os.getpid()}")
+    yield
+    if _State.jobs is not None:
+        _State.jobs.stop()
+    _State.executor.shutdown(wait=False, cancel_futures=True)
+    _State.crews.close()
+
+
+app = FastAPI(title="ML Learning Assistant API", version="1.0", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/ask")
+async def ask(req: AskRequest, x_tenant_id: Optional[str] = Header(default=None)):
+    tenant = _tenant(x_tenant_id)
+    t0 = time.perf_counter()
+    answer = await _run_limited(_call_crew, tenant, "ask_question", query=req.query, topic=req.topic or req.query)
+    status = _error_status(answer)
+    body = {"success": status is None, "answer": answer, "tenant_id": tenant,
+            "seconds": round(time.perf_counter() - t0, 3)}
+    if status is not None:
+        body["message"] = body.pop("answer")
+        return JSONResponse(body, status_code=status)
+    return body
+
+
+def _sse(event: str, data: Any) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_stream(req: AskRequest, x_tenant_id: Optional[str] = Header(default=None)):
+    """
+    Server-Sent Events. The crew produces the answer in one piece, so the
+    stream carries stage progress (research -> teaching), then the answer in
+    paragraph-sized `answer` events, then `done`. Comment lines keep idle
+    proxies from closing the connection during long stages.
+    """
+    tenant = _tenant(x_tenant_id)
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_research(notes: str) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, ("stage", {"stage": "teaching", "notes_chars": len(notes)}))
+
+    async def produce() -> None:
+        try:
+            answer = await _run_limited(_call_crew, tenant, "ask_question", query=req.query,
+                                        topic=req.topic or req.query, on_research=on_research)
+            await events.put(("result", answer))
+        except HTTPException as e:
+            await events.put(("error", {"status": e.status_code, "message": e.detail}))
+
+    async def stream() -> AsyncIterator[str]:
+        t0 = time.perf_counter()
+        yield _sse("stage", {"stage": "research"})
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                try:
+                    kind, data = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if kind == "stage":
+                    yield _sse("stage", data)
+                elif kind == "error":
+                    yield _sse("error", data)
+                    break
+                else:
+                    status = _error_status(data)
+                    if status is not None:
+                        yield _sse("error", {"status": status, "message": data})
+                        break
+                    for part in re.split(r"(?<=\n)\n", data):
+                        if part.strip():
+                            yield _sse("answer", {"text": part})
+                    yield _sse("done", {"seconds": round(time.perf_counter() - t0, 3)})
+                    break
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/quiz")
+async def quiz(req: QuizRequest, x_tenant_id: Optional[str] = Header(default=None)):
+    tenant = _tenant(x_tenant_id)
+    t0 = time.perf_counter()
+    raw = await _run_limited(_call_crew, tenant, "generate_quiz", topic=req.topic, num_questions=req.num_questions)
+    status = _error_status(raw)
+    if status is not None:
+        return JSONResponse({"success": False, "message": raw, "tenant_id": tenant}, status_code=status)
+    obj, err = parse_quiz_json(raw, expected_n=req.num_questions)
+    if err:
+        return JSONResponse({"success": False, "message": err, "raw": raw, "tenant_id": tenant}, status_code=502)
+    return {"success": True, "quiz": obj, "tenant_id": tenant, "seconds": round(time.perf_counter() - t0, 3)}
+
+
+@app.post("/upload")
+async def upload(files: List[UploadFile] = File(...), x_tenant_id: Optional[str] = Header(default=None)):
+    if _State.jobs is None:
+        raise HTTPException(503, "Indexing is disabled on this server (API_RUN_INDEXER=false).")
+    tenant = _tenant(x_tenant_id)
+    names = [Path(f.filename or "").name for f in files]
+    bad = [n for n in names if Path(n).suffix.lower() not in SUPPORTED_EXTENSIONS]
+    if bad:
+        raise HTTPException(415, f"Unsupported file type(s): {', '.join(bad)}. "
+                                 f"Supported: {', '.join(SUPPORTED_EXTENSIONS)}")
+    catalog = get_catalog()
+    known = {s["source"] for s in catalog.list_sources(tenant)}
+    try:
+        check_quota(tenant, new_chunks=0, current_chunks=0,
+                    new_documents=len([n for n in names if n not in known]), current_documents=len(known))
+    except TenantQuotaExceeded as e:
+        raise HTTPException(403, str(e))
+
+    dest_dir = tenant_dir(UPLOAD_DIR, tenant)
+    queued = []
+    for f, name in zip(files, names):
+        path = dest_dir / name
+        size = await asyncio.to_thread(save_upload_stream, f.file, path)
+        queued.append({"filename": name, "bytes": size, "job_id": _State.jobs.enqueue(str(path), tenant_id=tenant)})
+    return {"success": True, "tenant_id": tenant, "jobs": queued}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, x_tenant_id: Optional[str] = Header(default=None)):
+    queue = _State.jobs or JobQueue()
+    job = await asyncio.to_thread(queue.get_job, job_id)
+    # another tenant's job looks the same as a missing one
+    if job is None or job.get("tenant_id") != _tenant(x_tenant_id):
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+@app.get("/index/status")
+async def index_status(x_tenant_id: Optional[str] = Header(default=None), limit: int = 20):
+    tenant = _tenant(x_tenant_id)
+    catalog = get_catalog()
+    queue = _State.jobs or JobQueue()
+    totals, jobs = await asyncio.gather(
+        asyncio.to_thread(catalog.totals, tenant),
+        asyncio.to_thread(queue.list_jobs, tenant, min(max(limit, 1), 200)),
+    )
+    return {"tenant_id": tenant, "version": catalog.version(tenant), "totals": totals,
+            "queue": queue.counts(), "jobs": jobs}
+
+
+def main() -> None:
+    import uvicorn
+
+    workers = int(os.getenv("API_WORKERS", "2"))
+    store_mode = os.getenv("VECTOR_STORE", "http").strip().lower()
+    if workers > 1 and store_mode in ("persistent", "local"):
+        # an embedded store directory can only be opened by one process
+        print(f"⚠️ VECTOR_STORE={store_mode}: running a single API worker")
+        workers = 1
+    if workers > 1 and os.getenv("CREW_MEMORY", "true").strip().lower() != "false":
+        # CrewAI's memory store (CREWAI_STORAGE_DIR) is not safe for concurrent writers
+        print("⚠️ CREW_MEMORY is on: running a single API worker (set CREW_MEMORY=false to scale out)")
+        workers = 1
+    uvicorn.run(
+        "src.ml_learning_assistant.api:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8080")),
+        workers=workers,
+        timeout_keep_alive=int(os.getenv("API_KEEPALIVE_SECONDS", "30")),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+"""
+Batch CLI: answer many questions or generate many quizzes in one run.
+
+    python -m src.ml_learning_assistant.batch ask faq.jsonl --out answers.jsonl --concurrency 4
+    python -m src.ml_learning_assistant.batch quiz topics.csv --out quizzes.jsonl --num-questions 5
+
+Input is JSONL (one object, or one bare string, per line) or CSV with a header
+row. Columns used:
+
+* ask: `question` (or `query`), optional `topic`
+* quiz: `topic`, optional `num_questions`
+* optional `id`; otherwise the item is identified by a hash of its text
+
+Items run in a thread pool of --concurrency workers. Each worker has its own
+crew, and all crews share the process-wide LLM rate limiter (rate_limit.py).
+The limiter spaces the *start* of each ask/quiz run by RATE_LIMIT_MIN_DELAY;
+the LLM calls an agent makes within a run are not limited, so with several
+workers the provider can see more than one request per RATE_LIMIT_MIN_DELAY.
+Lower --concurrency if it rate-limits you.
+Every finished item is appended to --out right away. Rerunning with the same
+--out skips items that already succeeded, so an interrupted run picks up where
+it stopped; failed items are retried. Quizzes are validated like in the app,
+and an invalid quiz counts as a failure.
+
+The run ends with a summary: items done, failed and skipped, throughput, and
+per-item latency percentiles. --summary also writes it as JSON.
+"""
+import argparse
+import contextvars
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .metrics import percentile
+from .quiz_schema import parse_quiz_json
+from .tenancy import normalize_tenant_id
+
+# crew methods report failures as text with one of these prefixes
+_ERROR_PREFIXES = ("❌", "⏳", "⏱️", "🔌")
+
+
+# -----------------------------
+# Input / checkpoint
+# -----------------------------
+def _rows(path: Path) -> Iterator[Dict[str, Any]]:
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                yield {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+        return
+    with path.open(encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                raise SystemExit(f"❌ {path}:{lineno}: not valid JSON")
+            yield obj if isinstance(obj, dict) else {"text": str(obj)}
+
+
+def load_items(path: Path, kind: str, num_questions: int) -> List[Dict[str, Any]]:
+    """Normalize input rows to {id, text, topic, num_questions}; rows without text are dropped."""
+    items, seen = [], set()
+    for row in _rows(path):
+        if kind == "ask":
+            text = str(row.get("question") or row.get("query") or row.get("text") or "").strip()
+        else:
+            text = str(row.get("topic") or row.get("text") or "").strip()
+        if not text:
+            continue
+        item = {"text": text}
+        if kind == "ask":
+            item["topic"] = str(row.get("topic") or "").strip() or None
+        else:
+            try:
+                n = int(row.get("num_questions") or num_questions)
+            except ValueError:
+                n = num_questions
+            item["num_questions"] = max(3, min(n, 10))
+        item_id = str(row.get("id") or "").strip()
+        if not item_id:
+            basis = json.dumps([kind, item], sort_keys=True)
+            item_id = hashlib.sha1(basis.encode("utf-8")).hexdigest()[:16]
+        if item_id in seen:
+            continue
+        seen.add(item_id)
+        item["id"] = item_id
+        items.append(item)
+    return items
+
+
+def completed_ids(out_path: Path) -> Set[str]:
+    """IDs whose latest checkpoint record succeeded."""
+    done: Dict[str, bool] = {}
+    if not out_path.exists():
+        return set()
+    with out_path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted write
+            if isinstance(rec, dict) and "id" in rec:
+                done[str(rec["id"])] = bool(rec.get("ok"))
+    return {k for k, ok in done.items() if ok}
+
+
+class Checkpoint:
+    """Append-only JSONL writer shared by the workers."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self) -> None:
+        self._f.close()
+
+
+# -----------------------------
+# Workers
+# -----------------------------
+class BatchRunner:
+    def __init__(self, kind: str, tenant_id: Optional[str], concurrency: int, crew_factory=None):
+        self.kind = kind
+        self.tenant_id = normalize_tenant_id(tenant_id)
+        self.concurrency = max(1, concurrency)
+        self._crew_factory = crew_factory or self._build_crew
+        self._local = threading.local()
+        self._crews: List[Any] = []
+        self._crews_lock = threading.Lock()
+
+    def _build_crew(self):
+        from .crew import MLLearningAssistantCrew
+
+        return MLLearningAssistantCrew(tenant_id=self.tenant_id)
+
+    def _crew(self):
+        # crews are not shared between threads; each worker builds its own once
+        crew = getattr(self._local, "crew", None)
+        if crew is None:
+            crew = self._local.crew = self._crew_factory()
+            with self._crews_lock:
+                self._crews.append(crew)
+        return crew
+
+    def process(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        record: Dict[str, Any] = {"id": item["id"], "kind": self.kind, "input": item["text"]}
+        try:
+            crew = self._crew()
+            if self.kind == "ask":
+                out = crew.ask_question(query=item["text"], topic=item.get("topic") or item["text"])
+                ok = bool(out) and not out.startswith(_ERROR_PREFIXES)
+                record.update(ok=ok, output=out)
+                if not ok:
+                    record["error"] = (out or "Empty answer")[:300]
+            else:
+                raw = crew.generate_quiz(topic=item["text"], num_questions=item["num_questions"])
+                if not raw or raw.startswith(_ERROR_PREFIXES):
+                    record.update(ok=False, error=(raw or "Empty quiz output")[:300])
+                else:
+                    obj, err = parse_quiz_json(raw, expected_n=item["num_questions"])
+                    record.update(ok=err is None, output=obj if err is None else raw)
+                    if err:
+                        record["error"] = err
+        except Exception as e:
+            record.update(ok=False, error=f"{type(e).__name__}: {str(e)[:300]}")
+        record["latency_s"] = round(time.perf_counter() - t0, 3)
+        record["finished_at"] = time.time()
+        return record
+
+    def close(self) -> None:
+        for crew in self._crews:
+            try:
+                crew.close()
+            except Exception:
+                pass
+
+
+def run_batch(kind: str, input_path: Path, out_path: Path, concurrency: int = 2,
+              num_questions: int = 5, tenant_id: Optional[str] = None, limit: Optional[int] = None,
+              crew_factory=None) -> Dict[str, Any]:
+    items = load_items(input_path, kind, num_questions)
+    done = completed_ids(out_path)
+    todo = [it for it in items if it["id"] not in done]
+    skipped = len(items) - len(todo)
+    if limit is not None:
+        todo = todo[:limit]
+    print(f"📋 {len(items)} items, {skipped} already done, {len(todo)} to run with {concurrency} workers")
+
+    runner = BatchRunner(kind, tenant_id, concurrency, crew_factory)
+    checkpoint = Checkpoint(out_path)
+    latencies: List[float] = []
+    ok = failed = 0
+    interrupted = False
+    t_start = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=runner.concurrency, thread_name_prefix="batch")
+    try:
+        # one context copy per item: a trace span open here stays the parent in the workers
+        futures = [pool.submit(contextvars.copy_context().run, runner.process, it) for it in todo]
+        for i, fut in enumerate(as_completed(futures), 1):
+            record = fut.result()
+            checkpoint.write(record)
+            latencies.append(record["latency_s"])
+            if record["ok"]:
+                ok += 1
+            else:
+                failed += 1
+                print(f"⚠️ {record['id']}: {record.get('error', '')[:120]}")
+            if i % 10 == 0 or i == len(futures):
+                print(f"⏳ {i}/{len(futures)} ({failed} failed)")
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n🛑 Interrupted - finished items are saved; rerun the same command to resume")
+    finally:
+        # running crew calls cannot be interrupted; queued ones are dropped
+        pool.shutdown(wait=not interrupted, cancel_futures=True)
+        checkpoint.close()
+        runner.close()
+    wall = time.perf_counter() - t_start
+
+    return {
+        "kind": kind,
+        "items": len(items),
+        "skipped": skipped,
+        "ok": ok,
+        "failed": failed,
+        "interrupted": interrupted,
+        "concurrency": runner.concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_per_min": round((ok + failed) / wall * 60, 2) if wall else 0.0,
+        "latency_s": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else 0.0,
+        },
+    }
+
+
+def print_summary(s: Dict[str, Any]) -> None:
+    lat = s["latency_s"]
+    print("=" * 60)
+    print(f"BATCH {s['kind'].upper()} SUMMARY")
+    print("=" * 60)
+    print(f"Items: {s['items']}  ok: {s['ok']}  failed: {s['failed']}  skipped (already done): {s['skipped']}")
+    print(f"Wall time: {s['wall_s']}s  throughput: {s['throughput_per_min']} items/min  workers: {s['concurrency']}")
+    print(f"Latency (s): mean {lat['mean']}  p50 {lat['p50']}  p90 {lat['p90']}  p99 {lat['p99']}  max {lat['max']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("kind", choices=("ask", "quiz"), help="answer questions or generate quizzes")
+    ap.add_argument("input", help="JSONL or CSV file")
+    ap.add_argument("--out", help="results / checkpoint JSONL (default: <input>.<kind>.results.jsonl)")
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "2")),
+                    help="parallel workers (LLM calls still respect the shared rate limit)")
+    ap.add_argument("--num-questions", type=int, default=5, help="quiz size when the row has none")
+    ap.add_argument("--tenant", default=None, help="workspace whose documents are searched")
+    ap.add_argument("--limit", type=int, default=None, help="run at most this many pending items")
+    ap.add_argument("--summary", help="also write the summary JSON here")
+    args = ap.parse_args(argv)
+
+    input_path = Path(args.input)
+    if not input_path.exists():
+        print(f"❌ Input not found: {input_path}")
+        return 2
+    out_path = Path(args.out) if args.out else input_path.with_suffix(f".{args.kind}.results.jsonl")
+
+    summary = run_batch(args.kind, input_path, out_path, concurrency=args.concurrency,
+                        num_questions=args.num_questions, tenant_id=args.tenant, limit=args.limit)
+    print_summary(summary)
+    print(f"📄 Results: {out_path}")
+    if args.summary:
+        Path(args.summary).write_text(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] or summary["interrupted"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Source catalog: per-tenant index statistics maintained by ingestion.
+
+Every successful upload records its source row here: chunk count, pages,
+bytes, content hash, file mtime and indexing time. The upload and stats pages
+read these rows in O(sources) time and never scan the Chroma collection. A
+background reconciler pages through each collection's metadata from time to
+time and corrects any drift, for example chunks deleted outside the app. Each
+tenant also has a version counter that increases on every change, so caches
+can key on it.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .tenancy import get_collection, normalize_tenant_id
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    tenant_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    file_type TEXT,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    mtime REAL,
+    indexed_at REAL NOT NULL,
+    reconciled_at REAL,
+    PRIMARY KEY (tenant_id, source)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    tenant_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+RECONCILE_PAGE_SIZE = 1000
+
+
+def file_sha256(filepath: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class SourceCatalog:
+    """SQLite-backed catalog of indexed sources per tenant."""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path or os.getenv("CATALOG_DB_PATH", "./data/catalog/catalog.db")).resolve()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._reconciler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        with self._db() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, tenant: str) -> None:
+        conn.execute(
+            "INSERT INTO versions (tenant_id, version) VALUES (?, 1) "
+            "ON CONFLICT(tenant_id) DO UPDATE SET version = version + 1",
+            (tenant,),
+        )
+
+    # -----------------------------
+    # Written by ingestion
+    # -----------------------------
+    def record(self, tenant_id: Optional[str], source: str, *, chunks: int, pages: int = 0,
+               file_type: str = "", nbytes: int = 0, content_hash: Optional[str] = None,
+               mtime: Optional[float] = None) -> None:
+        tenant = normalize_tenant_id(tenant_id)
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO sources (tenant_id, source, file_type, chunks, pages, bytes, content_hash, mtime, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(tenant_id, source) DO UPDATE SET file_type=excluded.file_type, "
+                "chunks=excluded.chunks, pages=excluded.pages, bytes=excluded.bytes, "
+                "content_hash=excluded.content_hash, mtime=excluded.mtime, indexed_at=excluded.indexed_at",
+                (tenant, source, file_type, int(chunks), int(pages), int(nbytes), content_hash, mtime, time.time()),
+            )
+            self._bump(conn, tenant)
+            conn.execute("COMMIT")
+
+    def touch(self, tenant_id: Optional[str], source: str, mtime: float) -> None:
+        """New mtime for a file whose content did not change (no version bump)."""
+        with self._db() as conn:
+            conn.execute("UPDATE sources SET mtime=? WHERE tenant_id=? AND source=?",
+                         (mtime, normalize_tenant_id(tenant_id), source))
+
+    def restore_sources(self, tenant_id: Optional[str], rows: List[Dict[str, Any]], replace: bool = True) -> int:
+        """Write snapshot source rows (all other rows dropped when `replace`); one version bump."""
+        tenant = normalize_tenant_id(tenant_id)
+        now = time.time()
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if replace:
+                conn.execute("DELETE FROM sources WHERE tenant_id=?", (tenant,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO sources (tenant_id, source, file_type, chunks, pages, bytes, content_hash, mtime, "
+                "indexed_at, reconciled_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(tenant, r["source"], r.get("file_type") or "", int(r.get("chunks") or 0), int(r.get("pages") or 0),
+                  int(r.get("bytes") or 0), r.get("content_hash"), r.get("mtime"), r.get("indexed_at") or now, now)
+                 for r in rows],
+            )
+            self._bump(conn, tenant)
+            conn.execute("COMMIT")
+        return len(rows)
+
+    def remove(self, tenant_id: Optional[str], source: str) -> bool:
+        tenant = normalize_tenant_id(tenant_id)
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute("DELETE FROM sources WHERE tenant_id=? AND source=?", (tenant, source))
+            if cur.rowcount:
+                self._bump(conn, tenant)
+            conn.execute("COMMIT")
+        return cur.rowcount > 0
+
+    # -----------------------------
+    # Read by the UI
+    # -----------------------------
+    def get(self, tenant_id: Optional[str], source: str) -> Optional[Dict[str, Any]]:
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT * FROM sources WHERE tenant_id=? AND source=?", (normalize_tenant_id(tenant_id), source)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list_sources(self, tenant_id: Optional[str]) -> List[Dict[str, Any]]:
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT * FROM sources WHERE tenant_id=? ORDER BY source", (normalize_tenant_id(tenant_id),)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def totals(self, tenant_id: Optional[str]) -> Dict[str, int]:
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS sources, COALESCE(SUM(chunks), 0) AS chunks, "
+                "COALESCE(SUM(pages), 0) AS pages, COALESCE(SUM(bytes), 0) AS bytes "
+                "FROM sources WHERE tenant_id=?",
+                (normalize_tenant_id(tenant_id),),
+            ).fetchone()
+        return dict(row)
+
+    def version(self, tenant_id: Optional[str]) -> int:
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT version FROM versions WHERE tenant_id=?", (normalize_tenant_id(tenant_id),)
+            ).fetchone()
+        return int(row["version"]) if row else 0
+
+    def tenants(self) -> List[str]:
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT tenant_id FROM versions UNION SELECT DISTINCT tenant_id FROM sources"
+            ).fetchall()
+        return [r["tenant_id"] for r in rows]
+
+    # -----------------------------
+    # Reconciliation against Chroma
+    # -----------------------------
+    def reconcile(self, tenant_id: Optional[str], collection=None) -> Dict[str, int]:
+        """
+        Recount chunks per source from the collection metadata (paged) and fix
+        the catalog: counts are corrected, sources with no chunks are dropped,
+        and sources found only in Chroma are added. A source whose chunks are
+        all near-duplicates stored as references (dedup.py) is kept with 0.
+        Rows (re)indexed after the scan started are left alone: the scan runs
+        outside the transaction and may have missed their chunks.
+        """
+        tenant = normalize_tenant_id(tenant_id)
+        collection = collection if collection is not None else get_collection(tenant)
+        scan_start = time.time()
+        counts: Dict[str, int] = {}
+        file_types: Dict[str, str] = {}
+        offset = 0
+        while True:
+            got = collection.get(include=["metadatas"], limit=RECONCILE_PAGE_SIZE, offset=offset)
+            metas = got.get("metadatas") or []
+            for md in metas:
+                src = (md or {}).get("source")
+                if src:
+                    counts[src] = counts.get(src, 0) + 1
+                    file_types.setdefault(src, (md or {}).get("file_type") or Path(src).suffix)
+            if len(metas) < RECONCILE_PAGE_SIZE:
+                break
+            offset += RECONCILE_PAGE_SIZE
+
+        fixed = added = dropped = 0
+        now = time.time()
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            known, fresh = {}, set()
+            for r in conn.execute("SELECT source, chunks, indexed_at FROM sources WHERE tenant_id=?", (tenant,)):
+                known[r["source"]] = r["chunks"]
+                if r["indexed_at"] >= scan_start:
+                    fresh.add(r["source"])
+            for src, n in counts.items():
+                if src in fresh:
+                    continue
+                if src not in known:
+                    conn.execute(
+                        "INSERT INTO sources (tenant_id, source, file_type, chunks, indexed_at, reconciled_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (tenant, src, file_types.get(src, ""), n, now, now),
+                    )
+                    added += 1
+                elif known[src] != n:
+                    conn.execute(
+                        "UPDATE sources SET chunks=?, reconciled_at=? WHERE tenant_id=? AND source=?",
+                        (n, now, tenant, src),
+                    )
+                    fixed += 1
+            referenced = _referenced_sources(tenant) if any(s not in counts and s not in fresh for s in known) else set()
+            for src in known:
+                if src in counts or src in fresh:
+                    continue
+                if src in referenced:
+                    if known[src]:
+                        conn.execute("UPDATE sources SET chunks=0, reconciled_at=? WHERE tenant_id=? AND source=?",
+                                     (now, tenant, src))
+                        fixed += 1
+                    continue
+                conn.execute("DELETE FROM sources WHERE tenant_id=? AND source=?", (tenant, src))
+                dropped += 1
+            conn.execute("UPDATE sources SET reconciled_at=? WHERE tenant_id=?", (now, tenant))
+            if fixed or added or dropped:
+                self._bump(conn, tenant)
+            conn.execute("COMMIT")
+        return {"sources": len(counts), "fixed": fixed, "added": added, "dropped": dropped}
+
+    def start_reconciler(self, interval: Optional[float] = None,
+                         tenants: Optional[List[str]] = None) -> "SourceCatalog":
+        """Reconcile known tenants (plus `tenants`) in a daemon thread every `interval` seconds."""
+        if self._reconciler is not None:
+            return self
+        interval = float(os.getenv("CATALOG_RECONCILE_SECONDS", "600")) if interval is None else interval
+        if interval <= 0:
+            return self
+        extra = [normalize_tenant_id(t) for t in (tenants or [])]
+
+        def loop():
+            while not self._stop.is_set():
+                for tenant in sorted(set(self.tenants()) | set(extra)):
+                    try:
+                        res = self.reconcile(tenant)
+                        if res["fixed"] or res["added"] or res["dropped"]:
+                            print(f"🔁 Catalog reconciled for '{tenant}': {res}")
+                    except Exception as e:
+                        print(f"⚠️ Catalog reconcile failed for '{tenant}': {e}")
+                self._stop.wait(interval)
+
+        self._reconciler = threading.Thread(target=loop, name="catalog-reconciler", daemon=True)
+        self._reconciler.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def _referenced_sources(tenant: str) -> Set[str]:
+    """Sources with near-duplicate references in the dedup index (empty when it is off)."""
+    try:
+        from .dedup import dedup_enabled, get_dedup_index
+
+        return get_dedup_index().referenced_sources(tenant) if dedup_enabled() else set()
+    except Exception as e:
+        print(f"⚠️ Could not read near-duplicate references: {e}")
+        return set()
+
+
+_catalog: Optional[SourceCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> SourceCatalog:
+    """Process-wide catalog (CATALOG_DB_PATH)."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = SourceCatalog()
+    return _catalog
@@ -1,9 +1,8 @@
+import copy
 import os
-import time
 import warnings
 from pathlib import Path
-from typing import Optional
-from crewai_tools import MCPServerAdapter
+from typing import Callable, Optional
 
 # Keep these early (helps Streamlit + reduces noisy telemetry behavior)
 os.environ["CREWAI_TELEMETRY"] = "false"
@@ -12,23 +11,40 @@ os.environ.setdefault("OTEL_SDK_DISABLED", "true")
 
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
-# ✅ CRITICAL FIX: Patch MCP detection bug in crewai_tools
-try:
-    import crewai_tools.adapters.mcp_adapter as mcp_adapter
-    # Force MCP_AVAILABLE to True since we know mcp is installed
-    mcp_adapter.MCP_AVAILABLE = True
-    print("✅ MCP detection patched successfully")
-except Exception as e:
-    print(f"⚠️ Could not patch MCP detection: {e}")
-
 from crewai import Agent, Crew, Task, Process
 from crewai.project import CrewBase, agent, task
 
-from .llm_config import get_llm, get_embeddings_config
+from .catalog import get_catalog
+from .llm_config import PROFILE_KEYS, get_embeddings_config, get_llm, get_llm_profile
+from .memory_maintenance import memory_in_use
+from .rate_limit import get_rate_limiter
+from .research_notes import collect_chunk_ids, get_notes_store
+from .tenancy import collection_name_for, normalize_tenant_id
+from .tracing import install_crewai_listeners, mark_error, span
+from . import metrics  # noqa: F401  (feeds the metrics registry from finished spans)
+
+_mcp_patched = False
+
 
+def _load_mcp_adapter():
+    """
+    Import crewai_tools only when the MCP tools are first needed (it is slow to
+    import and not used by the offline benchmarks).
+    """
+    global _mcp_patched
+    from crewai_tools import MCPServerAdapter
 
-from crewai_tools import MCPServerAdapter
-from mcp import StdioServerParameters
+    if not _mcp_patched:
+        # ✅ CRITICAL FIX: Patch MCP detection bug in crewai_tools
+        try:
+            import crewai_tools.adapters.mcp_adapter as mcp_adapter
+            # Force MCP_AVAILABLE to True since we know mcp is installed
+            mcp_adapter.MCP_AVAILABLE = True
+            print("✅ MCP detection patched successfully")
+        except Exception as e:
+            print(f"⚠️ Could not patch MCP detection: {e}")
+        _mcp_patched = True
+    return MCPServerAdapter
 
 
 @CrewBase
@@ -36,17 +52,29 @@ class MLLearningAssistantCrew:
     agents_config = "config/agents.yaml"
     tasks_config = "config/tasks.yaml"
 
-    def __init__(self):
-        self.llm = get_llm()
-        self.last_request_time = 0
+    def __init__(self, tenant_id: Optional[str] = None, llm=None, web_tools: Optional[list] = None):
+        """
+        `llm` and `web_tools` override the configured LLM and the MCP Tavily tools
+        (used by the offline benchmarks to run without network services).
+        """
+        self.tenant_id = normalize_tenant_id(tenant_id)
+        self.llm = llm or get_llm()
+        self._llm_injected = llm is not None
+        self._agent_llms = {}
+        self._web_tools = web_tools
+        self.memory_enabled = os.getenv("CREW_MEMORY", "true").strip().lower() != "false"
+        self.reuse_notes = os.getenv("RESEARCH_NOTES_REUSE", "true").strip().lower() != "false"
         self._setup_memory_system()
         self.embedder_config = get_embeddings_config()
+        install_crewai_listeners()
 
         # enforce collection default everywhere
         os.environ["CHROMA_COLLECTION"] = os.getenv("CHROMA_COLLECTION", "ml_materials")
 
         print(f"✅ Crew initialized with LLM: {self.llm.model}")
-        print("✅ Memory system: Short-term, Long-term, Entity tracking enabled")
+        print(f"✅ Tenant: {self.tenant_id} (collection: {collection_name_for(self.tenant_id)})")
+        if self.memory_enabled:
+            print("✅ Memory system: Short-term, Long-term, Entity tracking enabled")
         print("✅ MCP Integration: ChromaDB (RAG) + Tavily (Web Search) via Docker MCP")
 
     def _setup_memory_system(self):
@@ -58,21 +86,30 @@ class MLLearningAssistantCrew:
         print(f"📁 Memory storage: {storage_dir}")
 
     def _rate_limit_check(self):
-        current_time = time.time()
-        dt = current_time - self.last_request_time
-
-        model_str = str(self.llm.model).lower()
-        if "ollama" in model_str:
-            min_delay = 0.6
-        elif "cerebras" in model_str:
-            min_delay = 1.5
+        with span("rate_limit_wait") as s:
+            waited = self._rate_limit_wait()
+            s.set(waited_ms=round(waited * 1000, 1))
+
+    def _rate_limit_wait(self) -> float:
+        # shared with every other crew on the same model (see rate_limit.py)
+        return get_rate_limiter(self.llm.model).wait()
+
+    def _llm_for(self, agent_name: str):
+        """LLM with the agent's generation profile (config/llm_profiles.yaml) applied."""
+        llm = self._agent_llms.get(agent_name)
+        if llm is not None:
+            return llm
+        profile = get_llm_profile(agent_name)
+        if self._llm_injected:
+            # injected LLMs (benchmarks) are copied so each agent keeps its own settings
+            llm = copy.copy(self.llm)
+            for key in PROFILE_KEYS:
+                if key in profile and hasattr(llm, key):
+                    setattr(llm, key, profile[key])
         else:
-            min_delay = 3.0
-
-        if dt < min_delay:
-            time.sleep(min_delay - dt)
-
-        self.last_request_time = time.time()
+            llm = get_llm(profile)
+        self._agent_llms[agent_name] = llm
+        return llm
 
     def _clean_response(self, response: str) -> Optional[str]:
         if not response:
@@ -111,9 +148,14 @@ class MLLearningAssistantCrew:
 
         # 1) Direct ChromaDB RAG tool
         from .tools.chroma_rag_tool import ChromaRAGTool
-        chroma_tool = ChromaRAGTool()
+        chroma_tool = ChromaRAGTool(tenant_id=self.tenant_id)
+
+        if self._web_tools is not None:
+            self._mcp_tools = [chroma_tool] + list(self._web_tools)
+            return self._mcp_tools
 
         # 2) Tavily via MCP gateway (only tool that needs gateway)
+        MCPServerAdapter = _load_mcp_adapter()
         from .mcp_servers import get_mcp_server_params
         params = get_mcp_server_params()
         
@@ -156,7 +198,7 @@ class MLLearningAssistantCrew:
         # Tools ONLY here (RAG + web)
         return Agent(
             config=self.agents_config["researcher_agent"],
-            llm=self.llm,
+            llm=self._llm_for("researcher_agent"),
             tools=self._get_mcp_tools(),
             verbose=False,
             max_iter=3,  # keep short for local GPU
@@ -167,7 +209,7 @@ class MLLearningAssistantCrew:
     def teacher_agent(self) -> Agent:
         return Agent(
             config=self.agents_config["teacher_agent"],
-            llm=self.llm,
+            llm=self._llm_for("teacher_agent"),
             tools=[],
             verbose=False,
             max_iter=2,  # keep short
@@ -178,7 +220,7 @@ class MLLearningAssistantCrew:
     def quiz_agent(self) -> Agent:
         return Agent(
             config=self.agents_config["quiz_agent"],
-            llm=self.llm,
+            llm=self._llm_for("quiz_agent"),
             tools=[],  # no tools -> stable JSON
             verbose=False,
             max_iter=2,
@@ -209,7 +251,7 @@ class MLLearningAssistantCrew:
             tasks=[self.research_task()],
             process=Process.sequential,
             verbose=True,   # OK to keep logs
-            memory=True,    # memory is stored here
+            memory=self.memory_enabled,    # memory is stored here
             embedder=self.embedder_config,
             cache=True,
             max_rpm=10,
@@ -248,12 +290,58 @@ class MLLearningAssistantCrew:
             max_rpm=10,
         )
 
+    def _kickoff(self, name: str, build, inputs: dict) -> str:
+        """Build one crew and run it, timing both stages."""
+        with span("crew_build", crew=name):
+            crew = build()
+        # memory compaction (memory_maintenance.py) waits for running kickoffs
+        with memory_in_use(self.memory_enabled), span("kickoff", crew=name):
+            result = crew.kickoff(inputs=inputs)
+        return str(result.raw) if hasattr(result, "raw") else str(result)
+
+    def _research(self, kind: str, topic: str, build, inputs: dict) -> str:
+        """
+        Run a research crew, or reuse fresh notes on the same topic from either
+        pipeline (research_notes store). `kind` is "research" or "quiz_research".
+        """
+        store = get_notes_store() if self.reuse_notes else None
+        if store is not None:
+            prefer = ("research", "quiz_research") if kind == "research" else ("quiz_research", "research")
+            try:
+                with span("research_notes_lookup", kind=kind) as sp:
+                    hit = store.get(self.tenant_id, topic, kinds=prefer)
+                    sp.set(hit=hit is not None)
+                if hit is not None:
+                    print(f"♻️ Reusing {hit['kind']} notes for '{topic[:60]}' ({len(hit['chunk_ids'])} chunks)")
+                    return hit["notes"]
+            except Exception as e:
+                print(f"⚠️ Research notes lookup failed: {e}")
+            # read before researching: an upload during the run leaves the notes stale
+            version = get_catalog().version(self.tenant_id)
+
+        with collect_chunk_ids() as chunk_ids:
+            notes = self._kickoff(kind, build, inputs)
+
+        if store is not None:
+            try:
+                store.put(self.tenant_id, topic, notes, kind=kind, chunk_ids=chunk_ids, version=version)
+            except Exception as e:
+                print(f"⚠️ Research notes not stored: {e}")
+        return notes
+
     # ==================== PUBLIC API ====================
-    def ask_question(self, query: str, topic: Optional[str] = None) -> str:
+    def ask_question(self, query: str, topic: Optional[str] = None,
+                     on_research: Optional[Callable[[str], None]] = None) -> str:
         """
         Researcher -> Teacher pipeline for real questions.
         Greetings are handled directly to avoid tool usage.
+        `on_research` receives the research notes (used for quiz speculation).
         """
+        with span("ask_question", tenant=self.tenant_id, model=str(self.llm.model)):
+            return self._ask_question(query, topic, on_research)
+
+    def _ask_question(self, query: str, topic: Optional[str] = None,
+                      on_research: Optional[Callable[[str], None]] = None) -> str:
         try:
             self._rate_limit_check()
 
@@ -265,24 +353,29 @@ class MLLearningAssistantCrew:
                 return "Hello! How can I assist you today?"
 
             # 1) Research
-            research_result = self.research_crew().kickoff(
-                inputs={
+            research_notes = self._research(
+                "research",
+                topic or q,
+                self.research_crew,
+                {
                     "user_query": q,
                     "topic": topic or q,
                     "conversation_context": "",
-                }
+                },
             )
-            research_notes = str(research_result.raw) if hasattr(research_result, "raw") else str(research_result)
+            if on_research is not None:
+                on_research(research_notes)
 
             # 2) Teach
-            teach_result = self.teaching_crew().kickoff(
-                inputs={"user_query": q, "research_notes": research_notes}
+            raw = self._kickoff(
+                "teaching", self.teaching_crew, {"user_query": q, "research_notes": research_notes}
             )
-            raw = str(teach_result.raw) if hasattr(teach_result, "raw") else str(teach_result)
-            cleaned = self._clean_response(raw)
+            with span("clean_response"):
+                cleaned = self._clean_response(raw)
             return cleaned or raw
 
         except Exception as e:
+            mark_error(e)
             msg = str(e).lower()
             if "rate" in msg or "429" in msg:
                 return "⏳ Rate limit reached. Please wait 10 seconds."
@@ -298,29 +391,36 @@ class MLLearningAssistantCrew:
                 )
             return f"❌ Error: {str(e)[:200]}"
 
-    def generate_quiz(self, topic: str, num_questions: int = 5) -> str:
+    def generate_quiz(self, topic: str, num_questions: int = 5, quiz_notes: Optional[str] = None,
+                      speculative: bool = False) -> str:
         """
         Returns quiz as JSON string.
         Pipeline: Researcher (quiz_notes) -> Quiz agent (JSON output).
+        Passing `quiz_notes` (e.g. notes from ask_question) skips the research stage.
         """
+        with span("generate_quiz", tenant=self.tenant_id, model=str(self.llm.model),
+                  speculative=speculative, reused_notes=quiz_notes is not None):
+            return self._generate_quiz(topic, num_questions, quiz_notes)
+
+    def _generate_quiz(self, topic: str, num_questions: int = 5, quiz_notes: Optional[str] = None) -> str:
         try:
             self._rate_limit_check()
             n = max(3, min(int(num_questions), 10))
 
             # 1) Quiz research notes (RAG-first with tools)
-            notes_result = self.quiz_research_crew().kickoff(inputs={"topic": topic})
-            quiz_notes = str(notes_result.raw) if hasattr(notes_result, "raw") else str(notes_result)
+            if quiz_notes is None:
+                quiz_notes = self._research("quiz_research", topic, self.quiz_research_crew, {"topic": topic})
 
             # 2) Quiz JSON generation (no tools)
-            quiz_result = self.quiz_crew().kickoff(
-                inputs={"topic": topic, "num_questions": n, "quiz_notes": quiz_notes}
+            raw = self._kickoff(
+                "quiz", self.quiz_crew, {"topic": topic, "num_questions": n, "quiz_notes": quiz_notes}
             )
-            raw = str(quiz_result.raw) if hasattr(quiz_result, "raw") else str(quiz_result)
 
             # Do NOT "clean" JSON aggressively; only strip whitespace
             return (raw or "").strip()
 
         except Exception as e:
+            mark_error(e)
             msg = str(e).lower()
             if "rate" in msg:
                 return "⏳ Rate limit reached. Please wait 10 seconds."
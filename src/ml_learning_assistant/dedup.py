@@ -0,0 +1,548 @@
+"""
+Near-duplicate chunk detection at ingest time (MinHash + LSH).
+
+Course material is uploaded more than once: a deck as PPTX and as PDF, a
+textbook in two editions. Before a batch is embedded, every chunk gets a
+MinHash signature over its word shingles (DEDUP_SHINGLE_WORDS words,
+DEDUP_NUM_PERM hash functions). The signature is cut into DEDUP_BANDS bands.
+Chunks that share a band bucket are candidates, and a candidate whose
+estimated Jaccard similarity reaches DEDUP_THRESHOLD is a near-duplicate.
+
+DEDUP_MODE=reference (default): a near-duplicate is not embedded and not
+written to the collection. Its text, metadata and the ID of the chunk it
+duplicates are stored as a reference in the signature index instead. Search
+results can then name the other files with the same passage ("also in:
+deck.pdf p. 4"). When the original's file is re-indexed, references to it are
+checked against the new content. They move to another copy if it changed, or
+are embedded under their own ID when no copy is left, so no text is lost.
+DEDUP_MODE=off embeds every chunk, as before.
+
+The index is a SQLite database (DEDUP_DB_PATH), per tenant, shared by
+uploads, background jobs and bulk ingestion. Chunks with fewer than
+DEDUP_MIN_WORDS words are always embedded.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .tenancy import normalize_tenant_id
+
+DEDUP_MODES = ("reference", "off")
+DEDUP_MODE = os.getenv("DEDUP_MODE", "reference").strip().lower()
+THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))
+BANDS = int(os.getenv("DEDUP_BANDS", "16"))
+SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "5"))
+MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "8"))
+
+_MERSENNE = (1 << 31) - 1
+_WORD = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    tenant_id TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    signature BLOB,  -- NULL for chunks too short to compare
+    PRIMARY KEY (tenant_id, chunk_id)
+);
+CREATE INDEX IF NOT EXISTS signatures_source ON signatures (tenant_id, source);
+CREATE TABLE IF NOT EXISTS bands (
+    tenant_id TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_bucket ON bands (tenant_id, bucket);
+CREATE INDEX IF NOT EXISTS bands_chunk ON bands (tenant_id, chunk_id);
+CREATE TABLE IF NOT EXISTS refs (
+    tenant_id TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    target_source TEXT NOT NULL,
+    similarity REAL NOT NULL,
+    document TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (tenant_id, chunk_id)
+);
+CREATE INDEX IF NOT EXISTS refs_source ON refs (tenant_id, source);
+CREATE INDEX IF NOT EXISTS refs_target ON refs (tenant_id, target_id);
+CREATE INDEX IF NOT EXISTS refs_target_source ON refs (tenant_id, target_source);
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def dedup_enabled(mode: Optional[str] = None) -> bool:
+    mode = (mode or DEDUP_MODE).strip().lower()
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"DEDUP_MODE must be one of {', '.join(DEDUP_MODES)} (got {mode!r})")
+    return mode != "off"
+
+
+# -----------------------------
+# MinHash
+# -----------------------------
+def _permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    # fixed seed: signatures are stored, so they must not change between runs
+    rng = np.random.RandomState(1)
+    a = rng.randint(1, _MERSENNE, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, _MERSENNE, size=num_perm).astype(np.uint64)
+    return a, b
+
+
+_PERM_A, _PERM_B = _permutations(NUM_PERM)
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> List[str]:
+    """Lower-cased word `size`-grams; punctuation and layout are ignored."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """uint32 MinHash signature of `text`, or None when it is too short to compare."""
+    grams = shingles(text)
+    if len(_WORD.findall(text)) < MIN_WORDS or not grams:
+        return None
+    x = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in set(grams)), dtype=np.uint64)
+    hashed = (np.outer(x, _PERM_A) + _PERM_B) % _MERSENNE
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def signature_blob(text: str) -> Optional[bytes]:
+    """`minhash` as stored bytes, for computing signatures in worker processes."""
+    signature = minhash(text)
+    return None if signature is None else _to_blob(signature)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """One LSH bucket key per band (the band number is part of the key)."""
+    rows = len(signature) // BANDS
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(),
+                                 digest_size=8, salt=band.to_bytes(2, "little")).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def _to_blob(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+
+def _from_blob(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype="<u4").astype(np.uint32)
+
+
+# -----------------------------
+# Batch plan
+# -----------------------------
+class DedupPlan:
+    """Which chunks of a batch to embed; the rest reference an existing chunk."""
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.keep: List[int] = []
+        # i -> (target_id, target_source, similarity)
+        self.refs: Dict[int, Tuple[str, str, float]] = {}
+        self._rows: List[Tuple[str, str, Optional[np.ndarray]]] = []
+        self._ref_rows: List[Tuple[str, str, str, str, float, str, str]] = []
+        # target no longer in the collection -> (chunk embedded in its place, its source)
+        self._missing: Dict[str, Tuple[str, str]] = {}
+
+    @property
+    def duplicates(self) -> int:
+        return len(self.refs)
+
+
+class DedupIndex:
+    """SQLite-backed MinHash signatures, LSH buckets and duplicate references per tenant."""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path or os.getenv("DEDUP_DB_PATH", "./data/dedup/dedup.db")).resolve()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            conn.executescript(_SCHEMA)
+            self._check_params(conn)
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _check_params(conn: sqlite3.Connection) -> None:
+        """Signatures built with other MinHash settings cannot be compared; drop them (references stay)."""
+        params = json.dumps({"num_perm": NUM_PERM, "bands": BANDS, "shingle_words": SHINGLE_WORDS})
+        row = conn.execute("SELECT value FROM info WHERE key='params'").fetchone()
+        if row and row["value"] == params:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        if row:
+            print("⚠️ MinHash settings changed: near-duplicate signatures are rebuilt as sources are re-indexed")
+            conn.execute("DELETE FROM signatures")
+            conn.execute("DELETE FROM bands")
+        conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('params', ?)", (params,))
+        conn.execute("COMMIT")
+
+    # -----------------------------
+    # Lookups
+    # -----------------------------
+    def _candidates(self, conn: sqlite3.Connection, tenant: str, keys: Sequence[int]) -> List[sqlite3.Row]:
+        marks = ",".join("?" * len(keys))
+        return conn.execute(
+            f"SELECT s.chunk_id, s.source, s.signature FROM signatures s WHERE s.tenant_id=? AND s.chunk_id IN "
+            f"(SELECT DISTINCT chunk_id FROM bands WHERE tenant_id=? AND bucket IN ({marks}))",
+            (tenant, tenant, *keys),
+        ).fetchall()
+
+    def _best(self, conn: sqlite3.Connection, tenant: str, signature: np.ndarray,
+              exclude: str = "", skip_source: Optional[str] = None) -> Optional[Tuple[str, str, float]]:
+        best = None
+        for row in self._candidates(conn, tenant, band_keys(signature)):
+            if row["chunk_id"] == exclude or row["source"] == skip_source:
+                continue
+            sim = similarity(signature, _from_blob(row["signature"]))
+            if sim >= THRESHOLD and (best is None or sim > best[2]):
+                best = (row["chunk_id"], row["source"], sim)
+        return best
+
+    def plan(self, tenant_id: Optional[str], ids: Sequence[str], documents: Sequence[str],
+             metadatas: Sequence[Dict[str, Any]], signatures: Optional[Sequence[Optional[bytes]]] = None,
+             collection=None) -> DedupPlan:
+        """
+        Match a batch against the index and against its own earlier chunks.
+        A chunk is never matched against its own source's indexed chunks: they
+        may be the previous version, which stays in the index until the new
+        one is complete (`finish_source`).
+        With `collection`, matches whose target is no longer in it (a dropped
+        or restored collection) are embedded instead; on `commit` the stale
+        signatures are removed and references to them move to that chunk.
+        Nothing is written until `commit`, which callers run after the upsert.
+        """
+        plan = DedupPlan(normalize_tenant_id(tenant_id))
+        local: Dict[int, List[Tuple[str, str, np.ndarray]]] = {}
+        matched: List[Tuple[int, str, str, np.ndarray, Tuple[str, str, float]]] = []
+        with self._db() as conn:
+            for i, (cid, doc, meta) in enumerate(zip(ids, documents, metadatas)):
+                source = str(meta.get("source", ""))
+                if signatures is not None:
+                    sig = _from_blob(signatures[i]) if signatures[i] else None
+                else:
+                    sig = minhash(doc)
+                if sig is None:
+                    plan.keep.append(i)
+                    plan._rows.append((cid, source, None))
+                    continue
+                keys = band_keys(sig)
+                best = self._best(conn, plan.tenant, sig, exclude=cid, skip_source=source)
+                for key in keys:
+                    for other_id, other_source, other_sig in local.get(key, ()):
+                        sim = similarity(sig, other_sig)
+                        if sim >= THRESHOLD and (best is None or sim > best[2]):
+                            best = (other_id, other_source, sim)
+                if best is None:
+                    plan.keep.append(i)
+                    plan._rows.append((cid, source, sig))
+                    for key in keys:
+                        local.setdefault(key, []).append((cid, source, sig))
+                    continue
+                matched.append((i, cid, source, sig, best))
+
+        missing: Set[str] = set()
+        if collection is not None and matched:
+            targets = sorted({best[0] for *_, best in matched} - set(ids))
+            if targets:
+                present = set(collection.get(ids=targets, include=[])["ids"])
+                missing = set(targets) - present
+        for i, cid, source, sig, best in matched:
+            if best[0] in missing:
+                plan.keep.append(i)
+                plan._rows.append((cid, source, sig))
+                plan._missing.setdefault(best[0], (cid, source))
+                continue
+            plan.refs[i] = best
+            plan._ref_rows.append((cid, source, best[0], best[1], best[2], documents[i],
+                                   json.dumps(metadatas[i], default=str)))
+        plan.keep.sort()
+        return plan
+
+    def commit(self, plan: DedupPlan) -> None:
+        """Record the embedded chunks' signatures and the references of a planned batch."""
+        now = time.time()
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for gone, (cid, source) in plan._missing.items():
+                self._drop_chunk(conn, plan.tenant, gone)
+                conn.execute("UPDATE refs SET target_id=?, target_source=? WHERE tenant_id=? AND target_id=?",
+                             (cid, source, plan.tenant, gone))
+            for cid, source, sig in plan._rows:
+                self._drop_chunk(conn, plan.tenant, cid)
+                self._insert_signature(conn, plan.tenant, cid, source, sig)
+            for cid, source, target_id, target_source, sim, doc, meta in plan._ref_rows:
+                self._drop_chunk(conn, plan.tenant, cid)
+                conn.execute(
+                    "INSERT INTO refs (tenant_id, chunk_id, source, target_id, target_source, similarity, document, "
+                    "metadata, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (plan.tenant, cid, source, target_id, target_source, sim, doc, meta, now),
+                )
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _drop_chunk(conn: sqlite3.Connection, tenant: str, chunk_id: str) -> None:
+        conn.execute("DELETE FROM signatures WHERE tenant_id=? AND chunk_id=?", (tenant, chunk_id))
+        conn.execute("DELETE FROM bands WHERE tenant_id=? AND chunk_id=?", (tenant, chunk_id))
+        conn.execute("DELETE FROM refs WHERE tenant_id=? AND chunk_id=?", (tenant, chunk_id))
+
+    @staticmethod
+    def _insert_signature(conn: sqlite3.Connection, tenant: str, chunk_id: str, source: str,
+                          signature: Optional[np.ndarray]) -> None:
+        """Every embedded chunk gets a row, so a source's stored IDs can be listed; only signed ones are banded."""
+        conn.execute("INSERT INTO signatures (tenant_id, chunk_id, source, signature) VALUES (?, ?, ?, ?)",
+                     (tenant, chunk_id, source, None if signature is None else _to_blob(signature)))
+        if signature is None:
+            return
+        conn.executemany("INSERT INTO bands (tenant_id, bucket, chunk_id) VALUES (?, ?, ?)",
+                         [(tenant, key, chunk_id) for key in band_keys(signature)])
+
+    # -----------------------------
+    # Per source
+    # -----------------------------
+    def finish_source(self, tenant_id: Optional[str], source: str, ids: Sequence[str]) -> List[str]:
+        """
+        Once every chunk of a re-indexed source is committed, drop the rows
+        its previous version left under other IDs. Until then they are kept,
+        so a failed re-index loses no reference text. Returns the dropped IDs
+        that were embedded (to delete from the collection).
+        """
+        tenant = normalize_tenant_id(tenant_id)
+        keep = set(ids)
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            old = [r[0] for r in conn.execute(
+                "SELECT chunk_id FROM signatures WHERE tenant_id=? AND source=? "
+                "UNION SELECT chunk_id FROM refs WHERE tenant_id=? AND source=?", (tenant, source, tenant, source))]
+            stored = {r[0] for r in conn.execute(
+                "SELECT chunk_id FROM signatures WHERE tenant_id=? AND source=?", (tenant, source))}
+            for cid in old:
+                if cid not in keep:
+                    self._drop_chunk(conn, tenant, cid)
+            conn.execute("COMMIT")
+        return sorted(c for c in stored if c not in keep)
+
+    def forget_source(self, tenant_id: Optional[str], source: str) -> List[str]:
+        """
+        Drop all of a source's signatures and references (the source was
+        removed). Returns the IDs it had in the collection.
+        """
+        tenant = normalize_tenant_id(tenant_id)
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stored = [r["chunk_id"] for r in conn.execute(
+                "SELECT chunk_id FROM signatures WHERE tenant_id=? AND source=?", (tenant, source))]
+            conn.execute("DELETE FROM bands WHERE tenant_id=? AND chunk_id IN "
+                         "(SELECT chunk_id FROM signatures WHERE tenant_id=? AND source=?)", (tenant, tenant, source))
+            conn.execute("DELETE FROM signatures WHERE tenant_id=? AND source=?", (tenant, source))
+            conn.execute("DELETE FROM refs WHERE tenant_id=? AND source=?", (tenant, source))
+            conn.execute("COMMIT")
+        return stored
+
+    def source_ids(self, tenant_id: Optional[str], source: str) -> Tuple[List[str], List[str]]:
+        """(IDs embedded in the collection, IDs stored as references) recorded for a source."""
+        tenant = normalize_tenant_id(tenant_id)
+        with self._db() as conn:
+            stored = [r[0] for r in conn.execute(
+                "SELECT chunk_id FROM signatures WHERE tenant_id=? AND source=?", (tenant, source))]
+            refs = [r[0] for r in conn.execute(
+                "SELECT chunk_id FROM refs WHERE tenant_id=? AND source=?", (tenant, source))]
+        return stored, refs
+
+    def repair(self, tenant_id: Optional[str], source: str, collection) -> Dict[str, int]:
+        """
+        After `source` was re-indexed, re-check the references that point into
+        it. Each one stays if its target still matches, moves to another copy
+        if one exists, or is embedded under its own ID.
+        """
+        tenant = normalize_tenant_id(tenant_id)
+        counts = {"kept": 0, "moved": 0, "restored": 0}
+        with self._db() as conn:
+            refs = conn.execute("SELECT * FROM refs WHERE tenant_id=? AND target_source=?",
+                                (tenant, source)).fetchall()
+            if not refs:
+                return counts
+            restore: List[Tuple[sqlite3.Row, Optional[np.ndarray]]] = []
+            conn.execute("BEGIN IMMEDIATE")
+            for ref in refs:
+                sig = minhash(ref["document"])
+                target = conn.execute("SELECT signature FROM signatures WHERE tenant_id=? AND chunk_id=?",
+                                      (tenant, ref["target_id"])).fetchone()
+                if sig is not None and target is not None and target["signature"] is not None and \
+                        similarity(sig, _from_blob(target["signature"])) >= THRESHOLD:
+                    counts["kept"] += 1
+                    continue
+                best = self._best(conn, tenant, sig, exclude=ref["chunk_id"]) if sig is not None else None
+                if best is not None:
+                    conn.execute("UPDATE refs SET target_id=?, target_source=?, similarity=? "
+                                 "WHERE tenant_id=? AND chunk_id=?", (*best, tenant, ref["chunk_id"]))
+                    counts["moved"] += 1
+                else:
+                    restore.append((ref, sig))
+            conn.execute("COMMIT")
+        if not restore:
+            return counts
+
+        # copies of the same lost passage: embed the first, the others reference it
+        embed: List[Tuple[sqlite3.Row, Optional[np.ndarray]]] = []
+        moves: List[Tuple[str, str, float, str]] = []
+        for ref, sig in restore:
+            best = None
+            for kept, kept_sig in embed:
+                sim = similarity(sig, kept_sig) if sig is not None and kept_sig is not None else 0.0
+                if sim >= THRESHOLD and (best is None or sim > best[2]):
+                    best = (kept["chunk_id"], kept["source"], sim)
+            if best is None:
+                embed.append((ref, sig))
+            else:
+                moves.append((*best, ref["chunk_id"]))
+        # embedded first, then indexed: a failed upsert leaves the references for the next repair
+        collection.upsert(ids=[r["chunk_id"] for r, _ in embed], documents=[r["document"] for r, _ in embed],
+                          metadatas=[json.loads(r["metadata"]) for r, _ in embed])
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for ref, sig in embed:
+                self._drop_chunk(conn, tenant, ref["chunk_id"])
+                self._insert_signature(conn, tenant, ref["chunk_id"], ref["source"], sig)
+            conn.executemany("UPDATE refs SET target_id=?, target_source=?, similarity=? "
+                             "WHERE tenant_id=? AND chunk_id=?", [(*m[:3], tenant, m[3]) for m in moves])
+            conn.execute("COMMIT")
+        counts["moved"] += len(moves)
+        counts["restored"] = len(embed)
+        return counts
+
+    # -----------------------------
+    # Per tenant (collection dropped, snapshots)
+    # -----------------------------
+    def forget_tenant(self, tenant_id: Optional[str]) -> None:
+        """Drop all signatures and references of a tenant whose collection was deleted."""
+        tenant = normalize_tenant_id(tenant_id)
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for table in ("signatures", "bands", "refs"):
+                conn.execute(f"DELETE FROM {table} WHERE tenant_id=?", (tenant,))
+            conn.execute("COMMIT")
+
+    def export_rows(self, tenant_id: Optional[str]) -> Iterator[Dict[str, Any]]:
+        """A tenant's signatures and references as JSON-able rows (snapshot export)."""
+        tenant = normalize_tenant_id(tenant_id)
+        with self._db() as conn:
+            for r in conn.execute("SELECT chunk_id, source, signature FROM signatures WHERE tenant_id=?", (tenant,)):
+                yield {"kind": "signature", "chunk_id": r["chunk_id"], "source": r["source"],
+                       "signature": None if r["signature"] is None else r["signature"].hex()}
+            for r in conn.execute("SELECT * FROM refs WHERE tenant_id=?", (tenant,)):
+                row = {k: r[k] for k in r.keys() if k != "tenant_id"}
+                row["kind"] = "ref"
+                yield row
+
+    def import_rows(self, tenant_id: Optional[str], rows: Iterator[Dict[str, Any]]) -> int:
+        """Load rows from `export_rows` (snapshot restore); a chunk's existing rows are replaced."""
+        tenant = normalize_tenant_id(tenant_id)
+        n = 0
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for row in rows:
+                self._drop_chunk(conn, tenant, row["chunk_id"])
+                if row["kind"] == "signature":
+                    sig = _from_blob(bytes.fromhex(row["signature"])) if row["signature"] else None
+                    self._insert_signature(conn, tenant, row["chunk_id"], row["source"], sig)
+                else:
+                    conn.execute(
+                        "INSERT INTO refs (tenant_id, chunk_id, source, target_id, target_source, similarity, "
+                        "document, metadata, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (tenant, row["chunk_id"], row["source"], row["target_id"], row["target_source"],
+                         row["similarity"], row["document"], row["metadata"], row["created_at"]),
+                    )
+                n += 1
+            conn.execute("COMMIT")
+        return n
+
+    # -----------------------------
+    # Read by search and the UI
+    # -----------------------------
+    def also_in(self, tenant_id: Optional[str], chunk_ids: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Chunk ID -> metadata of the duplicates that reference it."""
+        if not chunk_ids:
+            return {}
+        tenant = normalize_tenant_id(tenant_id)
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        with self._db() as conn:
+            marks = ",".join("?" * len(chunk_ids))
+            for row in conn.execute(f"SELECT target_id, metadata FROM refs WHERE tenant_id=? AND target_id IN ({marks})",
+                                    (tenant, *chunk_ids)):
+                out.setdefault(row["target_id"], []).append(json.loads(row["metadata"]))
+        return out
+
+    def referenced_sources(self, tenant_id: Optional[str]) -> Set[str]:
+        """Sources with chunks stored as references (they may have none in the collection)."""
+        with self._db() as conn:
+            return {r[0] for r in conn.execute("SELECT DISTINCT source FROM refs WHERE tenant_id=?",
+                                               (normalize_tenant_id(tenant_id),))}
+
+    def stats(self, tenant_id: Optional[str]) -> Dict[str, int]:
+        tenant = normalize_tenant_id(tenant_id)
+        with self._db() as conn:
+            embedded = conn.execute("SELECT COUNT(*) FROM signatures WHERE tenant_id=?", (tenant,)).fetchone()[0]
+            refs = conn.execute("SELECT COUNT(*) FROM refs WHERE tenant_id=?", (tenant,)).fetchone()[0]
+        return {"embedded": int(embedded), "references": int(refs)}
+
+
+def format_also_in(duplicates: Sequence[Dict[str, Any]], limit: int = 3) -> str:
+    """'deck.pdf p. 4, notes.md' for a result line."""
+    seen: List[str] = []
+    for meta in duplicates:
+        label = str(meta.get("source", "?"))
+        if meta.get("page") not in (None, ""):
+            label += f" p. {meta['page']}"
+        if label not in seen:
+            seen.append(label)
+    more = f" (+{len(seen) - limit} more)" if len(seen) > limit else ""
+    return ", ".join(seen[:limit]) + more
+
+
+_index: Optional[DedupIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index() -> DedupIndex:
+    """Process-wide signature index (DEDUP_DB_PATH)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DedupIndex()
+    return _index
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+"""
+Bulk directory ingestion, without the Streamlit uploader.
+
+    python -m src.ml_learning_assistant.ingest data/textbooks --workers 4
+    python -m src.ml_learning_assistant.ingest ./lectures --tenant course-101 --force
+
+The command walks the tree and keeps files with a SUPPORTED_EXTENSIONS suffix.
+Each file is checked against the source catalog:
+
+* same mtime and size: skipped without reading it;
+* otherwise it is hashed, and skipped if the content hash still matches (the
+  catalog mtime is refreshed);
+* otherwise it is indexed.
+
+Loading and splitting run in a process pool of --workers (forkserver or spawn
+workers, so they inherit none of the parent's threads or locks). The parent
+process is the only Chroma writer. It collects chunks from all files into
+upserts of CHROMA_UPSERT_BATCH_SIZE, so small files share one round trip. Embeddings are
+computed by the collection's embedding function during upsert, the same one
+queries use. A file is recorded in the catalog once its last chunk is written.
+
+Workers also compute the chunks' MinHash signatures. Before each upsert, chunks
+that nearly duplicate an indexed chunk (or an earlier chunk of the run) are
+stored as references instead of being embedded; see dedup.py and DEDUP_MODE.
+The summary reports them as near-duplicates / embeddings saved.
+
+Chunk IDs ({name}_{i}, see make_ids) and catalog rows are keyed by file name,
+as with browser uploads, so lecture.pdf and lecture.pptx are separate sources.
+When two files in the tree share a name, only the first is indexed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .catalog import file_sha256, get_catalog
+from .dedup import dedup_enabled, get_dedup_index, signature_blob
+from .metrics import CHROMA_SECONDS
+from .tenancy import (
+    TenantQuotaExceeded,
+    check_quota,
+    collection_name_for,
+    get_collection,
+    get_quota,
+    normalize_tenant_id,
+)
+from .tools.upload_to_chromadb import (
+    SUPPORTED_EXTENSIONS,
+    UPSERT_BATCH_SIZE,
+    _dedup_ids,
+    _remove_source,
+    _repair_references,
+    _update_catalog,
+    chunk_metadata,
+    iter_chunks,
+    make_ids,
+)
+
+
+def walk(root: Path) -> Iterator[Path]:
+    """Supported files under `root`, in a stable order; hidden directories are skipped."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if Path(name).suffix.lower() in SUPPORTED_EXTENSIONS and not name.startswith("."):
+                yield Path(dirpath) / name
+
+
+def _chunk_file(filepath: str, previous_hash: Optional[str], dedup: bool = False) -> Dict[str, Any]:
+    """Worker: hash the file, then load and split it (and sign the chunks) unless the hash is unchanged."""
+    t0 = time.perf_counter()
+    try:
+        content_hash = file_sha256(filepath)
+        if previous_hash and content_hash == previous_hash:
+            return {"path": filepath, "unchanged": True, "content_hash": content_hash}
+        path = Path(filepath)
+        counts = {"pages": 0}
+        documents, metadatas = [], []
+        for chunk in iter_chunks(filepath, counts):
+            documents.append(chunk.page_content)
+            metadatas.append(chunk_metadata(path, chunk))
+        return {"path": filepath, "content_hash": content_hash, "documents": documents,
+                "metadatas": metadatas, "signatures": [signature_blob(d) for d in documents] if dedup else None,
+                "pages": counts["pages"], "seconds": time.perf_counter() - t0}
+    except Exception as e:
+        return {"path": filepath, "error": str(e)[:300]}
+
+
+class _Pending:
+    """A file whose chunks are partly in the upsert buffer."""
+
+    def __init__(self, path: Path, n_chunks: int, pages: int, content_hash: str):
+        self.path = path
+        self.n_chunks = n_chunks
+        self.pages = pages
+        self.content_hash = content_hash
+        self.remaining = n_chunks
+
+
+class BulkIngestor:
+    def __init__(self, tenant_id: Optional[str] = None, workers: int = 0,
+                 batch_size: int = UPSERT_BATCH_SIZE, force: bool = False, dedup: Optional[str] = None):
+        self.tenant_id = normalize_tenant_id(tenant_id)
+        self.workers = max(0, workers)
+        self.batch_size = max(1, int(batch_size))
+        self.force = force
+        self.catalog = get_catalog()
+        self.dedup = get_dedup_index() if dedup_enabled(dedup) else None
+        self.stats: Dict[str, Any] = {"files_seen": 0, "indexed": 0, "unchanged": 0, "failed": 0,
+                                      "duplicates": 0, "chunks": 0, "embedded": 0, "near_duplicates": 0,
+                                      "pages": 0, "upserts": 0, "upsert_s": 0.0, "errors": []}
+        self._collection = None
+        self._ids: List[str] = []
+        self._docs: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._sigs: List[Optional[bytes]] = []
+        self._owners: List[_Pending] = []
+
+    # -----------------------------
+    # Upserts (parent only)
+    # -----------------------------
+    def _flush(self) -> None:
+        if not self._ids:
+            return
+        collection = self._collection
+        ids, docs, metas = self._ids, self._docs, self._metas
+        plan = None
+        if self.dedup is not None:
+            plan = self.dedup.plan(self.tenant_id, ids, docs, metas, signatures=self._sigs,
+                                   collection=collection)
+            self.stats["near_duplicates"] += plan.duplicates
+            ids, docs, metas = ([x[i] for i in plan.keep] for x in (ids, docs, metas))
+        if ids:
+            if get_quota()["max_chunks"]:
+                with CHROMA_SECONDS.time(op="get"):
+                    existing = len(collection.get(ids=ids, include=[])["ids"])
+                with CHROMA_SECONDS.time(op="count"):
+                    current = collection.count()
+                try:
+                    check_quota(self.tenant_id, new_chunks=len(ids) - existing, current_chunks=current)
+                except TenantQuotaExceeded:
+                    # files with chunks in an earlier upsert would stay partly indexed
+                    for pending in {id(p): p for p in self._owners}.values():
+                        if pending.remaining < pending.n_chunks:
+                            _remove_source(pending.path, self.tenant_id, collection, self.dedup)
+                    raise
+            t0 = time.perf_counter()
+            with CHROMA_SECONDS.time(op="upsert"):
+                collection.upsert(ids=ids, documents=docs, metadatas=metas)
+            self.stats["upsert_s"] += time.perf_counter() - t0
+            self.stats["upserts"] += 1
+        if plan is not None:
+            self.dedup.commit(plan)
+        self.stats["chunks"] += len(self._ids)
+        self.stats["embedded"] += len(ids)
+        owners = self._owners
+        self._ids, self._docs, self._metas, self._sigs, self._owners = [], [], [], [], []
+        for pending in owners:
+            pending.remaining -= 1
+            if pending.remaining == 0:
+                self._finish(pending)
+
+    def _finish(self, pending: _Pending) -> None:
+        """Every chunk of the file is written: catalog row, stale IDs, references into it."""
+        stored, stale = None, []
+        if self.dedup is not None:
+            stored, stale = _dedup_ids(self.dedup, self.tenant_id, pending.path, pending.n_chunks)
+        _update_catalog(pending.path, self.tenant_id, self._collection, pending.n_chunks,
+                        pending.pages, content_hash=pending.content_hash, stored=stored, stale=stale)
+        if self.dedup is not None:
+            _repair_references(self.dedup, self.tenant_id, pending.path, self._collection)
+        self.stats["indexed"] += 1
+        self.stats["pages"] += pending.pages
+
+    def _add(self, result: Dict[str, Any]) -> None:
+        path = Path(result["path"])
+        if result.get("error"):
+            self._fail(path, result["error"])
+            return
+        stat = path.stat()
+        if result.get("unchanged"):
+            self.catalog.touch(self.tenant_id, path.name, stat.st_mtime)
+            self.stats["unchanged"] += 1
+            return
+        documents = result["documents"]
+        if not documents:
+            self._fail(path, f"No content in {path.suffix} file.")
+            return
+        signatures = result.get("signatures") or [None] * len(documents)
+        if self.dedup is not None and result.get("signatures") is None:
+            signatures = [signature_blob(d) for d in documents]
+        pending = _Pending(path, len(documents), result["pages"], result["content_hash"])
+        ids = make_ids(str(path), len(documents))
+        for i, (doc, meta) in enumerate(zip(documents, result["metadatas"])):
+            self._ids.append(ids[i])
+            self._docs.append(doc)
+            self._metas.append(meta)
+            self._sigs.append(signatures[i])
+            self._owners.append(pending)
+            if len(self._ids) >= self.batch_size:
+                self._flush()
+
+    def _fail(self, path: Path, message: str) -> None:
+        self.stats["failed"] += 1
+        self.stats["errors"].append({"file": str(path), "message": message})
+        print(f"❌ {path}: {message[:160]}")
+
+    # -----------------------------
+    # Run
+    # -----------------------------
+    def _needs_indexing(self, path: Path) -> Optional[str]:
+        """None to skip, "" to index without a hash check, else the catalog hash to compare."""
+        if self.force:
+            return ""
+        row = self.catalog.get(self.tenant_id, path.name)
+        if not row:
+            return ""
+        stat = path.stat()
+        if row.get("mtime") == stat.st_mtime and row.get("bytes") == stat.st_size:
+            return None
+        return row.get("content_hash") or ""
+
+    def run(self, root: Path) -> Dict[str, Any]:
+        t_start = time.perf_counter()
+        self._collection = get_collection(self.tenant_id)
+        names: Dict[str, Path] = {}
+        todo: List[tuple] = []
+        for path in walk(root):
+            self.stats["files_seen"] += 1
+            first = names.setdefault(path.name, path)
+            if first != path:
+                self.stats["duplicates"] += 1
+                print(f"⚠️ Skipping {path}: same name as {first}")
+                continue
+            previous = self._needs_indexing(path)
+            if previous is None:
+                self.stats["unchanged"] += 1
+            else:
+                todo.append((str(path), previous or None, self.dedup is not None))
+        print(f"📂 {self.stats['files_seen']} files, {len(todo)} to check or index "
+              f"into {collection_name_for(self.tenant_id)} ({self.workers or 'no'} worker processes)")
+
+        done = 0
+        try:
+            if self.workers == 0:
+                for args in todo:
+                    self._add(_chunk_file(*args))
+                    done += 1
+                    self._progress(done, len(todo))
+            else:
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                with ProcessPoolExecutor(max_workers=self.workers,
+                                         mp_context=multiprocessing.get_context(method)) as pool:
+                    # bounded number of files in flight keeps parent memory flat
+                    queue = iter(todo)
+                    running: Dict[Future, str] = {}
+
+                    def refill() -> None:
+                        while len(running) < self.workers * 2:
+                            args = next(queue, None)
+                            if args is None:
+                                return
+                            running[pool.submit(_chunk_file, *args)] = args[0]
+
+                    refill()
+                    while running:
+                        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for fut in finished:
+                            self._add(self._result(fut, running.pop(fut)))
+                            done += 1
+                            self._progress(done, len(todo))
+                        refill()
+            self._flush()
+        except KeyboardInterrupt:
+            print("\n🛑 Interrupted - files already recorded are skipped on the next run")
+            self.stats["interrupted"] = True
+        return self._summary(time.perf_counter() - t_start)
+
+    @staticmethod
+    def _result(fut: Future, path: str) -> Dict[str, Any]:
+        try:
+            return fut.result()
+        except Exception as e:  # worker process died
+            return {"path": path, "error": f"{type(e).__name__}: {e}"}
+
+    @staticmethod
+    def _progress(done: int, total: int) -> None:
+        if done % 25 == 0 or done == total:
+            print(f"⏳ {done}/{total} files processed")
+
+    def _summary(self, wall: float) -> Dict[str, Any]:
+        s = dict(self.stats)
+        s["wall_s"] = round(wall, 3)
+        s["upsert_s"] = round(s["upsert_s"], 3)
+        s["files_per_s"] = round(s["indexed"] / wall, 2) if wall else 0.0
+        s["chunks_per_s"] = round(s["chunks"] / wall, 2) if wall else 0.0
+        # chunks are embedded inside the upsert call
+        s["embeddings_per_s"] = round(s["embedded"] / s["upsert_s"], 2) if s["upsert_s"] else 0.0
+        s["embeddings_saved"] = s["near_duplicates"]
+        return s
+
+
+def print_summary(s: Dict[str, Any]) -> None:
+    print("=" * 60)
+    print("INGESTION SUMMARY")
+    print("=" * 60)
+    print(f"Files: {s['files_seen']}  indexed: {s['indexed']}  unchanged: {s['unchanged']}  "
+          f"failed: {s['failed']}  duplicate names: {s['duplicates']}")
+    print(f"Chunks: {s['chunks']} in {s['upserts']} upserts  pages/rows: {s['pages']}")
+    print(f"Embedded: {s['embedded']}  near-duplicates stored as references: {s['near_duplicates']}  "
+          f"embeddings saved: {s['embeddings_saved']}")
+    print(f"Wall time: {s['wall_s']}s  files/s: {s['files_per_s']}  chunks/s: {s['chunks_per_s']}  "
+          f"embeddings/s: {s['embeddings_per_s']} (over {s['upsert_s']}s of upserts)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("directory", help="directory tree to index")
+    ap.add_argument("--tenant", default=None, help="workspace to index into")
+    ap.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2))),
+                    help="loader processes (0 = load in this process)")
+    ap.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE, help="chunks per upsert")
+    ap.add_argument("--force", action="store_true", help="re-index files even if unchanged")
+    ap.add_argument("--dedup", choices=("reference", "off"), default=None,
+                    help="near-duplicate chunks (default: DEDUP_MODE)")
+    ap.add_argument("--summary", help="also write the summary JSON here")
+    args = ap.parse_args(argv)
+
+    root = Path(args.directory)
+    if not root.is_dir():
+        print(f"❌ Not a directory: {root}")
+        return 2
+    ingestor = BulkIngestor(tenant_id=args.tenant, workers=args.workers,
+                            batch_size=args.batch_size, force=args.force, dedup=args.dedup)
+    try:
+        summary = ingestor.run(root)
+    except Exception as e:
+        print(f"❌ Ingestion failed: {e}")
+        return 1
+    print_summary(summary)
+    if args.summary:
+        Path(args.summary).write_text(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] or summary.get("interrupted") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Persistent background indexing queue.
+
+Upload jobs are stored in SQLite and executed by a small worker pool outside
+the Streamlit request, so a closed tab or dropped websocket no longer loses
+work. Each job checkpoints after every upserted chunk batch; jobs whose worker
+stopped heartbeating (crash / restart) are re-queued and resume from the last
+finished batch. A timer thread heartbeats every running job, so a batch longer
+than JOB_STALE_SECONDS is not mistaken for a dead worker by another indexer
+process (the app and each API worker run one).
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .metrics import JOBS
+from .tenancy import normalize_tenant_id
+
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    filepath TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    batches_done INTEGER NOT NULL DEFAULT 0,
+    total_batches INTEGER NOT NULL DEFAULT 0,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_tenant ON jobs(tenant_id, created_at);
+"""
+
+
+class JobQueue:
+    """SQLite-backed indexing queue with a thread worker pool."""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.db_path = Path(db_path or os.getenv("JOBS_DB_PATH", "./data/jobs/jobs.db")).resolve()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.stale_after = float(os.getenv("JOB_STALE_SECONDS", "120"))
+        self.poll_interval = 1.0
+        self.on_complete = on_complete
+        self._hook_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        with self._db() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # -----------------------------
+    # Producer API
+    # -----------------------------
+    def enqueue(self, filepath: str, tenant_id: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, tenant_id, filepath, filename, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, normalize_tenant_id(tenant_id), str(filepath), Path(filepath).name, time.time()),
+            )
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        with self._db() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET state='cancelled', finished_at=? WHERE id=? AND state='queued'",
+                (time.time(), job_id),
+            )
+        return cur.rowcount > 0
+
+    # -----------------------------
+    # Status API (polled by the upload page)
+    # -----------------------------
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._db() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return _to_status(row) if row else None
+
+    def list_jobs(self, tenant_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._db() as conn:
+            if tenant_id is None:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE tenant_id=? ORDER BY created_at DESC LIMIT ?",
+                    (normalize_tenant_id(tenant_id), limit),
+                ).fetchall()
+        return [_to_status(r) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per state (queue depth = counts()['queued'])."""
+        with self._db() as conn:
+            rows = conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        out = {s: 0 for s in JOB_STATES}
+        out.update({r["state"]: r["n"] for r in rows})
+        return out
+
+    # -----------------------------
+    # Worker pool
+    # -----------------------------
+    def start(self) -> "JobQueue":
+        if self._threads:
+            return self
+        self._requeue_stale()
+        JOBS.set_function(lambda: {(state,): n for state, n in self.counts().items()})
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"index-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"🧵 Indexing queue started: {self.workers} worker(s), db={self.db_path}")
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def _requeue_stale(self) -> None:
+        """Return jobs whose worker died (no heartbeat) to the queue; they resume from their checkpoint."""
+        cutoff = time.time() - self.stale_after
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE jobs SET state='queued' WHERE state='running' AND COALESCE(heartbeat_at, 0) < ?",
+                (cutoff,),
+            )
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state='queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET state='running', attempts=attempts+1, "
+                "started_at=COALESCE(started_at, ?), heartbeat_at=? WHERE id=?",
+                (now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return dict(row)
+
+    @contextmanager
+    def _heartbeat(self, job_id: str) -> Iterator[None]:
+        """Refresh the job's heartbeat while it runs, independently of batch checkpoints."""
+        done = threading.Event()
+        interval = max(1.0, self.stale_after / 4)
+
+        def beat() -> None:
+            while not done.wait(interval):
+                try:
+                    with self._db() as conn:
+                        conn.execute("UPDATE jobs SET heartbeat_at=? WHERE id=? AND state='running'",
+                                     (time.time(), job_id))
+                except sqlite3.Error as e:
+                    print(f"⚠️ Heartbeat for job {job_id} failed: {e}")
+
+        t = threading.Thread(target=beat, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        t.start()
+        try:
+            yield
+        finally:
+            done.set()
+            t.join()
+
+    def _checkpoint(self, job_id: str, batches_done: int, total_batches: int, chunks_done: int) -> None:
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE jobs SET batches_done=?, total_batches=?, chunks_done=?, heartbeat_at=? WHERE id=?",
+                (batches_done, total_batches, chunks_done, time.time(), job_id),
+            )
+
+    def _finish(self, job_id: str, state: str, res: Dict[str, Any]) -> None:
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE jobs SET state=?, chunks=?, pages=?, message=?, finished_at=?, heartbeat_at=? WHERE id=?",
+                (state, int(res.get("chunks", 0) or 0), int(res.get("pages", 0) or 0),
+                 res.get("message"), time.time(), time.time(), job_id),
+            )
+
+    def _run_job(self, job: Dict[str, Any]) -> None:
+        from .tools.upload_to_chromadb import upload_document_to_chromadb
+
+        if not Path(job["filepath"]).exists():
+            self._finish(job["id"], "failed", {"message": f"File not found: {job['filename']}"})
+            return
+
+        with self._heartbeat(job["id"]):
+            res = upload_document_to_chromadb(
+                job["filepath"],
+                tenant_id=job["tenant_id"],
+                start_batch=int(job["batches_done"]),
+                on_batch=lambda done, total, chunks: self._checkpoint(job["id"], done, total, chunks),
+            )
+        if res.get("success"):
+            self._finish(job["id"], "done", res)
+            if self.on_complete:
+                try:
+                    with self._hook_lock:
+                        self.on_complete(self.get_job(job["id"]))
+                except Exception as e:
+                    print(f"⚠️ on_complete hook failed for {job['filename']}: {e}")
+        elif int(job["attempts"]) + 1 < self.max_attempts and "quota" not in str(res.get("message", "")).lower():
+            # transient failure: back to the queue, resume from last checkpoint
+            with self._db() as conn:
+                conn.execute("UPDATE jobs SET state='queued', message=? WHERE id=?", (res.get("message"), job["id"]))
+        else:
+            self._finish(job["id"], "failed", res)
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.OperationalError:
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                self._run_job(job)
+            except Exception as e:
+                self._finish(job["id"], "failed", {"message": f"Error: {e}"})
+
+
+def _to_status(row: sqlite3.Row) -> Dict[str, Any]:
+    d = dict(row)
+    total = d.get("total_batches") or 0
+    if d["state"] == "done":
+        d["progress"] = 1.0
+    else:
+        d["progress"] = (d.get("batches_done") or 0) / total if total else 0.0
+    return d
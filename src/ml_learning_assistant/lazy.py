@@ -0,0 +1,97 @@
+"""
+Lazy imports and background warm-up.
+
+Heavy dependencies such as crewai, crewai_tools, mcp, langchain loaders and
+chromadb are imported only when first used. That keeps the Streamlit cold
+start and hot reloads cheap. `Preloader` builds expensive objects, for example
+the crew, on a background thread, so the first page render does not wait for
+them.
+"""
+import importlib
+import threading
+import types
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that performs the real import on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        mod = self.__dict__["_lazy_module"]
+        if mod is None:
+            with self.__dict__["_lazy_lock"]:
+                mod = self.__dict__["_lazy_module"]
+                if mod is None:
+                    mod = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = mod
+        return mod
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> LazyModule:
+    """`x = lazy_import("pkg.mod")` behaves like `import pkg.mod as x` once used."""
+    return LazyModule(name)
+
+
+class Preloader:
+    """Run builders in the background once per key; `get` waits for the result."""
+
+    def __init__(self, max_workers: int = 1, thread_name_prefix: str = "warmup"):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._futures: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, builder: Callable[[], Any]) -> Future:
+        with self._lock:
+            fut = self._futures.get(key)
+            if fut is None or (fut.done() and fut.exception() is not None):
+                # failed builds are retried on the next request
+                fut = self._pool.submit(builder)
+                self._futures[key] = fut
+            return fut
+
+    def get(self, key: Hashable, builder: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        return self.submit(key, builder).result(timeout=timeout)
+
+    def ready(self, key: Hashable) -> bool:
+        fut = self._futures.get(key)
+        return bool(fut and fut.done() and fut.exception() is None)
+
+    def shutdown(self, on_result: Optional[Callable[[Any], None]] = None) -> None:
+        """
+        Stop the preloader: queued builds are cancelled, and `on_result` (e.g.
+        a close) gets every built result, including builds still running,
+        which it receives when they finish.
+        """
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if on_result is None:
+            return
+
+        def _done(fut: Future) -> None:
+            if fut.cancelled() or fut.exception() is not None:
+                return
+            try:
+                on_result(fut.result())
+            except Exception:
+                pass
+
+        for fut in futures:
+            fut.add_done_callback(_done)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._futures.pop(key, None)
@@ -3,67 +3,108 @@ LLM Configuration with Rate Limit Protection
 """
 
 import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
+PROFILE_KEYS = ("temperature", "max_tokens", "top_p")
+_profiles_cache: Dict[str, Dict[str, Any]] = {}
+
 
-def get_llm():
+def load_llm_profiles(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
     """
-    Get LLM with provider selection and fallback handling.
+    Per-agent generation settings from config/llm_profiles.yaml (LLM_PROFILES_PATH).
+    Each agent's profile is merged over `default`.
     """
+    path = path or os.getenv("LLM_PROFILES_PATH") or str(Path(__file__).parent / "config" / "llm_profiles.yaml")
+    if path in _profiles_cache:
+        return _profiles_cache[path]
+    try:
+        import yaml
+        with open(path, "r", encoding="utf-8") as f:
+            raw = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        raw = {}
+    default = {k: v for k, v in (raw.get("default") or {}).items() if k in PROFILE_KEYS}
+    profiles = {"default": default}
+    for name, values in raw.items():
+        if name != "default" and isinstance(values, dict):
+            profiles[name] = {**default, **{k: v for k, v in values.items() if k in PROFILE_KEYS}}
+    _profiles_cache[path] = profiles
+    return profiles
+
+
+def get_llm_profile(agent_name: str) -> Dict[str, Any]:
+    profiles = load_llm_profiles()
+    return dict(profiles.get(agent_name, profiles.get("default", {})))
+
+
+def resolve_provider() -> str:
+    """Provider get_llm() will use: ACTIVE_LLM_PROVIDER, else the first configured API key, else Ollama."""
     active_provider = os.getenv("ACTIVE_LLM_PROVIDER", "").lower().strip()
+    if active_provider in ("groq", "cerebras", "ollama"):
+        return active_provider
+
+    # Auto-detection
+    groq_key = os.getenv("GROQ_API_KEY", "").strip()
+    if groq_key and groq_key != "gsk_your_groq_api_key_here":
+        return "groq"
+
+    cerebras_key = os.getenv("CEREBRAS_API_KEY", "").strip()
+    if cerebras_key and cerebras_key.startswith("csk-"):
+        return "cerebras"
+
+    return "ollama"
+
 
+def get_llm(profile: Optional[Dict[str, Any]] = None):
+    """
+    Get LLM with provider selection and fallback handling.
+    `profile` (temperature / max_tokens / top_p) overrides the provider defaults.
+    """
+    overrides = {k: v for k, v in (profile or {}).items() if k in PROFILE_KEYS and v is not None}
     try:
-        if active_provider == "groq":
-            return _get_groq_llm()
-        if active_provider == "cerebras":
-            return _get_cerebras_llm()
-        if active_provider == "ollama":
-            return _get_ollama_llm()
-
-        # Auto-detection
-        groq_key = os.getenv("GROQ_API_KEY", "").strip()
-        if groq_key and groq_key != "gsk_your_groq_api_key_here":
-            return _get_groq_llm()
-
-        cerebras_key = os.getenv("CEREBRAS_API_KEY", "").strip()
-        if cerebras_key and cerebras_key.startswith("csk-"):
-            return _get_cerebras_llm()
-
-        return _get_ollama_llm()
+        provider = resolve_provider()
+        if provider == "groq":
+            return _get_groq_llm(**overrides)
+        if provider == "cerebras":
+            return _get_cerebras_llm(**overrides)
+        return _get_ollama_llm(**overrides)
     
     except Exception as e:
         print(f"⚠️ LLM initialization failed: {e}")
         print("🔄 Attempting direct Ollama fallback...")
-        return _get_ollama_llm_direct()
+        return _get_ollama_llm_direct(**overrides)
 
 
-def _get_groq_llm():
+def _get_groq_llm(**overrides):
     from crewai import LLM
     model = os.getenv("GROQ_MODEL_NAME", "llama-3.1-8b-instant")
     print(f"🚀 Using Groq LLM: {model}")
+    params = {"temperature": 0.7, "max_tokens": 2048, **overrides}
     return LLM(
         model=f"groq/{model}",
         api_key=os.getenv("GROQ_API_KEY"),
-        temperature=0.7,
-        max_tokens=2048,
         timeout=30,
         max_retries=3,
+        **params,
     )
 
 
-def _get_cerebras_llm():
+def _get_cerebras_llm(**overrides):
     from crewai import LLM
     model = os.getenv("CEREBRAS_MODEL_NAME", "llama3.1-8b")
     print(f"🔄 Using Cerebras LLM: {model}")
+    params = {"temperature": 0.7, "max_tokens": 4096, **overrides}
     return LLM(
         model=f"cerebras/{model}",
         api_key=os.getenv("CEREBRAS_API_KEY"),
-        temperature=0.7,
-        max_tokens=4096,
         timeout=30,
         max_retries=3,
+        **params,
     )
 
 
@@ -88,11 +129,8 @@ def _resolve_ollama_url(base_url: str) -> str:
     return base_url
 
 
-def _get_ollama_llm():
-    from crewai import LLM
-    
-    print("🏠 Using Local Ollama LLM")
-
+def ollama_chat_url() -> str:
+    """Ollama server for the chat model (OLLAMA_HOST_MODE=remote uses OLLAMA_REMOTE_URL)."""
     # Start from base URL
     ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
@@ -102,24 +140,40 @@ def _get_ollama_llm():
         ollama_url = os.getenv("OLLAMA_REMOTE_URL", ollama_url)
 
     # Docker environment detection - auto convert to host.docker.internal
-    ollama_url = _resolve_ollama_url(ollama_url)
+    return _resolve_ollama_url(ollama_url)
+
 
+def ollama_embeddings_url() -> str:
+    """Ollama server for the embedding model (may differ from the chat server)."""
+    ollama_base = os.getenv(
+        "OLLAMA_EMBEDDINGS_BASE_URL",
+        os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    )
+    return _resolve_ollama_url(ollama_base).rstrip("/")
+
+
+def _get_ollama_llm(**overrides):
+    from crewai import LLM
+    
+    print("🏠 Using Local Ollama LLM")
+
+    ollama_url = ollama_chat_url()
     model = os.getenv("OLLAMA_MODEL_NAME", "llama3.2")
     
     print(f"📍 Ollama URL: {ollama_url}")
     print(f"🤖 Model: {model}")
     
+    params = {"temperature": 0.7, "max_tokens": 4096, **overrides}
     return LLM(
         model=f"ollama/{model}",
         base_url=ollama_url,
-        temperature=0.7,
-        max_tokens=4096,
         timeout=120,
         max_retries=3,
+        **params,
     )
 
 
-def _get_ollama_llm_direct():
+def _get_ollama_llm_direct(**overrides):
     """
     Direct fallback without using CrewAI LLM wrapper.
     Uses litellm directly.
@@ -141,10 +195,11 @@ def _get_ollama_llm_direct():
         
         # Return a simple wrapper that CrewAI can use
         from crewai import LLM
+        params = {"temperature": 0.7, **overrides}
         return LLM(
             model=f"ollama/{model}",
             base_url=ollama_url,
-            temperature=0.7,
+            **params,
         )
     except Exception as e:
         print(f"❌ Direct fallback also failed: {e}")
@@ -155,12 +210,7 @@ def get_embeddings_config() -> dict:
     """
     Embeddings configuration using Ollama.
     """
-    ollama_base = os.getenv(
-        "OLLAMA_EMBEDDINGS_BASE_URL",
-        os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-    )
-
-    ollama_base = _resolve_ollama_url(ollama_base).rstrip("/")
+    ollama_base = ollama_embeddings_url()
 
     return {
         "provider": "ollama",
@@ -0,0 +1,612 @@
+"""
+In-process vector engine (VECTOR_STORE=local).
+
+For small and medium per-course corpora a Chroma server is more machinery than
+the search needs. This backend keeps each collection in a directory under
+LOCAL_VECTOR_DIR:
+
+* `vectors.f32`: normalized float32 embeddings in a memory-mapped
+  [capacity, dim] matrix. It doubles in size when full, and rows of deleted
+  chunks are reused.
+* `meta.db`: SQLite rows (slot, id, document, metadata, insertion order).
+  SQLite is the source of truth: a vector row only counts once its slot is
+  committed here.
+* `codes.i8` + `scales.f32` or `codes.b1`: quantized copies of the vectors
+  (LOCAL_QUANTIZATION=int8 or binary).
+* `hnsw.bin`: optional HNSW graph.
+
+Below LOCAL_HNSW_THRESHOLD live chunks, queries are exact. All query vectors
+are scored against blocks of LOCAL_VECTOR_BLOCK rows with one matrix product
+per block, and a running top-k is kept per query. Above the threshold, an
+hnswlib inner-product index takes over when hnswlib is installed (it is
+optional; without it queries stay exact). The index is kept up to date on
+every write and saved at most every LOCAL_HNSW_SAVE_SECONDS and at exit. It
+is rebuilt on open if it is older than the data.
+
+Quantization shrinks what the exact scan reads. With `int8`, each row is
+stored as dim signed bytes plus a float32 scale, 4x smaller than float32. With
+`binary`, each row is stored as one sign bit per dimension, 32x smaller. The
+first pass scans only these codes and keeps k·LOCAL_RESCORE_FACTOR candidates
+per query (default 4 for int8, 16 for binary). The candidates are then
+rescored against their float32 rows, so returned distances stay exact. The
+float32 file stays on disk for rescoring and export, but a query only pages
+in the rows it rescores. Codes are rebuilt from the float32 rows when the
+setting changes. The HNSW path (when active) does not use them.
+
+Collections follow the Chroma API subset described in vector_store.py.
+Distances are squared L2 between unit vectors (2 - 2·cos), which is what
+Chroma's default space gives for normalized embeddings. `where` filters
+support plain equality on metadata keys. Only one process may open a
+directory at a time.
+"""
+import atexit
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .vector_store import VectorStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    slot INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    document TEXT,
+    metadata TEXT,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rows_seq ON rows(seq);
+CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+BLOCK_ROWS = int(os.getenv("LOCAL_VECTOR_BLOCK", "65536"))
+HNSW_THRESHOLD = int(os.getenv("LOCAL_HNSW_THRESHOLD", "50000"))
+HNSW_EF = int(os.getenv("LOCAL_HNSW_EF", "128"))
+HNSW_M = int(os.getenv("LOCAL_HNSW_M", "16"))
+HNSW_SAVE_SECONDS = float(os.getenv("LOCAL_HNSW_SAVE_SECONDS", "60"))
+QUANTIZATION_MODES = ("none", "int8", "binary")
+# candidates rescored per result; 0 = per-mode default (binary codes need a deeper pool)
+RESCORE_FACTOR = int(os.getenv("LOCAL_RESCORE_FACTOR", "0") or 0)
+_DEFAULT_RESCORE = {"int8": 4, "binary": 16}
+_MIN_CAPACITY = 1024
+# int8 codes are widened to float32 this many rows at a time, so the copy stays in cache
+_QUANT_SUBBLOCK = 1024
+# set bits per 8- and 16-bit value, for Hamming distances between packed sign bits
+_POPCOUNT8 = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+_POPCOUNT16 = _POPCOUNT8[np.arange(65536) & 255] + _POPCOUNT8[np.arange(65536) >> 8]
+
+
+def _hnswlib():
+    try:
+        import hnswlib
+        return hnswlib
+    except ImportError:
+        return None
+
+
+def _normalize(vectors: Any) -> np.ndarray:
+    arr = np.asarray(vectors, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr[None, :]
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    return arr / np.maximum(norms, 1e-12)
+
+
+def _quantization(mode: Optional[str] = None) -> str:
+    mode = (mode or os.getenv("LOCAL_QUANTIZATION", "none")).strip().lower()
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"LOCAL_QUANTIZATION must be one of {', '.join(QUANTIZATION_MODES)} (got {mode!r})")
+    return mode
+
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-row int8 codes and the float32 scale that restores them."""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed into bytes."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def bytes_per_vector(dim: int, quantization: str = "none") -> int:
+    """Bytes a first-pass scan reads per row."""
+    if quantization == "int8":
+        return dim + 4
+    if quantization == "binary":
+        return (dim + 7) // 8
+    return dim * 4
+
+
+def _grow_memmap(path: Path, dtype: Any, shape: tuple) -> np.memmap:
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < nbytes:
+            f.truncate(nbytes)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+def _matches(meta: Optional[Dict[str, Any]], where: Dict[str, Any]) -> bool:
+    meta = meta or {}
+    return all(meta.get(k) == v for k, v in where.items())
+
+
+def _check_where(where: Optional[Dict[str, Any]]) -> None:
+    if where and any(k.startswith("$") or isinstance(v, dict) for k, v in where.items()):
+        raise ValueError("Local vector store supports only equality filters in `where`")
+
+
+class LocalCollection:
+    """One collection: memory-mapped vectors + SQLite rows (+ optional HNSW graph)."""
+
+    def __init__(self, path: Path, name: str, embedding_function: Any = None,
+                 quantization: Optional[str] = None):
+        self.name = name
+        self.path = path
+        self.quantization = _quantization(quantization)
+        path.mkdir(parents=True, exist_ok=True)
+        if embedding_function is None:
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+            # same default as a Chroma client, so vectors are interchangeable between backends
+            embedding_function = DefaultEmbeddingFunction()
+        self._ef = embedding_function
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(path / "meta.db"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        info = dict(self._db.execute("SELECT key, value FROM info").fetchall())
+        self._dim = int(info.get("dim", 0))
+        self._capacity = int(info.get("capacity", 0))
+        self._generation = int(info.get("generation", 0))
+        self._seq = int(self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM rows").fetchone()[0])
+
+        self._slot_of: Dict[str, int] = {}
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        for slot, id_ in self._db.execute("SELECT slot, id FROM rows"):
+            self._slot_of[id_] = slot
+            self._alive[slot] = True
+        self._high = int(max(self._slot_of.values(), default=-1)) + 1
+        self._free = [int(s) for s in np.flatnonzero(~self._alive[:self._high])]
+        self._vec: Optional[np.memmap] = None
+        self._codes: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        if self._dim and self._capacity:
+            self._vec = np.memmap(path / "vectors.f32", dtype=np.float32, mode="r+",
+                                  shape=(self._capacity, self._dim))
+            self._map_codes()
+            if info.get("quantization", "none") != self.quantization:
+                self._rebuild_codes()
+
+        self._index = None
+        self._index_dirty = False
+        self._index_saved_at = time.time()
+        self._open_index()
+
+    # -----------------------------
+    # Storage
+    # -----------------------------
+    def _set_info(self, **values: Any) -> None:
+        self._db.executemany("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                             [(k, str(v)) for k, v in values.items()])
+
+    def _ensure_capacity(self, rows: int, dim: int) -> None:
+        if self._dim and dim != self._dim:
+            raise ValueError(f"Embedding dimension {dim} does not match collection dimension {self._dim}")
+        if rows <= self._capacity:
+            return
+        capacity = max(_MIN_CAPACITY, self._capacity)
+        while capacity < rows:
+            capacity *= 2
+        for arr in (self._vec, self._codes, self._scales):
+            if arr is not None:
+                arr.flush()
+        self._vec = _grow_memmap(self.path / "vectors.f32", np.float32, (capacity, dim))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._capacity] = self._alive
+        self._alive = alive
+        self._dim, self._capacity = dim, capacity
+        self._map_codes()
+        self._set_info(dim=dim, capacity=capacity, quantization=self.quantization)
+        if self._index is not None and self._index.get_max_elements() < capacity:
+            self._index.resize_index(capacity)
+
+    def _map_codes(self) -> None:
+        if self.quantization == "int8":
+            self._codes = _grow_memmap(self.path / "codes.i8", np.int8, (self._capacity, self._dim))
+            self._scales = _grow_memmap(self.path / "scales.f32", np.float32, (self._capacity,))
+        elif self.quantization == "binary":
+            self._codes = _grow_memmap(self.path / "codes.b1", np.uint8, (self._capacity, (self._dim + 7) // 8))
+
+    def _write_codes(self, slots: np.ndarray, vectors: np.ndarray) -> None:
+        if self.quantization == "int8":
+            self._codes[slots], self._scales[slots] = quantize_int8(vectors)
+            self._scales.flush()
+        elif self.quantization == "binary":
+            self._codes[slots] = quantize_binary(vectors)
+        if self._codes is not None:
+            self._codes.flush()
+
+    def _rebuild_codes(self) -> None:
+        t0 = time.perf_counter()
+        for lo in range(0, self._high, BLOCK_ROWS):
+            hi = min(self._high, lo + BLOCK_ROWS)
+            self._write_codes(np.arange(lo, hi), np.asarray(self._vec[lo:hi]))
+        self._set_info(quantization=self.quantization)
+        if self._high and self.quantization != "none":
+            print(f"🗜️ Built {self.quantization} codes for {self.name}: {self._high} rows "
+                  f"in {time.perf_counter() - t0:.1f}s")
+
+    def _embed(self, documents: Optional[Sequence[str]], embeddings: Any) -> np.ndarray:
+        if embeddings is None:
+            if documents is None:
+                raise ValueError("Either documents or embeddings are required")
+            embeddings = self._ef(list(documents))
+        return _normalize(embeddings)
+
+    # -----------------------------
+    # HNSW
+    # -----------------------------
+    def _open_index(self) -> None:
+        hnswlib = _hnswlib()
+        if hnswlib is None or not self._dim:
+            return
+        info = dict(self._db.execute("SELECT key, value FROM info").fetchall())
+        index_file = self.path / "hnsw.bin"
+        if index_file.exists() and int(info.get("hnsw_generation", -1)) == self._generation:
+            index = hnswlib.Index(space="ip", dim=self._dim)
+            index.load_index(str(index_file), max_elements=self._capacity)
+            index.set_ef(HNSW_EF)
+            self._index = index
+        elif len(self._slot_of) >= HNSW_THRESHOLD:
+            self._build_index()
+
+    def _build_index(self) -> None:
+        hnswlib = _hnswlib()
+        if hnswlib is None:
+            return
+        t0 = time.perf_counter()
+        index = hnswlib.Index(space="ip", dim=self._dim)
+        index.init_index(max_elements=self._capacity, ef_construction=200, M=HNSW_M)
+        slots = np.flatnonzero(self._alive)
+        for lo in range(0, len(slots), BLOCK_ROWS):
+            part = slots[lo:lo + BLOCK_ROWS]
+            index.add_items(np.asarray(self._vec[part]), part)
+        index.set_ef(HNSW_EF)
+        self._index = index
+        self._save_index(force=True)
+        print(f"🧭 Built HNSW index for {self.name}: {len(slots)} vectors in {time.perf_counter() - t0:.1f}s")
+
+    def _save_index(self, force: bool = False) -> None:
+        if self._index is None or not (self._index_dirty or force):
+            return
+        if not force and time.time() - self._index_saved_at < HNSW_SAVE_SECONDS:
+            return
+        self._index.save_index(str(self.path / "hnsw.bin"))
+        self._set_info(hnsw_generation=self._generation)
+        self._index_dirty = False
+        self._index_saved_at = time.time()
+
+    def _after_write(self) -> None:
+        self._generation += 1
+        self._set_info(generation=self._generation)
+        if self._index is None and len(self._slot_of) >= HNSW_THRESHOLD:
+            self._build_index()
+        elif self._index is not None:
+            self._index_dirty = True
+            self._save_index()
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def upsert(self, ids: Sequence[str], embeddings: Any = None, documents: Optional[Sequence[str]] = None,
+               metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None, **_: Any) -> None:
+        ids = [str(i) for i in ids]
+        if not ids:
+            return
+        vectors = self._embed(documents, embeddings)
+        if len(vectors) != len(ids):
+            raise ValueError(f"{len(ids)} ids but {len(vectors)} embeddings")
+        # last occurrence wins for ids repeated within the batch
+        last = {id_: i for i, id_ in enumerate(ids)}
+        keep = sorted(last.values())
+        with self._lock:
+            slots = []
+            for i in keep:
+                slot = self._slot_of.get(ids[i])
+                if slot is None:
+                    slot = self._free.pop() if self._free else self._high
+                    self._high = max(self._high, slot + 1)
+                slots.append(slot)
+            self._ensure_capacity(self._high, vectors.shape[1])
+            slot_arr = np.asarray(slots)
+            self._vec[slot_arr] = vectors[keep]
+            self._vec.flush()
+            self._write_codes(slot_arr, vectors[keep])
+
+            rows = []
+            for slot, i in zip(slots, keep):
+                self._seq += 1
+                doc = documents[i] if documents is not None else None
+                meta = metadatas[i] if metadatas is not None else None
+                rows.append((slot, ids[i], doc, json.dumps(meta) if meta is not None else None, self._seq))
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany(
+                "INSERT INTO rows (slot, id, document, metadata, seq) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET document=COALESCE(excluded.document, rows.document), "
+                "metadata=COALESCE(excluded.metadata, rows.metadata)",
+                rows,
+            )
+            self._db.execute("COMMIT")
+            for slot, i in zip(slots, keep):
+                self._slot_of[ids[i]] = slot
+            self._alive[slot_arr] = True
+            if self._index is not None:
+                self._index.add_items(vectors[keep], slot_arr)
+            self._after_write()
+
+    def add(self, ids: Sequence[str], embeddings: Any = None, documents: Optional[Sequence[str]] = None,
+            metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None, **_: Any) -> None:
+        """Like Chroma: ids that already exist are left unchanged."""
+        ids = [str(i) for i in ids]
+        new = [i for i, id_ in enumerate(ids) if id_ not in self._slot_of]
+        if not new:
+            return
+        if len(new) == len(ids):
+            return self.upsert(ids, embeddings, documents, metadatas)
+        pick = lambda seq: [seq[i] for i in new] if seq is not None else None  # noqa: E731
+        self.upsert([ids[i] for i in new], pick(list(embeddings)) if embeddings is not None else None,
+                    pick(documents), pick(metadatas))
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None, **_: Any) -> None:
+        _check_where(where)
+        with self._lock:
+            if where:
+                targets = [r["id"] for r in self._rows(None, where)]
+                if ids is not None:
+                    wanted = set(map(str, ids))
+                    targets = [t for t in targets if t in wanted]
+            else:
+                targets = [str(i) for i in (ids or []) if str(i) in self._slot_of]
+            if not targets:
+                return
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany("DELETE FROM rows WHERE id=?", [(t,) for t in targets])
+            self._db.execute("COMMIT")
+            for t in targets:
+                slot = self._slot_of.pop(t)
+                self._alive[slot] = False
+                self._free.append(slot)
+                if self._index is not None:
+                    self._index.mark_deleted(slot)
+            self._after_write()
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def count(self) -> int:
+        return len(self._slot_of)
+
+    @property
+    def configuration(self) -> Dict[str, Any]:
+        return {"embedding_function": self._ef, "hnsw": {"space": "ip"}}
+
+    def _rows(self, slots: Optional[Sequence[int]], where: Optional[Dict[str, Any]] = None,
+              limit: Optional[int] = None, offset: Optional[int] = None) -> List[Dict[str, Any]]:
+        if slots is not None:
+            found: Dict[int, Dict[str, Any]] = {}
+            slot_list = [int(s) for s in slots]
+            for lo in range(0, len(slot_list), 900):
+                part = slot_list[lo:lo + 900]
+                for slot, id_, doc, meta in self._db.execute(
+                        f"SELECT slot, id, document, metadata FROM rows WHERE slot IN ({','.join('?' * len(part))})",
+                        part):
+                    found[slot] = {"slot": slot, "id": id_, "document": doc,
+                                   "metadata": json.loads(meta) if meta else None}
+            rows = [found[s] for s in slot_list if s in found]
+        else:
+            sql = "SELECT slot, id, document, metadata FROM rows ORDER BY seq"
+            params: List[Any] = []
+            if not where and (limit is not None or offset):
+                sql += " LIMIT ? OFFSET ?"
+                params = [limit if limit is not None else -1, offset or 0]
+            rows = [{"slot": s, "id": i, "document": d, "metadata": json.loads(m) if m else None}
+                    for s, i, d, m in self._db.execute(sql, params)]
+        if where:
+            rows = [r for r in rows if _matches(r["metadata"], where)]
+            if slots is None and (limit is not None or offset):
+                start = offset or 0
+                rows = rows[start:start + limit] if limit is not None else rows[start:]
+        return rows
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = ("documents", "metadatas"), **_: Any) -> Dict[str, Any]:
+        _check_where(where)
+        with self._lock:
+            if ids is not None:
+                slots = [self._slot_of[str(i)] for i in ids if str(i) in self._slot_of]
+                rows = self._rows(slots, where)
+                if offset or limit is not None:
+                    start = offset or 0
+                    rows = rows[start:start + limit] if limit is not None else rows[start:]
+            else:
+                rows = self._rows(None, where, limit, offset)
+            embeddings = None
+            if "embeddings" in include:
+                embeddings = np.asarray(self._vec[[r["slot"] for r in rows]]) if rows and self._vec is not None \
+                    else np.zeros((0, self._dim), dtype=np.float32)
+        return {
+            "ids": [r["id"] for r in rows],
+            "documents": [r["document"] for r in rows] if "documents" in include else None,
+            "metadatas": [r["metadata"] for r in rows] if "metadatas" in include else None,
+            "embeddings": embeddings,
+            "included": list(include),
+        }
+
+    def _allowed(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        mask = self._alive[:self._high].copy()
+        if where:
+            keep = np.zeros_like(mask)
+            for r in self._rows(None, where):
+                keep[r["slot"]] = True
+            mask &= keep
+        return mask
+
+    def _exact_topk(self, queries: np.ndarray, k: int, mask: np.ndarray):
+        """Running top-k over blocks of rows: one (queries x block) matrix product per block."""
+        return self._block_topk(queries, k, mask, lambda lo, hi: queries @ np.asarray(self._vec[lo:hi]).T)
+
+    def _quantized_topk(self, queries: np.ndarray, k: int, mask: np.ndarray):
+        """First pass over the codes for k * rescore-factor candidates, then exact rescoring."""
+        pool = min(int(mask.sum()), k * max(1, RESCORE_FACTOR or _DEFAULT_RESCORE[self.quantization]))
+        if self.quantization == "int8":
+            def score(lo: int, hi: int) -> np.ndarray:
+                return np.concatenate([
+                    queries @ np.asarray(self._codes[s:min(hi, s + _QUANT_SUBBLOCK)], dtype=np.float32).T
+                    for s in range(lo, hi, _QUANT_SUBBLOCK)], axis=1) * self._scales[lo:hi]
+        else:
+            qbits = quantize_binary(queries)
+            wide = qbits.shape[1] % 2 == 0
+            table = _POPCOUNT16 if wide else _POPCOUNT8
+
+            def score(lo: int, hi: int) -> np.ndarray:
+                codes = np.asarray(self._codes[lo:hi])
+                if wide:
+                    codes = codes.view(np.uint16)
+                # negative Hamming distance: more matching signs scores higher
+                return -np.stack([table[np.bitwise_xor(codes, qb.view(np.uint16) if wide else qb)]
+                                  .sum(axis=1, dtype=np.int32) for qb in qbits]).astype(np.float32)
+
+        candidates, first = self._block_topk(queries, pool, mask, score)
+        labels = np.zeros((len(queries), k), dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, q in enumerate(queries):
+            cand = np.sort(candidates[i][np.isfinite(first[i])])
+            exact = np.asarray(self._vec[cand]) @ q
+            top = np.argsort(-exact)[:k]
+            labels[i, :len(top)], scores[i, :len(top)] = cand[top], exact[top]
+        return labels, scores
+
+    def _block_topk(self, queries: np.ndarray, k: int, mask: np.ndarray, score_block):
+        m = len(queries)
+        best_s = np.empty((m, 0), dtype=np.float32)
+        best_i = np.empty((m, 0), dtype=np.int64)
+        for lo in range(0, self._high, BLOCK_ROWS):
+            hi = min(self._high, lo + BLOCK_ROWS)
+            block_mask = mask[lo:hi]
+            if not block_mask.any():
+                continue
+            scores = score_block(lo, hi)
+            scores[:, ~block_mask] = -np.inf
+            cand_s = np.concatenate([best_s, scores], axis=1)
+            cand_i = np.concatenate([best_i, np.broadcast_to(np.arange(lo, hi), (m, hi - lo))], axis=1)
+            if cand_s.shape[1] > k:
+                top = np.argpartition(-cand_s, k - 1, axis=1)[:, :k]
+                cand_s = np.take_along_axis(cand_s, top, axis=1)
+                cand_i = np.take_along_axis(cand_i, top, axis=1)
+            best_s, best_i = cand_s, cand_i
+        order = np.argsort(-best_s, axis=1)
+        return np.take_along_axis(best_i, order, axis=1), np.take_along_axis(best_s, order, axis=1)
+
+    def query(self, query_texts: Optional[Sequence[str]] = None, query_embeddings: Any = None,
+              n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances"), **_: Any) -> Dict[str, Any]:
+        _check_where(where)
+        queries = self._embed(query_texts, query_embeddings)
+        with self._lock:
+            if self._vec is None or not self._slot_of:
+                labels = np.empty((len(queries), 0), dtype=np.int64)
+                scores = np.empty((len(queries), 0), dtype=np.float32)
+            elif self._index is not None and not where:
+                k = min(int(n_results), len(self._slot_of))
+                self._index.set_ef(max(HNSW_EF, k))
+                labels, dist = self._index.knn_query(queries, k=k)
+                scores = 1.0 - dist
+            else:
+                mask = self._allowed(where)
+                k = min(int(n_results), int(mask.sum()))
+                topk = self._exact_topk if self.quantization == "none" else self._quantized_topk
+                labels, scores = topk(queries, k, mask) if k > 0 else (
+                    np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32))
+
+            out: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+            for q_labels, q_scores in zip(labels, scores):
+                valid = np.isfinite(q_scores)
+                slots = [int(s) for s in q_labels[valid]]
+                rows = {r["slot"]: r for r in self._rows(slots)}
+                kept = [(s, float(sc)) for s, sc in zip(slots, q_scores[valid]) if s in rows]
+                out["ids"].append([rows[s]["id"] for s, _ in kept])
+                out["documents"].append([rows[s]["document"] for s, _ in kept])
+                out["metadatas"].append([rows[s]["metadata"] for s, _ in kept])
+                out["distances"].append([max(0.0, 2.0 - 2.0 * sc) for _, sc in kept])
+                out["embeddings"].append(np.asarray(self._vec[[s for s, _ in kept]]) if kept else [])
+        for key in ("documents", "metadatas", "distances", "embeddings"):
+            if key not in include:
+                out[key] = None
+        out["included"] = list(include)
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._save_index(force=self._index_dirty)
+            for arr in (self._vec, self._codes, self._scales):
+                if arr is not None:
+                    arr.flush()
+            self._db.close()
+
+
+class LocalVectorStore(VectorStore):
+    """Collections as directories under `root` (LOCAL_VECTOR_DIR)."""
+
+    mode = "local"
+
+    def __init__(self, root: Optional[str] = None, quantization: Optional[str] = None):
+        self.root = Path(root or os.getenv("LOCAL_VECTOR_DIR", "./data/vectors")).resolve()
+        self.quantization = _quantization(quantization)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def collection(self, name: str, embedding_function: Any = None) -> LocalCollection:
+        with self._lock:
+            col = self._collections.get(name)
+            if col is None:
+                col = self._collections[name] = LocalCollection(self.root / name, name, embedding_function,
+                                                                quantization=self.quantization)
+        return col
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            col = self._collections.pop(name, None)
+            if col is not None:
+                col.close()
+            path = self.root / name
+            if not path.exists():
+                raise ValueError(f"Collection {name} does not exist")
+            shutil.rmtree(path)
+
+    def max_batch_size(self) -> int:
+        return 100_000
+
+    def describe(self) -> Dict[str, str]:
+        engine = "hnsw" if _hnswlib() is not None else "exact"
+        return {"mode": self.mode, "location": str(self.root), "engine": engine,
+                "quantization": self.quantization}
+
+    def close(self) -> None:
+        with self._lock:
+            for col in self._collections.values():
+                try:
+                    col.close()
+                except Exception:
+                    pass
+            self._collections.clear()
@@ -16,7 +16,13 @@ def get_mcp_server_params():
             "transport": "streamable-http",
         }
 
-    # Local stdio (requires docker mcp CLI on host)
+    # Local stdio (requires docker mcp CLI on host unless MCP_COMMAND overrides it)
+    command = os.getenv("MCP_COMMAND", "").strip()
+    if command:
+        return {
+            "command": command,
+            "args": os.getenv("MCP_ARGS", "").split(),
+        }
     return {
         "command": "docker",
         "args": ["mcp", "gateway", "run"],
@@ -0,0 +1,338 @@
+"""
+Bounded CrewAI memory under CREWAI_STORAGE_DIR.
+
+The research crew runs with memory on, and CrewAI only ever appends to its
+stores:
+
+* long-term memory: `long_term_memory_storage.db`, a SQLite table that is
+  looked up by exact task description;
+* short-term and entity memory: `memory_*` collections in the Chroma store
+  (`chroma.sqlite3`) in the same directory.
+
+The memory search that runs before every research kickoff slows down as
+these stores grow. `MemoryMaintainer` keeps them bounded. It runs at startup
+and then every MEMORY_MAINTENANCE_SECONDS. Each run does the following:
+
+* long-term memory:
+  - adds an index on (task_description, datetime), the lookup key;
+  - drops rows older than MEMORY_MAX_AGE_DAYS;
+  - collapses near-identical rows (same task, same normalized metadata) to
+    the newest one;
+  - keeps at most MEMORY_LTM_PER_TASK rows per task and MEMORY_LTM_MAX_ROWS
+    in total;
+  - VACUUMs once free pages pass a quarter of the file.
+* memory collections:
+  - drops exact duplicates, and near duplicates whose embeddings have a
+    cosine similarity of at least MEMORY_DEDUP_SIMILARITY (newest kept);
+  - trims each collection to its newest MEMORY_RAG_MAX_ITEMS. Chroma
+    metadata has no timestamps, so insertion order stands in for age.
+
+The memory collections are read in pages of MEMORY_PAGE_SIZE. They are
+compacted only while no crew kickoff with memory is running in this process
+(crews wrap kickoffs in `memory_in_use`); kickoffs that start meanwhile wait
+for the compaction to finish. A run that finds a kickoff active skips the
+collections and tries again next time. The Chroma client is opened with
+CrewAI's settings, so in-process both share one Chroma system.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+LTM_FILE = "long_term_memory_storage.db"
+CHROMA_FILE = "chroma.sqlite3"
+_VACUUM_FREE_RATIO = 0.25
+# metadata that differs between otherwise identical long-term memories
+_VOLATILE_KEYS = {"datetime", "timestamp", "score"}
+PAGE_SIZE = int(os.getenv("MEMORY_PAGE_SIZE", "500"))
+
+# kickoffs using memory vs. compaction of the memory collections
+_gate = threading.Condition()
+_active_kickoffs = 0
+_compacting = False
+
+
+@contextmanager
+def memory_in_use(enabled: bool = True) -> Iterator[None]:
+    """Wrap crew kickoffs that read or write memory; waits while the collections are compacted."""
+    global _active_kickoffs
+    if not enabled:
+        yield
+        return
+    with _gate:
+        _gate.wait_for(lambda: not _compacting)
+        _active_kickoffs += 1
+    try:
+        yield
+    finally:
+        with _gate:
+            _active_kickoffs -= 1
+            _gate.notify_all()
+
+
+@contextmanager
+def _exclusive() -> Iterator[bool]:
+    """Yields False (and holds nothing) when a kickoff is running; else blocks new kickoffs until done."""
+    global _compacting
+    with _gate:
+        if _active_kickoffs or _compacting:
+            yield False
+            return
+        _compacting = True
+    try:
+        yield True
+    finally:
+        with _gate:
+            _compacting = False
+            _gate.notify_all()
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+def _dir_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) if path.exists() else 0
+
+
+class MemoryMaintainer:
+    """Caps, deduplicates and compacts the CrewAI memory stores."""
+
+    def __init__(self, storage_dir: Optional[str] = None):
+        self.storage_dir = Path(storage_dir or os.getenv("CREWAI_STORAGE_DIR", "./data/crewai_memory")).resolve()
+        self.max_age_days = float(os.getenv("MEMORY_MAX_AGE_DAYS", "90"))
+        self.ltm_max_rows = int(os.getenv("MEMORY_LTM_MAX_ROWS", "5000"))
+        self.ltm_per_task = int(os.getenv("MEMORY_LTM_PER_TASK", "20"))
+        self.rag_max_items = int(os.getenv("MEMORY_RAG_MAX_ITEMS", "2000"))
+        self.similarity = float(os.getenv("MEMORY_DEDUP_SIMILARITY", "0.97"))
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -----------------------------
+    # Long-term memory (SQLite)
+    # -----------------------------
+    def compact_ltm(self) -> Dict[str, Any]:
+        path = self.storage_dir / LTM_FILE
+        if not path.exists():
+            return {"rows": 0, "deleted": 0, "vacuumed": False}
+        conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+        try:
+            if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='long_term_memories'"
+            ).fetchone():
+                return {"rows": 0, "deleted": 0, "vacuumed": False}
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ltm_task_datetime "
+                "ON long_term_memories(task_description, datetime)"
+            )
+            conn.execute("BEGIN IMMEDIATE")
+            deleted = 0
+            if self.max_age_days > 0:
+                cutoff = time.time() - self.max_age_days * 86400
+                deleted += conn.execute(
+                    "DELETE FROM long_term_memories WHERE CAST(datetime AS REAL) < ?", (cutoff,)
+                ).rowcount
+
+            # near-identical: same task and same metadata once volatile keys
+            # are dropped and text is normalized; the newest row wins
+            seen, dupes = set(), []
+            rows = conn.execute(
+                "SELECT id, task_description, metadata FROM long_term_memories "
+                "ORDER BY CAST(datetime AS REAL) DESC, id DESC"
+            )
+            for row_id, task, metadata in rows:
+                try:
+                    meta = json.loads(metadata or "{}")
+                    if isinstance(meta, dict):
+                        meta = {k: v for k, v in meta.items() if k not in _VOLATILE_KEYS}
+                    meta = _normalize(json.dumps(meta, sort_keys=True))
+                except ValueError:
+                    meta = _normalize(metadata)
+                key = hashlib.sha1(f"{_normalize(task)}\x00{meta}".encode("utf-8")).hexdigest()
+                if key in seen:
+                    dupes.append((row_id,))
+                else:
+                    seen.add(key)
+            conn.executemany("DELETE FROM long_term_memories WHERE id=?", dupes)
+            deleted += len(dupes)
+
+            if self.ltm_per_task > 0:
+                deleted += conn.execute(
+                    "DELETE FROM long_term_memories WHERE id IN ("
+                    " SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+                    "  PARTITION BY task_description ORDER BY CAST(datetime AS REAL) DESC, id DESC) AS rn"
+                    "  FROM long_term_memories) WHERE rn > ?)",
+                    (self.ltm_per_task,),
+                ).rowcount
+            if self.ltm_max_rows > 0:
+                deleted += conn.execute(
+                    "DELETE FROM long_term_memories WHERE id NOT IN ("
+                    " SELECT id FROM long_term_memories ORDER BY CAST(datetime AS REAL) DESC, id DESC LIMIT ?)",
+                    (self.ltm_max_rows,),
+                ).rowcount
+            conn.execute("COMMIT")
+
+            rows_left = conn.execute("SELECT COUNT(*) FROM long_term_memories").fetchone()[0]
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            pages = conn.execute("PRAGMA page_count").fetchone()[0] or 1
+            vacuumed = free / pages > _VACUUM_FREE_RATIO
+            if vacuumed:
+                conn.execute("VACUUM")
+            return {"rows": rows_left, "deleted": deleted, "duplicates": len(dupes), "vacuumed": vacuumed}
+        finally:
+            conn.close()
+
+    # -----------------------------
+    # Short-term / entity memory (Chroma)
+    # -----------------------------
+    def _chroma_client(self):
+        import chromadb
+        from chromadb.config import Settings
+
+        # same settings as CrewAI's own client, so both share one Chroma system
+        return chromadb.PersistentClient(
+            path=str(self.storage_dir),
+            settings=Settings(persist_directory=str(self.storage_dir), allow_reset=True, is_persistent=True),
+        )
+
+    def _near_duplicates(self, vecs, keep_order: List[int]) -> set:
+        """Indices (newest first in keep_order) whose (unit-length) embedding matches an already kept one."""
+        import numpy as np
+
+        kept: List[int] = []
+        drop = set()
+        for i in keep_order:
+            if kept and float(np.max(vecs[kept] @ vecs[i])) >= self.similarity:
+                drop.add(i)
+            else:
+                kept.append(i)
+        return drop
+
+    @staticmethod
+    def _read(collection):
+        """(ids, normalized-text hashes, unit float32 embeddings or None), read page by page."""
+        import numpy as np
+
+        ids: List[str] = []
+        keys: List[str] = []
+        pages: List[Any] = []
+        complete = True
+        offset = 0
+        while True:
+            got = collection.get(include=["documents", "embeddings"], limit=PAGE_SIZE, offset=offset)
+            page_ids = got.get("ids") or []
+            if not page_ids:
+                break
+            docs = got.get("documents") or [""] * len(page_ids)
+            ids.extend(page_ids)
+            keys.extend(hashlib.sha1(_normalize(d).encode("utf-8")).hexdigest() for d in docs)
+            embeddings = got.get("embeddings")
+            if embeddings is None or len(embeddings) != len(page_ids):
+                complete = False
+            elif complete:
+                vecs = np.asarray(embeddings, dtype=np.float32)
+                pages.append(vecs / (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12))
+            offset += len(page_ids)
+        vecs = np.concatenate(pages) if complete and pages else None
+        return ids, keys, vecs
+
+    def compact_rag(self) -> Dict[str, Any]:
+        if not (self.storage_dir / CHROMA_FILE).exists():
+            return {"collections": {}}
+        with _exclusive() as ok:
+            if not ok:
+                return {"collections": {}, "skipped": "crew running"}
+            client = self._chroma_client()
+            out: Dict[str, Any] = {}
+            for col in client.list_collections():
+                name = col if isinstance(col, str) else col.name
+                if not name.startswith("memory_"):
+                    continue
+                collection = client.get_collection(name)
+                ids, keys, vecs = self._read(collection)
+                # Chroma returns rows in insertion order: newest last
+                newest_first = list(range(len(ids) - 1, -1, -1))
+                drop, seen = set(), set()
+                for i in newest_first:
+                    if keys[i] in seen:
+                        drop.add(i)
+                    seen.add(keys[i])
+                if vecs is not None and self.similarity < 1:
+                    drop |= self._near_duplicates(vecs, [i for i in newest_first if i not in drop])
+                duplicates = len(drop)
+                if self.rag_max_items > 0:
+                    survivors = [i for i in newest_first if i not in drop]
+                    drop.update(survivors[self.rag_max_items:])
+                doomed = [ids[i] for i in sorted(drop)]
+                for lo in range(0, len(doomed), PAGE_SIZE):
+                    collection.delete(ids=doomed[lo:lo + PAGE_SIZE])
+                out[name] = {"items": len(ids) - len(drop), "deleted": len(drop), "duplicates": duplicates}
+            return {"collections": out}
+
+    # -----------------------------
+    # Runs and reporting
+    # -----------------------------
+    def run(self) -> Dict[str, Any]:
+        """One maintenance pass; failures of one store do not stop the other."""
+        with self._lock:
+            t0 = time.perf_counter()
+            result: Dict[str, Any] = {"at": time.time()}
+            for name, fn in (("ltm", self.compact_ltm), ("rag", self.compact_rag)):
+                try:
+                    result[name] = fn()
+                except Exception as e:
+                    result[name] = {"error": str(e)[:200]}
+                    print(f"⚠️ Memory maintenance ({name}) failed: {e}")
+            result["seconds"] = round(time.perf_counter() - t0, 3)
+            self.last_run = result
+        return result
+
+    def sizes(self) -> Dict[str, Any]:
+        """Bytes on disk per store plus long-term memory row count."""
+        ltm_path = self.storage_dir / LTM_FILE
+        rows = None
+        if ltm_path.exists():
+            try:
+                conn = sqlite3.connect(f"file:{ltm_path}?mode=ro", uri=True, timeout=5)
+                try:
+                    rows = conn.execute("SELECT COUNT(*) FROM long_term_memories").fetchone()[0]
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                rows = None
+        total = _dir_size(self.storage_dir)
+        ltm = _dir_size(ltm_path)
+        return {"total_bytes": total, "ltm_bytes": ltm, "rag_bytes": total - ltm, "ltm_rows": rows}
+
+    def start(self, interval: Optional[float] = None) -> "MemoryMaintainer":
+        """Run now and then every `interval` seconds in a daemon thread (0 = once)."""
+        if self._thread is not None:
+            return self
+        interval = float(os.getenv("MEMORY_MAINTENANCE_SECONDS", "3600")) if interval is None else interval
+
+        def loop():
+            while True:
+                res = self.run()
+                deleted = (res.get("ltm", {}).get("deleted", 0) or 0) + sum(
+                    c.get("deleted", 0) for c in res.get("rag", {}).get("collections", {}).values())
+                if deleted:
+                    print(f"🧹 Memory maintenance removed {deleted} entries in {res['seconds']}s")
+                if interval <= 0 or self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=loop, name="memory-maintenance", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,327 @@
+"""
+Process-wide operational metrics.
+
+A small in-process registry of counters, gauges and histograms, exported in the
+Prometheus text format on METRICS_PORT (/metrics), bound to METRICS_HOST
+(127.0.0.1 unless set). Finished spans feed it, so every stage gets a latency
+histogram without extra instrumentation. Spans are recorded whether or not
+TRACING_ENABLED writes them to the trace file. The Statistics page reads from
+the same registry.
+"""
+import abc
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import tracing
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelKey = Tuple[str, ...]
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of raw samples (0.0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _fmt_labels(self, key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines for this metric (without HELP / TYPE)."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def values(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._fmt_labels(k)} {_num(v)}" for k, v in sorted(self.values().items())]
+
+
+class Gauge(_Metric):
+    """Settable gauge; `set_function` makes it read a live value at export time."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+        self._fn: Optional[Callable[[], Dict[LabelKey, float]]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def set_function(self, fn: Callable[[], Dict[LabelKey, float]]) -> None:
+        self._fn = fn
+
+    def values(self) -> Dict[LabelKey, float]:
+        if self._fn is not None:
+            try:
+                return dict(self._fn())
+            except Exception:
+                return {}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._fmt_labels(k)} {_num(v)}" for k, v in sorted(self.values().items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def snapshot(self) -> Dict[LabelKey, List[float]]:
+        with self._lock:
+            return {k: list(v) for k, v in self._values.items()}
+
+    def summary(self, **labels: str) -> Dict[str, float]:
+        """count / mean / bucket-estimated p50 and p95 (seconds) for one label set."""
+        row = self.snapshot().get(self._key(labels))
+        if not row or not row[-1]:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0}
+        return {
+            "count": int(row[-1]),
+            "mean": row[-2] / row[-1],
+            "p50": self._quantile(row, 0.50),
+            "p95": self._quantile(row, 0.95),
+        }
+
+    def _quantile(self, row: List[float], q: float) -> float:
+        # linear interpolation inside the bucket, as histogram_quantile() does
+        total = row[-1]
+        rank = q * total
+        prev_bound, prev_count = 0.0, 0.0
+        for bound, count in zip(self.buckets, row[:len(self.buckets)]):
+            if count >= rank:
+                if count == prev_count:
+                    return bound
+                return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+            prev_bound, prev_count = bound, count
+        return self.buckets[-1]
+
+    def samples(self) -> List[str]:
+        out = []
+        for key, row in sorted(self.snapshot().items()):
+            for bound, count in zip(self.buckets, row[:len(self.buckets)]):
+                out.append(f"{self.name}_bucket{self._fmt_labels(key, {'le': _num(bound)})} {_num(count)}")
+            out.append(f"{self.name}_bucket{self._fmt_labels(key, {'le': '+Inf'})} {_num(row[-1])}")
+            out.append(f"{self.name}_sum{self._fmt_labels(key)} {_num(row[-2])}")
+            out.append(f"{self.name}_count{self._fmt_labels(key)} {_num(row[-1])}")
+        return out
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "mla_requests_total", "Pipeline requests by outcome.", ("pipeline", "status")))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "mla_stage_duration_seconds", "Latency of traced pipeline stages.", ("stage",)))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "mla_llm_tokens_total", "LLM tokens by provider and direction.", ("provider", "type")))
+LLM_STAGE_TOKENS = REGISTRY.register(Counter(
+    "mla_llm_stage_completion_tokens_total", "LLM completion tokens by agent (pipeline stage).", ("agent",)))
+LLM_CALLS = REGISTRY.register(Counter(
+    "mla_llm_calls_total", "LLM calls by provider.", ("provider",)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "mla_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result")))
+CHROMA_SECONDS = REGISTRY.register(Histogram(
+    "mla_chroma_call_seconds", "Chroma call latency by operation.", ("op",)))
+JOBS = REGISTRY.register(Gauge(
+    "mla_index_jobs", "Indexing jobs by state (queued = queue depth).", ("state",)))
+MEMORY_LOOKUP_SECONDS = REGISTRY.register(Histogram(
+    "mla_memory_lookup_seconds", "CrewAI memory lookup latency by store (all = whole retrieval).", ("source",)))
+SPECULATIONS = REGISTRY.register(Counter(
+    "mla_quiz_speculations_total",
+    "Speculative quiz pre-generation outcomes (submitted/ready/served/skipped/cancelled/expired/failed).",
+    ("result",)))
+MODEL_LOAD_SECONDS = REGISTRY.register(Histogram(
+    "mla_model_load_seconds", "Ollama model load time reported by warm-up calls.", ("model", "kind")))
+MODEL_GEN_SECONDS = REGISTRY.register(Histogram(
+    "mla_model_generation_seconds", "Ollama prompt + generation time of warm-up calls (excludes load).",
+    ("model", "kind")))
+MODEL_WARMUPS = REGISTRY.register(Counter(
+    "mla_model_warmups_total", "Warm-up calls by model and whether the model had to be loaded.",
+    ("model", "cold")))
+
+
+def llm_provider(model: str) -> str:
+    model = str(model or "")
+    return model.split("/", 1)[0] if "/" in model else (model or "unknown")
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def cache_hit_ratio(cache: str) -> Optional[float]:
+    hits = CACHE_REQUESTS.get(cache=cache, result="hit")
+    total = hits + CACHE_REQUESTS.get(cache=cache, result="miss")
+    return hits / total if total else None
+
+
+def _observe_span(record: Dict) -> None:
+    """Tracing listener: turn finished spans into stage / token / request metrics."""
+    attrs = record.get("attrs") or {}
+    seconds = record["duration_ms"] / 1000
+    kind = attrs.get("kind")
+    name = record["name"]
+    if kind == "llm":
+        provider = llm_provider(name.split(":", 1)[-1].strip())
+        agent = (attrs.get("agent") or "").strip() or "unknown"
+        STAGE_SECONDS.observe(seconds, stage=f"llm:{agent}")
+        LLM_CALLS.inc(provider=provider)
+        LLM_STAGE_TOKENS.inc(attrs.get("completion_tokens", 0) or 0, agent=agent)
+        LLM_TOKENS.inc(attrs.get("prompt_tokens", 0) or 0, provider=provider, type="prompt")
+        LLM_TOKENS.inc(attrs.get("completion_tokens", 0) or 0, provider=provider, type="completion")
+        return
+    if kind == "tool":
+        STAGE_SECONDS.observe(seconds, stage=name.replace(": ", ":"))
+        record_cache("tool", bool(attrs.get("from_cache")))
+        return
+    if kind == "memory":
+        MEMORY_LOOKUP_SECONDS.observe(seconds, source=attrs.get("source") or "memory")
+        return
+    if kind == "agent":
+        STAGE_SECONDS.observe(seconds, stage=name.replace(": ", ":"))
+        return
+    if name == "chroma_query":
+        CHROMA_SECONDS.observe(seconds, op="query")
+    stage = f"{name}:{attrs['crew']}" if "crew" in attrs else name
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if not record.get("parent_id") and name in ("ask_question", "generate_quiz"):
+        pipeline = f"{name}:speculative" if attrs.get("speculative") else name
+        REQUESTS.inc(pipeline=pipeline, status="error" if attrs.get("error") else "ok")
+
+
+tracing.add_listener(_observe_span)
+
+
+# -----------------------------
+# /metrics endpoint
+# -----------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """Serve the registry on http://host:port/metrics (METRICS_PORT=0 disables it)."""
+    port = int(os.getenv("METRICS_PORT", "9108")) if port is None else port
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint not started on :{port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 Metrics endpoint: http://{host}:{port}/metrics")
+    return server
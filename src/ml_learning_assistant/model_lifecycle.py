@@ -0,0 +1,226 @@
+"""
+Ollama model warm-up and keep-alive.
+
+On the first request after an idle period, a 14B chat model or the embedding
+model first has to be loaded onto the GPU. The load can take several seconds.
+`ModelLifecycle` avoids that wait in three ways:
+
+* It loads the chat model and the embedding model at startup, from a
+  background thread, so startup is not blocked.
+* Each warm-up request carries a `keep_alive` hint.
+* A watcher polls `/api/ps` and re-warms a model shortly before it would be
+  unloaded. It stops once the app has had no traffic for OLLAMA_WARM_MAX_IDLE.
+
+Warm-up calls report Ollama's own `load_duration` separately from prompt and
+generation time. Model load cost is therefore measured on its own, apart from
+inference cost.
+"""
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from . import tracing
+from .llm_config import ollama_chat_url, ollama_embeddings_url, resolve_provider
+from .metrics import MODEL_GEN_SECONDS, MODEL_LOAD_SECONDS, MODEL_WARMUPS
+
+# Ollama reports durations in nanoseconds
+_NS = 1e9
+# a load_duration above this means the model was not resident
+_COLD_LOAD_S = 0.5
+
+
+@dataclass
+class ManagedModel:
+    name: str
+    base_url: str
+    kind: str  # "chat" | "embedding"
+    loaded: bool = False
+    expires_at: Optional[float] = None
+    last_warm_at: Optional[float] = None
+    last_load_s: Optional[float] = None
+    last_generation_s: Optional[float] = None
+    last_error: Optional[str] = None
+    warmups: int = field(default=0)
+
+
+def _parse_expires(value: str) -> Optional[float]:
+    """Ollama's expires_at has nanosecond precision; fromisoformat takes microseconds."""
+    if not value:
+        return None
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value.replace("Z", "+00:00"))
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+class ModelLifecycle:
+    """Keeps the configured Ollama models resident while the app is in use."""
+
+    def __init__(
+        self,
+        models: List[ManagedModel],
+        keep_alive: Optional[str] = None,
+        check_interval: Optional[float] = None,
+        rewarm_margin: Optional[float] = None,
+        max_idle: Optional[float] = None,
+        timeout: float = 300.0,
+    ):
+        self.models = models
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.check_interval = check_interval or float(os.getenv("OLLAMA_WARM_CHECK_SECONDS", "60"))
+        # re-warm when fewer than this many seconds remain before unload
+        self.rewarm_margin = rewarm_margin or float(os.getenv("OLLAMA_REWARM_MARGIN_SECONDS", "120"))
+        self.max_idle = float(os.getenv("OLLAMA_WARM_MAX_IDLE", "7200")) if max_idle is None else max_idle
+        self.timeout = timeout
+        self.last_activity = time.time()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "ModelLifecycle":
+        """Chat model when Ollama is the active provider; embedding model when crew memory is on."""
+        models = []
+        if resolve_provider() == "ollama":
+            models.append(ManagedModel(os.getenv("OLLAMA_MODEL_NAME", "llama3.2"), ollama_chat_url().rstrip("/"), "chat"))
+        if os.getenv("CREW_MEMORY", "true").strip().lower() != "false":
+            models.append(ManagedModel(os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text"),
+                                       ollama_embeddings_url(), "embedding"))
+        return cls(models)
+
+    # -----------------------------
+    # Ollama HTTP
+    # -----------------------------
+    def _post(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def _running(self, base_url: str) -> Dict[str, Optional[float]]:
+        """Loaded model name -> expiry (epoch seconds) from /api/ps."""
+        with urllib.request.urlopen(f"{base_url}/api/ps", timeout=10) as resp:
+            data = json.loads(resp.read().decode("utf-8"))
+        out = {}
+        for m in data.get("models", []) or []:
+            expires = _parse_expires(m.get("expires_at", ""))
+            for key in (m.get("name"), m.get("model")):
+                if key:
+                    out[key] = expires
+        return out
+
+    def warm(self, model: ManagedModel) -> Dict[str, Any]:
+        """Load (or refresh) one model and record load vs. generation time."""
+        t0 = time.perf_counter()
+        try:
+            if model.kind == "embedding":
+                data = self._post(f"{model.base_url}/api/embed",
+                                  {"model": model.name, "input": "warm-up", "keep_alive": self.keep_alive})
+                gen_ns = max(0, int(data.get("total_duration", 0)) - int(data.get("load_duration", 0)))
+            else:
+                data = self._post(f"{model.base_url}/api/generate", {
+                    "model": model.name, "prompt": "ok", "stream": False,
+                    "keep_alive": self.keep_alive, "options": {"num_predict": 1},
+                })
+                gen_ns = int(data.get("prompt_eval_duration", 0)) + int(data.get("eval_duration", 0))
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            model.last_error = str(e)[:200]
+            print(f"⚠️ Warm-up failed for {model.name} ({model.base_url}): {e}")
+            return {"ok": False, "model": model.name, "error": model.last_error}
+
+        load_s = int(data.get("load_duration", 0)) / _NS
+        gen_s = gen_ns / _NS
+        cold = load_s > _COLD_LOAD_S
+        MODEL_LOAD_SECONDS.observe(load_s, model=model.name, kind=model.kind)
+        MODEL_GEN_SECONDS.observe(gen_s, model=model.name, kind=model.kind)
+        MODEL_WARMUPS.inc(model=model.name, cold=str(cold).lower())
+        model.loaded = True
+        model.last_warm_at = time.time()
+        model.last_load_s, model.last_generation_s = load_s, gen_s
+        model.last_error = None
+        model.warmups += 1
+        if cold:
+            print(f"🔥 Warmed {model.kind} model {model.name}: load {load_s:.1f}s, "
+                  f"generation {gen_s:.2f}s (wall {time.perf_counter() - t0:.1f}s)")
+        return {"ok": True, "model": model.name, "load_s": load_s, "generation_s": gen_s, "cold": cold}
+
+    def warm_all(self) -> List[Dict[str, Any]]:
+        return [self.warm(m) for m in self.models]
+
+    # -----------------------------
+    # Keep-alive watcher
+    # -----------------------------
+    def touch(self) -> None:
+        """Mark app activity (real requests keep the models worth pinning)."""
+        self.last_activity = time.time()
+
+    def _on_span(self, record: Dict[str, Any]) -> None:
+        if not record.get("parent_id") or (record.get("attrs") or {}).get("kind") == "llm":
+            self.touch()
+
+    def check(self) -> None:
+        """Refresh residency from /api/ps and re-warm models that are about to expire."""
+        if self.max_idle and time.time() - self.last_activity > self.max_idle:
+            return
+        by_url: Dict[str, Dict[str, Optional[float]]] = {}
+        for model in self.models:
+            try:
+                if model.base_url not in by_url:
+                    by_url[model.base_url] = self._running(model.base_url)
+                running = by_url[model.base_url]
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                model.last_error = str(e)[:200]
+                continue
+            names = {model.name, f"{model.name}:latest"}
+            hit = next((n for n in names if n in running), None)
+            model.loaded = hit is not None
+            model.expires_at = running.get(hit) if hit else None
+            remaining = (model.expires_at - time.time()) if model.expires_at else None
+            if not model.loaded or (remaining is not None and remaining < self.rewarm_margin + self.check_interval):
+                self.warm(model)
+
+    def start(self) -> "ModelLifecycle":
+        if self._thread is not None or not self.models:
+            return self
+        tracing.add_listener(self._on_span)
+
+        def loop():
+            self.warm_all()
+            while not self._stop.wait(self.check_interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    print(f"⚠️ Model keep-alive check failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="model-keepalive", daemon=True)
+        self._thread.start()
+        print(f"🔥 Model warm-up started: {', '.join(m.name for m in self.models)} (keep_alive={self.keep_alive})")
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        tracing.remove_listener(self._on_span)
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [
+            {
+                "model": m.name,
+                "kind": m.kind,
+                "url": m.base_url,
+                "loaded": m.loaded,
+                "expires_in_s": round(m.expires_at - now) if m.expires_at else None,
+                "last_load_s": m.last_load_s,
+                "last_generation_s": m.last_generation_s,
+                "warmups": m.warmups,
+                "error": m.last_error,
+            }
+            for m in self.models
+        ]
@@ -0,0 +1,59 @@
+"""
+Quiz JSON parsing and schema validation shared by the Streamlit app and the API.
+"""
+import json
+from typing import Optional, Tuple
+
+
+def extract_json_object(text: str) -> str:
+    if not text:
+        return ""
+    s = text.strip()
+    if s.startswith("{") and s.endswith("}"):
+        return s
+    a = s.find("{")
+    b = s.rfind("}")
+    if a != -1 and b != -1 and b > a:
+        return s[a : b + 1]
+    return s
+
+
+def validate_quiz_schema(obj: dict, expected_n: int) -> Tuple[bool, str]:
+    if not isinstance(obj, dict):
+        return False, "Quiz JSON is not an object."
+    if obj.get("num_questions") != expected_n:
+        return False, f"num_questions mismatch"
+    qs = obj.get("questions")
+    if not isinstance(qs, list) or len(qs) != expected_n:
+        return False, f"questions length mismatch"
+    for i, q in enumerate(qs, start=1):
+        if not isinstance(q, dict):
+            return False, f"Question {i} is not an object"
+        if q.get("id") != i:
+            return False, f"Question id mismatch at {i}"
+        if not isinstance(q.get("choices"), dict):
+            return False, f"choices not dict at {i}"
+        for k in ["A", "B", "C", "D"]:
+            if k not in q["choices"] or not q["choices"][k].strip():
+                return False, f"Invalid choice {k} at {i}"
+        if q.get("answer") not in ["A", "B", "C", "D"]:
+            return False, f"Invalid answer at {i}"
+        if not q.get("question", "").strip():
+            return False, f"Missing question text at {i}"
+        if not q.get("explanation", "").strip():
+            return False, f"Missing explanation at {i}"
+    return True, "OK"
+
+
+def parse_quiz_json(raw: str, expected_n: int) -> Tuple[Optional[dict], Optional[str]]:
+    if not raw:
+        return None, "Empty quiz output"
+    candidate = extract_json_object(raw)
+    try:
+        obj = json.loads(candidate)
+    except Exception as e:
+        return None, f"Invalid JSON: {e}"
+    ok, reason = validate_quiz_schema(obj, expected_n)
+    if not ok:
+        return None, f"Schema invalid: {reason}"
+    return obj, None
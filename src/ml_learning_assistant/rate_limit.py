@@ -0,0 +1,64 @@
+"""
+Process-wide LLM rate limiter.
+
+Every crew request waits for a minimum delay since the previous request to
+the same model (RATE_LIMIT_MIN_DELAY, otherwise a per-provider default). The
+limiter used to live on each crew instance, so two crews, or two threads on
+one crew (API workers, the batch CLI), could hit the provider together. All
+crews now share one limiter per model. A caller reserves the next free slot
+under a lock and then sleeps outside it, so concurrent callers queue up at
+min_delay spacing instead of waking up together.
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+_DEFAULT_DELAYS = (("ollama", 0.6), ("cerebras", 1.5))
+
+
+def min_delay_for(model: str) -> float:
+    override = os.getenv("RATE_LIMIT_MIN_DELAY", "").strip()
+    if override:
+        return float(override)
+    model_str = str(model).lower()
+    for marker, delay in _DEFAULT_DELAYS:
+        if marker in model_str:
+            return delay
+    return 3.0
+
+
+class RateLimiter:
+    """Spaces calls at least `min_delay` seconds apart across threads."""
+
+    def __init__(self, min_delay: float):
+        self.min_delay = min_delay
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> float:
+        """Block until this caller's slot; returns the seconds waited."""
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_delay
+        waited = slot - now
+        if waited > 0:
+            time.sleep(waited)
+        return waited
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Shared limiter for `model`; RATE_LIMIT_MIN_DELAY is read on every call."""
+    key = str(model).lower()
+    delay = min_delay_for(key)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(delay)
+        limiter.min_delay = delay
+    return limiter
@@ -0,0 +1,194 @@
+"""
+Research-notes store shared by the chat and quiz pipelines.
+
+`ask_question` (research_crew) and `generate_quiz` (quiz_research_crew) both
+research a topic with RAG and web search, then used to throw the notes away.
+Notes are now kept in SQLite, keyed by tenant, normalized topic and the
+tenant's catalog version, together with the Chroma chunk IDs the researcher
+retrieved. Either pipeline reuses fresh notes instead of re-running the
+researcher.
+
+Any upload bumps the catalog version, so notes written before it are never
+served again; they are deleted on the next write. Notes also expire after
+RESEARCH_NOTES_TTL seconds, because web results go stale. Lookups are counted
+as hits and misses of the `research_notes` cache; that ratio is the reuse rate.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .catalog import get_catalog
+from .metrics import record_cache
+from .tenancy import normalize_tenant_id
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    tenant_id TEXT NOT NULL,
+    topic_key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    notes TEXT NOT NULL,
+    chunk_ids TEXT NOT NULL DEFAULT '[]',
+    created_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, topic_key, version, kind)
+);
+"""
+
+# leading words that turn a chat question into its topic
+_QUESTION_PREFIX = re.compile(
+    r"^(?:(?:can|could) you\s+)?(?:please\s+)?"
+    r"(?:what(?:'s| is| are)|explain|describe|define|how (?:does|do|is|are)|why (?:does|do|is|are)|"
+    r"tell me about|give me an overview of|teach me(?: about)?|quiz me on)\s+(?:the\s+|a\s+|an\s+)?"
+)
+
+
+def topic_key(text: str) -> str:
+    """Normalize a chat question or quiz topic so both sides match."""
+    t = re.sub(r"[^\w\s-]", " ", (text or "").lower())
+    t = re.sub(r"\s+", " ", t).strip()
+    t = _QUESTION_PREFIX.sub("", t)
+    t = re.sub(r"\s+(?:work|works|mean|means|used for)$", "", t)
+    return t.strip()
+
+
+# Chunk IDs returned by chroma queries during the current research kickoff
+_chunk_ids: ContextVar[Optional[List[str]]] = ContextVar("research_chunk_ids", default=None)
+
+# "## Memory to store" with a value means the message was about the user, not a topic
+_MEMORY_VALUE = re.compile(
+    r"^[ \t]*-[ \t]*(?:name|preferences)[ \t]*:[ \t]*(?!<?(?:value or )?empty>?[ \t]*$|none[ \t]*$)\S", re.I | re.M
+)
+
+
+@contextmanager
+def collect_chunk_ids() -> Iterator[List[str]]:
+    """Collect the chunk IDs that ChromaRAGTool returns inside this block."""
+    ids: List[str] = []
+    token = _chunk_ids.set(ids)
+    try:
+        yield ids
+    finally:
+        _chunk_ids.reset(token)
+
+
+def record_chunk_ids(ids: List[str]) -> None:
+    collected = _chunk_ids.get()
+    if collected is not None:
+        collected.extend(i for i in ids if i not in collected)
+
+
+def is_reusable(notes: str) -> bool:
+    """Notes carrying personal memory or an error are not shared."""
+    text = (notes or "").strip()
+    if not text or text.startswith(("❌", "⏳", "⏱️")):
+        return False
+    memory = text.split("## Memory to store", 1)
+    if len(memory) == 2 and _MEMORY_VALUE.search(memory[1].split("##", 1)[0]):
+        return False
+    return True
+
+
+class ResearchNotesStore:
+    """SQLite-backed notes, one row per (tenant, topic, catalog version, kind)."""
+
+    def __init__(self, db_path: Optional[str] = None, ttl: Optional[float] = None):
+        self.db_path = Path(db_path or os.getenv("RESEARCH_NOTES_DB_PATH", "./data/notes/notes.db")).resolve()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = float(os.getenv("RESEARCH_NOTES_TTL", "3600")) if ttl is None else ttl
+        with self._db() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, tenant_id: Optional[str], topic: str, kinds=("research", "quiz_research")) -> Optional[Dict[str, Any]]:
+        """Freshest notes for the topic at the current catalog version, preferring `kinds` in order."""
+        tenant = normalize_tenant_id(tenant_id)
+        key = topic_key(topic)
+        if not key:
+            return None
+        version = get_catalog().version(tenant)
+        with self._db() as conn:
+            rows = {r["kind"]: r for r in conn.execute(
+                "SELECT * FROM notes WHERE tenant_id=? AND topic_key=? AND version=? AND created_at>=?",
+                (tenant, key, version, time.time() - self.ttl),
+            )}
+            row = next((rows[k] for k in kinds if k in rows), None)
+            if row is not None:
+                conn.execute(
+                    "UPDATE notes SET hits = hits + 1 WHERE tenant_id=? AND topic_key=? AND version=? AND kind=?",
+                    (tenant, key, version, row["kind"]),
+                )
+        record_cache("research_notes", row is not None)
+        if row is None:
+            return None
+        out = dict(row)
+        out["chunk_ids"] = json.loads(out["chunk_ids"] or "[]")
+        return out
+
+    def put(self, tenant_id: Optional[str], topic: str, notes: str, kind: str = "research",
+            chunk_ids: Optional[List[str]] = None, version: Optional[int] = None) -> bool:
+        """
+        Store notes produced at catalog `version` (read before the research ran,
+        so an upload during research leaves them stale). Rows from older
+        versions are deleted.
+        """
+        tenant = normalize_tenant_id(tenant_id)
+        key = topic_key(topic)
+        if not key or not is_reusable(notes):
+            return False
+        version = get_catalog().version(tenant) if version is None else version
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM notes WHERE tenant_id=? AND (version<? OR created_at<?)",
+                         (tenant, version, time.time() - self.ttl))
+            conn.execute(
+                "INSERT OR REPLACE INTO notes (tenant_id, topic_key, version, kind, topic, notes, chunk_ids, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (tenant, key, int(version), kind, topic, notes, json.dumps(list(chunk_ids or [])), time.time()),
+            )
+            conn.execute("COMMIT")
+        return True
+
+    def invalidate(self, tenant_id: Optional[str]) -> int:
+        with self._db() as conn:
+            cur = conn.execute("DELETE FROM notes WHERE tenant_id=?", (normalize_tenant_id(tenant_id),))
+        return cur.rowcount
+
+    def stats(self, tenant_id: Optional[str]) -> Dict[str, int]:
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS notes, COALESCE(SUM(hits), 0) AS hits FROM notes WHERE tenant_id=?",
+                (normalize_tenant_id(tenant_id),),
+            ).fetchone()
+        return dict(row)
+
+
+_store: Optional[ResearchNotesStore] = None
+_store_lock = threading.Lock()
+
+
+def get_notes_store() -> ResearchNotesStore:
+    """Process-wide notes store (RESEARCH_NOTES_DB_PATH)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ResearchNotesStore()
+    return _store
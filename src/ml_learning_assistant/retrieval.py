@@ -0,0 +1,143 @@
+"""
+Multi-query retrieval for the research stages.
+
+Quiz notes need facts from several subtopics. Sent one query at a time, every
+subtopic costs the researcher an extra tool call and LLM turn. Here one call
+covers several queries:
+
+1. `expand_queries` turns the topic into sub-queries locally, with no LLM. It
+   splits compound topics ("bagging vs boosting", "CNNs, RNNs") into their
+   parts and adds facet queries (definition, how it works, examples,
+   pitfalls, ...), up to MULTI_QUERY_MAX queries.
+2. `multi_query_search` runs all of them as one collection.query() with
+   several query_texts and per-query embeddings batched in a single request.
+3. Hits are deduplicated by chunk ID. Each chunk keeps its best rank across
+   queries, and the merged list is re-ranked with maximal marginal relevance
+   (MMR): every pick trades relevance against similarity to chunks already
+   picked (MULTI_QUERY_MMR_LAMBDA, 1.0 = relevance only). The context covers
+   the subtopics instead of repeating the best-matching paragraph.
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+MAX_QUERIES = int(os.getenv("MULTI_QUERY_MAX", "6"))
+MMR_LAMBDA = float(os.getenv("MULTI_QUERY_MMR_LAMBDA", "0.6"))
+
+# facet templates appended to the topic, most useful first
+_FACETS = (
+    "{t} definition and key idea",
+    "how {t} works step by step",
+    "{t} example",
+    "{t} advantages and limitations",
+    "{t} common mistakes and misconceptions",
+    "{t} formula and parameters",
+    "{t} compared to alternatives",
+)
+_SPLIT = re.compile(r"\s*(?:,|;|/|\bvs\.?\b|\bversus\b|\band\b|\bor\b|&)\s*", re.I)
+
+
+def expand_queries(topic: str, max_queries: int = MAX_QUERIES,
+                   extra: Optional[Sequence[str]] = None) -> List[str]:
+    """Topic first, then caller-supplied sub-queries, compound parts and facets (deduplicated)."""
+    topic = re.sub(r"\s+", " ", (topic or "")).strip()
+    candidates: List[str] = [topic]
+    candidates += [q for q in (extra or []) if q]
+    parts = [p for p in _SPLIT.split(topic) if len(p) > 2]
+    if len(parts) > 1:
+        candidates += parts
+    candidates += [f.format(t=topic) for f in _FACETS]
+
+    out: List[str] = []
+    seen = set()
+    for q in candidates:
+        q = re.sub(r"\s+", " ", str(q)).strip()
+        key = q.lower()
+        if q and key not in seen:
+            seen.add(key)
+            out.append(q)
+        if len(out) >= max(1, max_queries):
+            break
+    return out
+
+
+def _normalize_rows(vectors: Any) -> np.ndarray:
+    arr = np.asarray(vectors, dtype=np.float32)
+    return arr / np.maximum(np.linalg.norm(arr, axis=1, keepdims=True), 1e-12)
+
+
+def mmr(relevance: Sequence[float], embeddings: Any, k: int, lam: float = MMR_LAMBDA) -> List[int]:
+    """Indexes of `k` candidates chosen by maximal marginal relevance."""
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    rel = np.asarray(relevance, dtype=np.float32)
+    sims = _normalize_rows(embeddings)
+    sims = sims @ sims.T
+    picked = [int(np.argmax(rel))]
+    max_sim = sims[picked[0]].copy()
+    chosen = np.zeros(n, dtype=bool)
+    chosen[picked[0]] = True
+    while len(picked) < min(k, n):
+        score = lam * rel - (1.0 - lam) * max_sim
+        score[chosen] = -np.inf
+        nxt = int(np.argmax(score))
+        picked.append(nxt)
+        chosen[nxt] = True
+        max_sim = np.maximum(max_sim, sims[nxt])
+    return picked
+
+
+def multi_query_search(collection, queries: Sequence[str], n_results: int = 8,
+                       per_query: Optional[int] = None, lam: float = MMR_LAMBDA) -> Dict[str, Any]:
+    """
+    One batched query for all `queries`, merged into a single ranked list.
+
+    Returns {"ids", "documents", "metadatas", "distances", "queries"}, where
+    distances are each chunk's best distance and "queries" lists the
+    sub-queries that retrieved it.
+    """
+    queries = [q for q in queries if q]
+    per_query = per_query or n_results
+    results = collection.query(
+        query_texts=list(queries),
+        n_results=per_query,
+        include=["documents", "metadatas", "distances", "embeddings"],
+    )
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    for qi, ids in enumerate(results.get("ids") or []):
+        dists = results["distances"][qi]
+        for rank, chunk_id in enumerate(ids):
+            # rank-based relevance: comparable across queries whatever the distance space
+            rel = 1.0 - rank / max(1, per_query)
+            hit = merged.get(chunk_id)
+            if hit is None:
+                merged[chunk_id] = hit = {
+                    "id": chunk_id,
+                    "document": results["documents"][qi][rank],
+                    "metadata": results["metadatas"][qi][rank] or {},
+                    "distance": float(dists[rank]),
+                    "embedding": results["embeddings"][qi][rank],
+                    "relevance": rel,
+                    "queries": [],
+                }
+            hit["distance"] = min(hit["distance"], float(dists[rank]))
+            hit["relevance"] = max(hit["relevance"], rel)
+            hit["queries"].append(queries[qi])
+
+    hits = list(merged.values())
+    if hits:
+        # chunks found by several sub-queries are central to the topic
+        relevance = [h["relevance"] + 0.1 * (len(h["queries"]) - 1) for h in hits]
+        hits = [hits[i] for i in mmr(relevance, [h["embedding"] for h in hits], n_results, lam)]
+    return {
+        "ids": [h["id"] for h in hits],
+        "documents": [h["document"] for h in hits],
+        "metadatas": [h["metadata"] for h in hits],
+        "distances": [h["distance"] for h in hits],
+        "queries": [h["queries"] for h in hits],
+        "candidates": len(merged),
+    }
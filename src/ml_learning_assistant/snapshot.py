@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+"""
+Collection snapshots: export and bulk restore without re-embedding.
+
+    python -m src.ml_learning_assistant.snapshot export backups/ml_materials-2026-10
+    python -m src.ml_learning_assistant.snapshot restore backups/ml_materials-2026-10 --replace
+
+Rebuilding a collection from the source files means parsing and embedding
+every document again. A snapshot stores the vectors instead:
+
+    manifest.json              collection, counts, dimension, embedding function,
+                               shard list with sha256, catalog source rows
+    embeddings-00000.npy       float32 [rows, dim]
+    records-00000.jsonl        {"id", "document", "metadata"} per row, same order
+    dedup.jsonl                near-duplicate signatures and references (dedup.py)
+
+Export reads the collection in pages of SNAPSHOT_PAGE_SIZE and starts a new
+shard every SNAPSHOT_SHARD_ROWS rows. It writes to `<dir>.part` and renames the
+directory when done, so a half-written snapshot is never picked up. Paged reads
+are not a consistent view, so export while no indexing runs. A warning is
+printed if the catalog version changed during the export.
+
+Restore first checks every shard (hash, record and vector counts, dimension)
+against the manifest, so `--replace` never drops a collection in favour of a
+damaged snapshot. It then loads the embeddings memory-mapped and
+writes with `add` calls as large as the server allows (SNAPSHOT_RESTORE_BATCH,
+capped by Chroma's max batch size), passing the stored embeddings so nothing
+is embedded. `add` is used only when the target collection starts empty
+(`--replace` or a new tenant); otherwise rows are upserted. The catalog rows
+from the snapshot are restored too, so the ingest CLI still skips unchanged
+files afterwards, and so are the near-duplicate references: chunks stored only
+as references are not in the collection and would otherwise be lost.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .catalog import file_sha256, get_catalog
+from .dedup import get_dedup_index
+from .metrics import CHROMA_SECONDS
+from .tenancy import collection_name_for, delete_collection, get_collection, max_batch_size, normalize_tenant_id
+
+FORMAT_VERSION = 1
+PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "1000"))
+SHARD_ROWS = int(os.getenv("SNAPSHOT_SHARD_ROWS", "50000"))
+RESTORE_BATCH = int(os.getenv("SNAPSHOT_RESTORE_BATCH", "5000"))
+
+
+def _embedding_function_name(collection) -> str:
+    try:
+        ef = (collection.configuration or {}).get("embedding_function")
+    except Exception:
+        ef = None
+    if ef is None:
+        return ""
+    try:
+        return str(ef.name())
+    except Exception:
+        return type(ef).__name__
+
+
+def _iter_pages(collection, page_size: int) -> Iterator[Dict[str, Any]]:
+    offset = 0
+    while True:
+        with CHROMA_SECONDS.time(op="get"):
+            got = collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+        ids = got.get("ids") or []
+        if not ids:
+            return
+        yield got
+        if len(ids) < page_size:
+            return
+        offset += page_size
+
+
+class _ShardWriter:
+    def __init__(self, out_dir: Path, index: int):
+        self.name = f"{index:05d}"
+        self.out_dir = out_dir
+        self.records = (out_dir / f"records-{self.name}.jsonl").open("w", encoding="utf-8")
+        self.vectors: List[Any] = []
+        self.rows = 0
+
+    def add(self, ids, documents, metadatas, embeddings) -> None:
+        for i, id_ in enumerate(ids):
+            self.records.write(json.dumps(
+                {"id": id_, "document": documents[i] if documents else None,
+                 "metadata": metadatas[i] if metadatas else None},
+                ensure_ascii=False) + "\n")
+        self.vectors.append(embeddings)
+        self.rows += len(ids)
+
+    def close(self) -> Dict[str, Any]:
+        import numpy as np
+
+        self.records.close()
+        vectors = np.concatenate([np.asarray(v, dtype=np.float32) for v in self.vectors]) if self.vectors else \
+            np.zeros((0, 0), dtype=np.float32)
+        emb_path = self.out_dir / f"embeddings-{self.name}.npy"
+        np.save(emb_path, vectors)
+        rec_path = self.out_dir / f"records-{self.name}.jsonl"
+        return {
+            "rows": self.rows,
+            "embeddings": emb_path.name,
+            "records": rec_path.name,
+            "embeddings_sha256": file_sha256(str(emb_path)),
+            "records_sha256": file_sha256(str(rec_path)),
+        }
+
+
+def export_snapshot(out_dir: str, tenant_id: Optional[str] = None, page_size: int = PAGE_SIZE,
+                    shard_rows: int = SHARD_ROWS) -> Dict[str, Any]:
+    tenant = normalize_tenant_id(tenant_id)
+    final = Path(out_dir)
+    if final.exists():
+        raise FileExistsError(f"{final} already exists")
+    work = final.with_name(final.name + ".part")
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir(parents=True)
+
+    t0 = time.perf_counter()
+    catalog = get_catalog()
+    version_before = catalog.version(tenant)
+    collection = get_collection(tenant)
+    shards: List[Dict[str, Any]] = []
+    writer: Optional[_ShardWriter] = None
+    dim = 0
+    total = 0
+    for page in _iter_pages(collection, max(1, page_size)):
+        ids, embeddings = page["ids"], page.get("embeddings")
+        if embeddings is None or len(embeddings) != len(ids):
+            raise ValueError("Collection returned rows without embeddings")
+        dim = dim or len(embeddings[0])
+        # pages are split so shards stay at shard_rows
+        start = 0
+        while start < len(ids):
+            if writer is None:
+                writer = _ShardWriter(work, len(shards))
+            take = min(len(ids) - start, max(1, shard_rows) - writer.rows)
+            end = start + take
+            docs, metas = page.get("documents"), page.get("metadatas")
+            writer.add(ids[start:end], docs[start:end] if docs else None,
+                       metas[start:end] if metas else None, embeddings[start:end])
+            start = end
+            if writer.rows >= shard_rows:
+                shards.append(writer.close())
+                writer = None
+        total += len(ids)
+    if writer is not None:
+        shards.append(writer.close())
+
+    dedup_path = work / "dedup.jsonl"
+    dedup_rows = 0
+    with dedup_path.open("w", encoding="utf-8") as f:
+        for row in get_dedup_index().export_rows(tenant):
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            dedup_rows += 1
+
+    version_after = catalog.version(tenant)
+    if version_after != version_before:
+        print("⚠️ The collection changed during export; the snapshot may be inconsistent")
+    manifest = {
+        "format": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tenant_id": tenant,
+        "collection": collection_name_for(tenant),
+        "count": total,
+        "dimension": dim,
+        "dtype": "float32",
+        "embedding_function": _embedding_function_name(collection),
+        "catalog_version": version_after,
+        "shards": shards,
+        "dedup": {"file": dedup_path.name, "rows": dedup_rows, "sha256": file_sha256(str(dedup_path))},
+        "sources": catalog.list_sources(tenant),
+    }
+    (work / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    os.replace(work, final)
+    seconds = time.perf_counter() - t0
+    return {"success": True, "message": f"Exported {total} chunks to {final}", "path": str(final),
+            "chunks": total, "shards": len(shards), "seconds": round(seconds, 3),
+            "bytes": sum(p.stat().st_size for p in final.iterdir())}
+
+
+def _verify(path: Path, expected: str) -> None:
+    if expected and file_sha256(str(path)) != expected:
+        raise ValueError(f"Checksum mismatch for {path.name}")
+
+
+def _check_shards(src: Path, manifest: Dict[str, Any], verify: bool) -> None:
+    """Fail before anything is written if a shard is missing, corrupt or does not match the manifest."""
+    import numpy as np
+
+    total = 0
+    for shard in manifest["shards"]:
+        emb_path, rec_path = src / shard["embeddings"], src / shard["records"]
+        if verify:
+            _verify(emb_path, shard.get("embeddings_sha256", ""))
+            _verify(rec_path, shard.get("records_sha256", ""))
+        vectors = np.load(emb_path, mmap_mode="r")
+        with rec_path.open(encoding="utf-8") as f:
+            n_records = sum(1 for line in f if line.strip())
+        rows = shard.get("rows", n_records)
+        if not n_records == len(vectors) == rows:
+            raise ValueError(f"Shard {rec_path.name}: {n_records} records, {len(vectors)} embeddings, "
+                             f"manifest says {rows}")
+        if len(vectors) and manifest.get("dimension") and vectors.shape[1] != manifest["dimension"]:
+            raise ValueError(f"Shard {emb_path.name}: dimension {vectors.shape[1]}, "
+                             f"manifest says {manifest['dimension']}")
+        total += n_records
+    if total != manifest.get("count", total):
+        raise ValueError(f"Snapshot holds {total} chunks, manifest says {manifest['count']}")
+    dedup = manifest.get("dedup")
+    if dedup and verify:
+        _verify(src / dedup["file"], dedup.get("sha256", ""))
+
+
+def restore_snapshot(snapshot_dir: str, tenant_id: Optional[str] = None, replace: bool = False,
+                     batch_size: int = RESTORE_BATCH, verify: bool = True) -> Dict[str, Any]:
+    """Load a snapshot into the tenant's collection (the snapshot's own tenant unless given)."""
+    import numpy as np
+
+    src = Path(snapshot_dir)
+    manifest = json.loads((src / "manifest.json").read_text())
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')}")
+    tenant = normalize_tenant_id(tenant_id or manifest.get("tenant_id"))
+
+    t0 = time.perf_counter()
+    _check_shards(src, manifest, verify)
+    if replace:
+        delete_collection(tenant)
+    collection = get_collection(tenant)
+    ef_name = _embedding_function_name(collection)
+    if manifest.get("embedding_function") and ef_name and ef_name != manifest["embedding_function"]:
+        print(f"⚠️ Snapshot was embedded with {manifest['embedding_function']}, "
+              f"collection uses {ef_name}; queries may not match")
+    with CHROMA_SECONDS.time(op="count"):
+        use_add = collection.count() == 0
+    write = collection.add if use_add else collection.upsert
+    batch = max(1, min(int(batch_size), max_batch_size()))
+
+    restored = 0
+    for shard in manifest["shards"]:
+        emb_path, rec_path = src / shard["embeddings"], src / shard["records"]
+        vectors = np.load(emb_path, mmap_mode="r")
+        with rec_path.open(encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        for lo in range(0, len(records), batch):
+            part = records[lo:lo + batch]
+            kwargs: Dict[str, Any] = {
+                "ids": [r["id"] for r in part],
+                "embeddings": np.ascontiguousarray(vectors[lo:lo + batch]),
+            }
+            if any(r.get("document") is not None for r in part):
+                kwargs["documents"] = [r.get("document") for r in part]
+            if any(r.get("metadata") for r in part):
+                # Chroma rejects empty metadata dicts but accepts None
+                kwargs["metadatas"] = [r.get("metadata") or None for r in part]
+            with CHROMA_SECONDS.time(op="add" if use_add else "upsert"):
+                write(**kwargs)
+            restored += len(part)
+        print(f"⏳ {restored}/{manifest['count']} chunks restored")
+
+    sources = manifest.get("sources") or []
+    get_catalog().restore_sources(tenant, sources, replace=replace)
+    if manifest.get("dedup"):
+        with (src / manifest["dedup"]["file"]).open(encoding="utf-8") as f:
+            get_dedup_index().import_rows(tenant, (json.loads(line) for line in f if line.strip()))
+    seconds = time.perf_counter() - t0
+    return {"success": True, "message": f"Restored {restored} chunks into {collection_name_for(tenant)}",
+            "chunks": restored, "sources": len(sources), "seconds": round(seconds, 3),
+            "chunks_per_s": round(restored / seconds, 1) if seconds else 0.0}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export", help="write the collection to a snapshot directory")
+    ex.add_argument("path")
+    ex.add_argument("--tenant", default=None)
+    ex.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    ex.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    rs = sub.add_parser("restore", help="bulk-load a snapshot without re-embedding")
+    rs.add_argument("path")
+    rs.add_argument("--tenant", default=None, help="target workspace (default: the snapshot's)")
+    rs.add_argument("--replace", action="store_true", help="drop the existing collection first")
+    rs.add_argument("--batch-size", type=int, default=RESTORE_BATCH)
+    rs.add_argument("--no-verify", action="store_true", help="skip shard checksums (counts are still checked)")
+    args = ap.parse_args(argv)
+
+    try:
+        if args.command == "export":
+            res = export_snapshot(args.path, args.tenant, page_size=args.page_size, shard_rows=args.shard_rows)
+        else:
+            res = restore_snapshot(args.path, args.tenant, replace=args.replace,
+                                   batch_size=args.batch_size, verify=not args.no_verify)
+    except Exception as e:
+        print(f"❌ Snapshot {args.command} failed: {e}")
+        return 1
+    print(f"✅ {res['message']} in {res['seconds']}s")
+    print(json.dumps({k: v for k, v in res.items() if k not in ("success", "message")}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
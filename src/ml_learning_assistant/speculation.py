@@ -0,0 +1,233 @@
+"""
+Speculative quiz pre-generation.
+
+After a chat answer, the user often opens the quiz page on the same topic.
+Generating that quiz from scratch repeats the quiz research over the same
+material. When a user opts in (sidebar toggle, default QUIZ_SPECULATION), the
+research notes that `ask_question` already produced are handed to
+`QuizSpeculator`. It generates the quiz in the background, skipping the
+research stage, and keeps it in a short-lived cache keyed by (session, topic).
+The quiz page serves it instantly when the topics match.
+
+Speculation only uses idle capacity:
+
+* it waits QUIZ_SPECULATION_DELAY seconds before starting, so the user's next
+  message goes first;
+* it starts only when no foreground request is running and the indexing
+  queue is empty, and gives up after QUIZ_SPECULATION_MAX_WAIT seconds;
+* at most one speculative quiz runs at a time, on a crew of its own (one per
+  tenant, from `crew_factory`): a crew memoizes its agents, so sharing the
+  foreground crew would let both calls run on the same agent objects.
+
+A pending speculation can be cancelled at any point before its LLM call
+starts. A running crew kickoff cannot be interrupted, so a result that
+arrives after cancellation is dropped.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .metrics import JOBS, SPECULATIONS
+from .research_notes import topic_key
+
+
+@dataclass
+class SpeculativeQuiz:
+    session_id: str
+    topic: str
+    num_questions: int
+    created_at: float = field(default_factory=time.time)
+    state: str = "pending"  # pending | running | ready | failed | cancelled | skipped
+    raw: Optional[str] = None
+    finished_at: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.session_id, topic_key(self.topic))
+
+
+class QuizSpeculator:
+    """Background quiz generation into a per-session, per-topic TTL cache."""
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        delay: Optional[float] = None,
+        max_wait: Optional[float] = None,
+        enabled: Optional[bool] = None,
+        crew_factory: Optional[Callable[[str], Any]] = None,
+    ):
+        self.ttl = float(os.getenv("QUIZ_SPECULATION_TTL", "600")) if ttl is None else ttl
+        self.delay = float(os.getenv("QUIZ_SPECULATION_DELAY", "3")) if delay is None else delay
+        self.max_wait = float(os.getenv("QUIZ_SPECULATION_MAX_WAIT", "60")) if max_wait is None else max_wait
+        if enabled is None:
+            enabled = os.getenv("QUIZ_SPECULATION", "false").strip().lower() == "true"
+        # default for the per-session opt-in
+        self.enabled = enabled
+        self._entries: Dict[Tuple[str, str], SpeculativeQuiz] = {}
+        self._lock = threading.Lock()
+        self._foreground = 0
+        self._crew_factory = crew_factory or self._build_crew
+        # tenant -> crew; used by the single speculation thread only
+        self._crews: Dict[str, Any] = {}
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quiz-speculation")
+
+    @staticmethod
+    def _build_crew(tenant_id: str):
+        from .crew import MLLearningAssistantCrew
+        return MLLearningAssistantCrew(tenant_id=tenant_id)
+
+    def _crew(self, tenant_id: str):
+        crew = self._crews.get(tenant_id)
+        if crew is None:
+            crew = self._crews[tenant_id] = self._crew_factory(tenant_id)
+        return crew
+
+    def close(self) -> None:
+        """Close the speculation crews (crew reset) once the queued runs are done; later runs build new ones."""
+        self._pool.submit(self._close_crews)
+
+    def _close_crews(self) -> None:
+        crews, self._crews = list(self._crews.values()), {}
+        for crew in crews:
+            try:
+                crew.close()
+            except Exception:
+                pass
+
+    # -----------------------------
+    # Idle capacity
+    # -----------------------------
+    @contextmanager
+    def foreground(self) -> Iterator[None]:
+        """Wrap user-facing crew calls; speculation does not start while any are running."""
+        with self._lock:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._foreground -= 1
+
+    def has_capacity(self) -> bool:
+        if self._foreground > 0:
+            return False
+        jobs = {k[0]: v for k, v in JOBS.values().items()}
+        return not (jobs.get("queued", 0) or jobs.get("running", 0))
+
+    def _wait_for_capacity(self, entry: SpeculativeQuiz) -> bool:
+        if entry.cancel_event.wait(self.delay):
+            return False
+        deadline = time.time() + self.max_wait
+        while not self.has_capacity():
+            if time.time() >= deadline or entry.cancel_event.wait(1.0):
+                return False
+        return not entry.cancel_event.is_set()
+
+    # -----------------------------
+    # Speculation
+    # -----------------------------
+    def submit(self, session_id: str, topic: str, num_questions: int, research_notes: str,
+               tenant_id: str) -> Optional[SpeculativeQuiz]:
+        """Queue a quiz on `topic` built from `research_notes`; replaces the session's earlier speculation."""
+        if not topic_key(topic) or not (research_notes or "").strip():
+            return None
+        entry = SpeculativeQuiz(session_id=session_id, topic=topic, num_questions=int(num_questions))
+        with self._lock:
+            self._purge()
+            for key, old in list(self._entries.items()):
+                if key[0] == session_id and old.state in ("pending", "running"):
+                    self._cancel(old)
+            self._entries[entry.key] = entry
+        SPECULATIONS.inc(result="submitted")
+        self._pool.submit(self._run, entry, research_notes, tenant_id)
+        return entry
+
+    def _run(self, entry: SpeculativeQuiz, research_notes: str, tenant_id: str) -> None:
+        # state changes are made under the lock `_cancel` holds, so a
+        # cancellation is never overwritten by "running" or "ready"
+        if not self._wait_for_capacity(entry):
+            with self._lock:
+                if entry.state == "pending":
+                    entry.state = "skipped"
+                    SPECULATIONS.inc(result="skipped")
+            return
+        with self._lock:
+            if entry.cancel_event.is_set():
+                return
+            entry.state = "running"
+        try:
+            raw = self._crew(tenant_id).generate_quiz(entry.topic, entry.num_questions,
+                                                      quiz_notes=research_notes, speculative=True)
+        except Exception as e:
+            raw = f"❌ Quiz error: {str(e)[:200]}"
+        entry.finished_at = time.time()
+        failed = not raw or raw.startswith(("❌", "⏳", "⏱️"))
+        with self._lock:
+            if entry.cancel_event.is_set():
+                return
+            if failed:
+                entry.state = "failed"
+                SPECULATIONS.inc(result="failed")
+            else:
+                entry.raw = raw
+                entry.state = "ready"
+                SPECULATIONS.inc(result="ready")
+        if failed:
+            print(f"⚠️ Speculative quiz for '{entry.topic}' failed: {(raw or '')[:120]}")
+        else:
+            print(f"⚡ Speculative quiz ready for '{entry.topic}' ({entry.finished_at - entry.created_at:.1f}s)")
+
+    def _cancel(self, entry: SpeculativeQuiz) -> None:
+        entry.cancel_event.set()
+        if entry.state in ("pending", "running", "ready"):
+            entry.state = "cancelled"
+            SPECULATIONS.inc(result="cancelled")
+
+    def cancel(self, session_id: str, topic: Optional[str] = None) -> int:
+        """Cancel the session's speculations (only `topic` when given)."""
+        n = 0
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if key[0] == session_id and (topic is None or key[1] == topic_key(topic)):
+                    self._cancel(entry)
+                    self._entries.pop(key, None)
+                    n += 1
+        return n
+
+    # -----------------------------
+    # Lookup
+    # -----------------------------
+    def _purge(self) -> None:
+        now = time.time()
+        for key, entry in list(self._entries.items()):
+            if now - entry.created_at > self.ttl:
+                self._entries.pop(key, None)
+                if entry.state == "ready":
+                    SPECULATIONS.inc(result="expired")
+                entry.cancel_event.set()
+
+    def peek(self, session_id: str) -> Optional[SpeculativeQuiz]:
+        """Most recent live speculation for the session (any state but cancelled/skipped/failed)."""
+        with self._lock:
+            self._purge()
+            live = [e for k, e in self._entries.items()
+                    if k[0] == session_id and e.state in ("pending", "running", "ready")]
+        return max(live, key=lambda e: e.created_at) if live else None
+
+    def take(self, session_id: str, topic: str, num_questions: int) -> Optional[str]:
+        """Return and consume a ready quiz when session, topic and size match."""
+        key = (session_id, topic_key(topic))
+        with self._lock:
+            self._purge()
+            entry = self._entries.get(key)
+            if entry is None or entry.state != "ready" or entry.num_questions != int(num_questions):
+                return None
+            self._entries.pop(key, None)
+        SPECULATIONS.inc(result="served")
+        return entry.raw
@@ -0,0 +1,178 @@
+"""
+Multi-tenant isolation for the vector store.
+
+Every tenant (user / workspace) gets its own Chroma collection so queries only
+scan that tenant's corpus and one user's upload never changes another user's
+answers. The default tenant keeps using the plain CHROMA_COLLECTION name, so
+existing single-user deployments see no change.
+"""
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_TENANT = "default"
+
+_TENANT_RE = re.compile(r"[^a-z0-9_-]+")
+# a safe ID kept as is, optionally with the ".<hash>" suffix normalize_tenant_id adds
+_NORMALIZED_RE = re.compile(r"^[a-z0-9](?:[a-z0-9_-]{0,46}[a-z0-9])?(?:\.[0-9a-f]{8})?$")
+
+_store = None
+_embedding_function = None
+_store_configured = False
+_store_lock = threading.Lock()
+_collections: Dict[str, Any] = {}
+_collections_lock = threading.Lock()
+
+
+class TenantQuotaExceeded(ValueError):
+    """Raised when an upload would push a tenant over its configured quota."""
+
+
+def normalize_tenant_id(tenant_id: Optional[str]) -> str:
+    """
+    Map any user/session identifier to a collection-safe tenant id.
+
+    Safe IDs (lowercase letters, digits, "-" and "_", at most 48 characters)
+    are kept. Anything else is slugged and gets "." plus a short hash of the
+    ID, so "a.b@x.com" and "a-b@x-com" stay different tenants. Normalized IDs
+    map to themselves.
+    """
+    raw = (tenant_id or "").strip().lower()
+    if not raw:
+        return DEFAULT_TENANT
+    if _NORMALIZED_RE.match(raw):
+        return raw
+    slug = _TENANT_RE.sub("-", raw)[:39].strip("-_") or "tenant"
+    return f"{slug}.{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:8]}"
+
+
+def base_collection_name() -> str:
+    return os.getenv("CHROMA_COLLECTION", "ml_materials")
+
+
+def collection_name_for(tenant_id: Optional[str]) -> str:
+    """Collection that holds a tenant's chunks."""
+    tenant = normalize_tenant_id(tenant_id)
+    base = base_collection_name()
+    if tenant == DEFAULT_TENANT:
+        return base
+    return f"{base}-{tenant}"
+
+
+def tenant_dir(base_dir: Path, tenant_id: Optional[str]) -> Path:
+    """Per-tenant subdirectory (the default tenant keeps the legacy location)."""
+    tenant = normalize_tenant_id(tenant_id)
+    path = Path(base_dir) if tenant == DEFAULT_TENANT else Path(base_dir) / "tenants" / tenant
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def get_vector_store():
+    """The configured VectorStore (VECTOR_STORE, see vector_store.py)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from .vector_store import create_vector_store
+                _store = create_vector_store()
+    return _store
+
+
+def configure_client(client, embedding_function=None) -> None:
+    """
+    Use an explicit Chroma client or VectorStore (e.g. an in-process
+    EphemeralClient for offline benchmarks) and optional embedding function
+    instead of the one VECTOR_STORE selects.
+    """
+    global _store, _embedding_function, _store_configured
+    if client is not None:
+        from .vector_store import ChromaVectorStore, VectorStore
+        if not isinstance(client, VectorStore):
+            client = ChromaVectorStore(client)
+    with _store_lock:
+        _store = client
+        _store_configured = client is not None
+        _embedding_function = embedding_function
+    with _collections_lock:
+        _collections.clear()
+
+
+def get_collection(tenant_id: Optional[str] = None):
+    """
+    Return the tenant's collection handle, creating it lazily.
+    Handles are cached per tenant so repeated queries skip the lookup round-trip.
+    """
+    name = collection_name_for(tenant_id)
+    col = _collections.get(name)
+    if col is not None:
+        return col
+    with _collections_lock:
+        col = _collections.get(name)
+        if col is None:
+            col = get_vector_store().collection(name, embedding_function=_embedding_function)
+            _collections[name] = col
+    return col
+
+
+def delete_collection(tenant_id: Optional[str] = None) -> bool:
+    """
+    Drop the tenant's collection (snapshot restore with --replace); False if it
+    did not exist. The tenant's near-duplicate index goes with it, since its
+    references would point at chunks that are gone.
+    """
+    from .dedup import get_dedup_index
+
+    name = collection_name_for(tenant_id)
+    get_dedup_index().forget_tenant(tenant_id)
+    with _collections_lock:
+        _collections.pop(name, None)
+        try:
+            get_vector_store().delete_collection(name)
+        except Exception:
+            return False
+    return True
+
+
+def max_batch_size() -> int:
+    """Largest add/upsert the vector store accepts."""
+    return get_vector_store().max_batch_size()
+
+
+def invalidate(tenant_id: Optional[str] = None) -> None:
+    """Drop cached handles (one tenant, or all when tenant_id is None)."""
+    global _store
+    with _collections_lock:
+        if tenant_id is None:
+            _collections.clear()
+            if not _store_configured:
+                _store = None
+        else:
+            _collections.pop(collection_name_for(tenant_id), None)
+
+
+def get_quota() -> Dict[str, int]:
+    """Per-tenant limits; 0 means unlimited."""
+    return {
+        "max_chunks": int(os.getenv("TENANT_MAX_CHUNKS", "0") or 0),
+        "max_documents": int(os.getenv("TENANT_MAX_DOCUMENTS", "0") or 0),
+    }
+
+
+def check_quota(tenant_id: Optional[str], new_chunks: int, current_chunks: int,
+                new_documents: int = 0, current_documents: int = 0) -> None:
+    """Raise TenantQuotaExceeded if the upload would exceed the tenant's quota."""
+    quota = get_quota()
+    tenant = normalize_tenant_id(tenant_id)
+    if quota["max_chunks"] and current_chunks + new_chunks > quota["max_chunks"]:
+        raise TenantQuotaExceeded(
+            f"Quota exceeded for '{tenant}': {current_chunks} + {new_chunks} chunks "
+            f"> limit {quota['max_chunks']}"
+        )
+    if quota["max_documents"] and current_documents + new_documents > quota["max_documents"]:
+        raise TenantQuotaExceeded(
+            f"Quota exceeded for '{tenant}': {current_documents} + {new_documents} documents "
+            f"> limit {quota['max_documents']}"
+        )
@@ -1,54 +1,102 @@
 """Direct ChromaDB RAG tool (bypasses MCP gateway issues)"""
-import os
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
-import chromadb
+
+from ..research_notes import record_chunk_ids
+from ..retrieval import expand_queries, multi_query_search
+from ..tenancy import get_collection, invalidate
+from ..tracing import span
 
 
 class ChromaQueryInput(BaseModel):
     query: str = Field(..., description="Search query text")
     n_results: int = Field(default=5, description="Number of results to return")
+    sub_queries: Optional[List[str]] = Field(
+        default=None, description="Extra sub-queries searched in the same call; hits are merged")
+    expand: bool = Field(
+        default=False, description="Also search subtopics of the query (definition, examples, pitfalls, ...) "
+                                   "in the same call; use for quiz notes and broad topics")
 
 
 class ChromaRAGTool(BaseTool):
     name: str = "chroma_rag_search"
     description: str = "Search the ML materials knowledge base for relevant information. Use this for questions about uploaded course materials, lecture notes, or previously indexed documents."
     args_schema: type[BaseModel] = ChromaQueryInput
+    tenant_id: Optional[str] = None
     
-    def _run(self, query: str, n_results: int = 5) -> str:
+    def _run(self, query: str, n_results: int = 5, sub_queries: Optional[List[str]] = None,
+             expand: bool = False) -> str:
         """Execute RAG search against ChromaDB"""
         try:
-            host = os.getenv("CHROMA_HOST", "chromadb")
-            port = int(os.getenv("CHROMA_PORT", "8000"))
-            collection_name = os.getenv("CHROMA_COLLECTION", "ml_materials")
-            
-            client = chromadb.HttpClient(host=host, port=port)
-            collection = client.get_collection(name=collection_name)
-            
-            results = collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
-            )
+            collection = get_collection(self.tenant_id)
+            if expand or sub_queries:
+                return self._run_batched(collection, query, n_results, sub_queries, expand)
+
+            with span("chroma_query", n_results=n_results):
+                results = collection.query(
+                    query_texts=[query],
+                    n_results=n_results,
+                    include=["documents", "metadatas", "distances"]
+                )
             
             if not results["documents"] or not results["documents"][0]:
                 return "No relevant information found in the knowledge base."
+            record_chunk_ids(results["ids"][0])
             
             # Format results
             docs = results["documents"][0]
             metas = results["metadatas"][0]
             dists = results["distances"][0]
+            also = self._also_in(results["ids"][0])
             
             formatted = []
-            for i, (doc, meta, dist) in enumerate(zip(docs, metas, dists), 1):
+            for i, (cid, doc, meta, dist) in enumerate(zip(results["ids"][0], docs, metas, dists), 1):
                 source = meta.get("source", "unknown")
                 page = meta.get("page", "?")
                 formatted.append(
-                    f"[Result {i}] (source: {source}, page: {page}, relevance: {1-dist:.2f})\n{doc}\n"
+                    f"[Result {i}] (source: {source}, page: {page}, relevance: {1-dist:.2f}{also.get(cid, '')})\n{doc}\n"
                 )
             
             return "\n".join(formatted)
             
         except Exception as e:
+            invalidate(self.tenant_id)
             return f"Error searching knowledge base: {str(e)}"
+
+    def _run_batched(self, collection, query: str, n_results: int,
+                     sub_queries: Optional[List[str]], expand: bool) -> str:
+        """Several queries in one Chroma call, deduplicated and MMR-ranked."""
+        if expand:
+            queries = expand_queries(query, extra=sub_queries)
+        else:
+            queries = expand_queries(query, max_queries=1 + len(sub_queries or []), extra=sub_queries)
+        with span("chroma_query", n_results=n_results, queries=len(queries)):
+            results = multi_query_search(collection, queries, n_results=n_results)
+
+        if not results["documents"]:
+            return "No relevant information found in the knowledge base."
+        record_chunk_ids(results["ids"])
+
+        also = self._also_in(results["ids"])
+        formatted = [f"Searched {len(queries)} queries: " + "; ".join(queries)]
+        for i, (cid, doc, meta, dist, matched) in enumerate(
+                zip(results["ids"], results["documents"], results["metadatas"], results["distances"],
+                    results["queries"]), 1):
+            formatted.append(
+                f"[Result {i}] (source: {meta.get('source', 'unknown')}, page: {meta.get('page', '?')}, "
+                f"relevance: {1-dist:.2f}, matched: {matched[0]}{also.get(cid, '')})\n{doc}\n"
+            )
+        return "\n".join(formatted)
+
+    def _also_in(self, ids: Sequence[str]) -> Dict[str, str]:
+        """", also in: deck.pdf p. 4" for results whose near-duplicates were stored as references."""
+        try:
+            from ..dedup import dedup_enabled, format_also_in, get_dedup_index
+
+            if not dedup_enabled():
+                return {}
+            found = get_dedup_index().also_in(self.tenant_id, list(ids))
+            return {cid: f", also in: {format_also_in(dups)}" for cid, dups in found.items()}
+        except Exception:
+            return {}
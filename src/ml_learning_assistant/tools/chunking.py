@@ -0,0 +1,260 @@
+"""
+Structure-aware chunking per file type.
+
+Sizes are counted in tokens (tiktoken's cl100k_base when installed, otherwise
+an approximation that splits words into pieces of up to 4 characters), because
+embedding models limit and attend over tokens, not characters.
+
+CHUNKING_STRATEGY=structure (default):
+
+* `.py`: AST units. Each top-level function, class or statement is a unit,
+  and the comments above a definition stay with it. Small consecutive units
+  (imports, constants, short helpers) are packed until the chunk reaches
+  CHUNK_MIN_TOKENS, never past CHUNK_TOKENS, so a complete function is not
+  diluted by unrelated neighbours. A class that does not fit is split into its
+  methods, each prefixed with the `class` line. Nothing is cut mid-function
+  unless a single function exceeds the budget. Files that do not parse fall
+  back to prose splitting.
+* `.md`: heading sections (fenced code blocks are never split on `#`). Small
+  consecutive sections are packed the same way, long ones are split with their
+  heading path ("Intro > Setup") repeated on every piece, and the path is kept
+  in the `section` metadata.
+* `.pptx`: one chunk per slide, never merged across slides. Only slides
+  longer than the budget are split.
+* CSV row batches are already sized by the loader and pass through.
+* Everything else (PDF pages, DOCX, TXT): recursive splitting by token count
+  with CHUNK_OVERLAP_TOKENS overlap.
+
+Overlap only applies where a unit has to be cut, so whole functions, sections
+and slides are embedded once. CHUNKING_STRATEGY=recursive restores the
+previous 1000/200-character splitter for every type.
+"""
+from __future__ import annotations
+
+import ast
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..lazy import lazy_import
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+_documents = lazy_import("langchain_core.documents")
+
+CHUNKING_STRATEGIES = ("structure", "recursive")
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "structure").strip().lower()
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "384"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+# small units are packed together until a chunk reaches this size (0 = fill up to CHUNK_TOKENS)
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "128"))
+# larger Python files are split as prose instead of parsed
+PY_AST_MAX_BYTES = int(os.getenv("PY_AST_MAX_BYTES", str(2 << 20)))
+
+_TOKEN_PIECE = re.compile(r"\w+|[^\w\s]")
+_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t]*#*[ \t]*$")
+_FENCE = re.compile(r"^[ \t]{0,3}(```|~~~)")
+
+
+@lru_cache(maxsize=1)
+def _tiktoken_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text` (tiktoken if available, else a close approximation)."""
+    enc = _tiktoken_encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return sum((len(p) + 3) // 4 for p in _TOKEN_PIECE.findall(text))
+
+
+def _splitter(chunk_tokens: int, overlap_tokens: int, language: Optional[str] = None):
+    from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+
+    kwargs = dict(chunk_size=chunk_tokens, chunk_overlap=min(overlap_tokens, chunk_tokens // 2),
+                  length_function=count_tokens)
+    if language:
+        return RecursiveCharacterTextSplitter.from_language(Language(language), **kwargs)
+    return RecursiveCharacterTextSplitter(**kwargs)
+
+
+def _doc(text: str, metadata: Dict) -> Document:
+    return _documents.Document(page_content=text, metadata=metadata)
+
+
+def _pack(units: Iterable[Tuple[str, Dict]], budget: int, min_tokens: int = 0) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    Join consecutive units while they fit in `budget` tokens. With
+    `min_tokens`, a unit only joins the previous chunk while that chunk is
+    still smaller than this, so complete units are not merged with unrelated
+    neighbours.
+    """
+    parts: List[str] = []
+    metas: List[Dict] = []
+    used = 0
+    for text, meta in units:
+        n = count_tokens(text)
+        if parts and (used + n > budget or (min_tokens and used >= min_tokens)):
+            yield "\n".join(parts), metas
+            parts, metas, used = [], [], 0
+        parts.append(text)
+        metas.append(meta)
+        used += n
+    if parts:
+        yield "\n".join(parts), metas
+
+
+# -----------------------------
+# Python
+# -----------------------------
+def _python_units(source: str, budget: int) -> Iterator[Tuple[str, Dict]]:
+    """(text, {"symbol", "line", "line_end"}) per top-level statement, classes split by method if too big."""
+    tree = ast.parse(source)
+    lines = source.splitlines(keepends=True)
+
+    def text(lo: int, hi: int) -> str:
+        return "".join(lines[lo - 1:hi]).strip("\n")
+
+    prev_end = 0
+    body = tree.body
+    for i, node in enumerate(body):
+        lo = prev_end + 1  # comments and blank lines above belong to the next statement
+        hi = node.end_lineno if i < len(body) - 1 else len(lines)
+        prev_end = hi
+        name = getattr(node, "name", None)
+        unit = text(lo, hi)
+        if not unit.strip():
+            continue
+        if not isinstance(node, ast.ClassDef) or count_tokens(unit) <= budget or not node.body:
+            yield unit, {"symbol": name, "line": lo, "line_end": hi}
+            continue
+        # class too big for one chunk: header, then one unit per member with the class line as context
+        header = lines[node.lineno - 1].strip()
+        first = min([node.body[0].lineno] + [d.lineno for d in getattr(node.body[0], "decorator_list", [])])
+        head = text(lo, first - 1)
+        if head.strip():
+            yield head, {"symbol": name, "line": lo, "line_end": first - 1}
+        member_prev = first - 1
+        for j, member in enumerate(node.body):
+            m_hi = member.end_lineno if j < len(node.body) - 1 else hi
+            m_text = text(member_prev + 1, m_hi)
+            m_name = getattr(member, "name", None)
+            if m_text.strip():
+                yield f"{header}  # ...\n{m_text}", {"symbol": f"{name}.{m_name}" if m_name else name,
+                                                     "line": member_prev + 1, "line_end": m_hi}
+            member_prev = m_hi
+
+
+def chunk_python(source: str, metadata: Dict, chunk_tokens: int, overlap_tokens: int) -> Iterator[Document]:
+    splitter = None
+    for packed, metas in _pack(_python_units(source, chunk_tokens), chunk_tokens, CHUNK_MIN_TOKENS):
+        symbols = [m["symbol"] for m in metas if m.get("symbol")]
+        meta = dict(metadata, line=metas[0]["line"], line_end=metas[-1]["line_end"],
+                    symbol=", ".join(symbols)[:200] if symbols else None, chunker="python-ast")
+        if count_tokens(packed) <= chunk_tokens:
+            yield _doc(packed, meta)
+            continue
+        # a single function longer than the budget
+        splitter = splitter or _splitter(chunk_tokens, overlap_tokens, "python")
+        for piece in splitter.split_text(packed):
+            yield _doc(piece, dict(meta))
+
+
+# -----------------------------
+# Markdown
+# -----------------------------
+def _markdown_sections(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """(heading path, section text) in document order; the text includes the heading line."""
+    stack: List[Tuple[int, str]] = []
+    buf: List[str] = []
+    fence: Optional[str] = None
+
+    def path() -> str:
+        return " > ".join(t for _, t in stack)
+
+    for line in lines:
+        fm = _FENCE.match(line)
+        if fm:
+            fence = None if fence == fm.group(1) else (fence or fm.group(1))
+        hm = _HEADING.match(line.rstrip("\n")) if fence is None and not fm else None
+        if hm:
+            if "".join(buf).strip():
+                yield path(), "".join(buf).strip("\n")
+            buf = []
+            level = len(hm.group(1))
+            stack = [(lv, t) for lv, t in stack if lv < level] + [(level, hm.group(2).strip())]
+        buf.append(line if line.endswith("\n") else line + "\n")
+    if "".join(buf).strip():
+        yield path(), "".join(buf).strip("\n")
+
+
+def chunk_markdown(lines: Iterable[str], metadata: Dict, chunk_tokens: int,
+                   overlap_tokens: int) -> Iterator[Document]:
+    splitter = None
+
+    def units() -> Iterator[Tuple[str, Dict]]:
+        nonlocal splitter
+        for section, text in _markdown_sections(lines):
+            if count_tokens(text) <= chunk_tokens:
+                yield text, {"section": section}
+                continue
+            splitter = splitter or _splitter(chunk_tokens - min(32, chunk_tokens // 4), overlap_tokens, "markdown")
+            for i, piece in enumerate(splitter.split_text(text)):
+                # later pieces lose the heading, so repeat its path
+                yield (piece if i == 0 or not section else f"{section}\n\n{piece}"), {"section": section}
+
+    for packed, metas in _pack(units(), chunk_tokens, CHUNK_MIN_TOKENS):
+        yield _doc(packed, dict(metadata, section=metas[0]["section"][:200] or None, chunker="markdown"))
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def iter_structured_chunks(filepath: str, pages: Iterable[Document], strategy: Optional[str] = None,
+                           chunk_tokens: Optional[int] = None,
+                           overlap_tokens: Optional[int] = None) -> Iterator[Document]:
+    """Split the loaded pages of `filepath` into index chunks with the strategy for its file type."""
+    strategy = (strategy or CHUNKING_STRATEGY).strip().lower()
+    if strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(f"CHUNKING_STRATEGY must be one of {', '.join(CHUNKING_STRATEGIES)} (got {strategy!r})")
+    chunk_tokens = int(chunk_tokens or CHUNK_TOKENS)
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else int(overlap_tokens)
+    path = Path(filepath)
+    ext = path.suffix.lower()
+    base = {"source": path.name, "file_type": ext}
+
+    if strategy == "recursive":
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        for page in pages:
+            yield from ([page] if page.metadata.get("prechunked") else splitter.split_documents([page]))
+        return
+
+    if ext == ".py" and path.stat().st_size <= PY_AST_MAX_BYTES:
+        source = "".join(p.page_content for p in pages)
+        try:
+            yield from chunk_python(source, base, chunk_tokens, overlap_tokens)
+            return
+        except SyntaxError:
+            pages = [_doc(source, dict(base))]
+    elif ext == ".md":
+        lines = (line for p in pages for line in p.page_content.splitlines(keepends=True))
+        yield from chunk_markdown(lines, base, chunk_tokens, overlap_tokens)
+        return
+
+    splitter = None
+    for page in pages:
+        if page.metadata.get("prechunked") or (ext == ".pptx" and count_tokens(page.page_content) <= chunk_tokens):
+            yield page
+            continue
+        splitter = splitter or _splitter(chunk_tokens, overlap_tokens)
+        yield from splitter.split_documents([page])
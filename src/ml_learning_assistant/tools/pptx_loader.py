@@ -0,0 +1,224 @@
+"""
+Fast PowerPoint text extraction.
+
+Reads the slide XML parts straight from the .pptx zip instead of building the
+python-pptx object model. Slides are parsed in parallel by a process pool
+(large decks) and yielded in slide order as a stream of per-slide Documents.
+Text from grouped shapes, tables and speaker notes is included.
+
+Decks are parsed in indexing threads of the multithreaded app and API
+processes, and forking such a process can deadlock on locks other threads
+hold. Pool workers are therefore started with forkserver (spawn where that is
+missing), never fork. Starting them that way costs some time, so one pool is
+kept for the life of the process. Inside worker processes (bulk ingest
+parallelises per file) decks are parsed serially.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import posixpath
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+from ..lazy import lazy_import
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# pool workers only parse XML; they never build Documents
+_documents = lazy_import("langchain_core.documents")
+
+NS = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+_A = "{%s}" % NS["a"]
+_P = "{%s}" % NS["p"]
+_NOTES_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/notesSlide"
+# placeholders on a notes page that are not speaker notes
+_NOTES_SKIP_PH = {"sldNum", "hdr", "ftr", "dt", "sldImg"}
+
+PPTX_WORKERS = int(os.getenv("PPTX_WORKERS", "0") or 0)  # 0 = cpu count
+PPTX_PARALLEL_MIN_SLIDES = int(os.getenv("PPTX_PARALLEL_MIN_SLIDES", "40"))
+
+# (slide index, slide text, notes text)
+SlideText = Tuple[int, str, str]
+
+
+def _read_rels(zf: zipfile.ZipFile, part: str) -> dict:
+    """Map relationship id -> (type, absolute part name) for a package part."""
+    folder, name = posixpath.split(part)
+    rels_name = posixpath.join(folder, "_rels", name + ".rels")
+    try:
+        root = ET.fromstring(zf.read(rels_name))
+    except KeyError:
+        return {}
+    out = {}
+    for rel in root.findall("rel:Relationship", NS):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") == "External":
+            continue
+        out[rel.get("Id")] = (rel.get("Type", ""), posixpath.normpath(posixpath.join(folder, target)))
+    return out
+
+
+def list_slide_parts(zf: zipfile.ZipFile) -> List[str]:
+    """Slide part names in presentation order."""
+    pres = "ppt/presentation.xml"
+    rels = _read_rels(zf, pres)
+    root = ET.fromstring(zf.read(pres))
+    parts = []
+    for sld in root.iterfind("p:sldIdLst/p:sldId", NS):
+        rid = sld.get("{%s}id" % NS["r"])
+        if rid in rels:
+            parts.append(rels[rid][1])
+    return parts
+
+
+def _paragraphs(elem: ET.Element) -> List[str]:
+    lines = []
+    for para in elem.iter(_A + "p"):
+        text = "".join(t.text or "" for t in para.iter(_A + "t")).strip()
+        if text:
+            lines.append(text)
+    return lines
+
+
+def _table_text(frame: ET.Element) -> List[str]:
+    rows = []
+    for tr in frame.iter(_A + "tr"):
+        cells = [" ".join(_paragraphs(tc)) for tc in tr.findall(_A + "tc")]
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return rows
+
+
+def _placeholder_type(shape: ET.Element) -> Optional[str]:
+    ph = shape.find("p:nvSpPr/p:nvPr/p:ph", NS)
+    return ph.get("type", "body") if ph is not None else None
+
+
+def _shape_tree_text(tree: ET.Element, skip_ph: frozenset = frozenset()) -> List[str]:
+    """Text of every shape in a shape tree, recursing into groups and tables."""
+    out: List[str] = []
+    for shape in tree:
+        tag = shape.tag
+        if tag == _P + "sp":
+            if skip_ph and _placeholder_type(shape) in skip_ph:
+                continue
+            lines = _paragraphs(shape)
+            if lines:
+                out.append("\n".join(lines))
+        elif tag == _P + "grpSp":
+            out.extend(_shape_tree_text(shape, skip_ph))
+        elif tag == _P + "graphicFrame":
+            rows = _table_text(shape)
+            if rows:
+                out.append("\n".join(rows))
+    return out
+
+
+def _part_text(zf: zipfile.ZipFile, part: str, skip_ph: frozenset = frozenset()) -> str:
+    root = ET.fromstring(zf.read(part))
+    tree = root.find("p:cSld/p:spTree", NS)
+    return "\n".join(_shape_tree_text(tree, skip_ph)) if tree is not None else ""
+
+
+def _extract_from_zip(zf: zipfile.ZipFile, tasks: List[Tuple[int, str]]) -> Iterator[SlideText]:
+    for idx, part in tasks:
+        text = _part_text(zf, part)
+        notes = ""
+        for rel_type, target in _read_rels(zf, part).values():
+            if rel_type == _NOTES_REL:
+                notes = _part_text(zf, target, frozenset(_NOTES_SKIP_PH))
+                break
+        yield idx, text, notes
+
+
+def _extract_slides(filepath: str, tasks: List[Tuple[int, str]]) -> List[SlideText]:
+    """Worker: parse a run of slides (reading the zip directory once per task)."""
+    with zipfile.ZipFile(filepath) as zf:
+        return list(_extract_from_zip(zf, tasks))
+
+
+def _worker_count() -> int:
+    if multiprocessing.parent_process() is not None:
+        # already a worker (bulk ingest runs one file per process): parse serially
+        return 1
+    return max(1, PPTX_WORKERS or os.cpu_count() or 1)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    """The shared extraction pool (forkserver / spawn workers), created on first use."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _pool_workers = workers
+        return _pool
+
+
+def _drop_pool() -> None:
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def iter_slide_texts(filepath: str, parallel: Optional[bool] = None) -> Iterator[SlideText]:
+    """Yield (slide index, text, notes) in slide order."""
+    with zipfile.ZipFile(filepath) as zf:
+        numbered = list(enumerate(list_slide_parts(zf), 1))
+        workers = _worker_count()
+        if parallel is None:
+            parallel = len(numbered) >= PPTX_PARALLEL_MIN_SLIDES
+        if not parallel or workers < 2:
+            yield from _extract_from_zip(zf, numbered)
+            return
+
+    # Two runs per worker: few zip-directory reads, but early slides still stream
+    # out while later runs are being parsed.
+    per_task = max(1, -(-len(numbered) // (workers * 2)))
+    tasks = [numbered[i:i + per_task] for i in range(0, len(numbered), per_task)]
+    try:
+        # map() keeps slide order
+        for result in _process_pool(workers).map(_extract_slides, [filepath] * len(tasks), tasks):
+            yield from result
+    except BrokenProcessPool:
+        _drop_pool()  # a worker died; the next deck starts a new pool
+        raise
+
+
+def iter_pptx_documents(filepath: str, parallel: Optional[bool] = None) -> Iterator[Document]:
+    """Stream one Document per non-empty slide (slide text + speaker notes)."""
+    path = Path(filepath)
+    for idx, text, notes in iter_slide_texts(filepath, parallel=parallel):
+        content = text
+        if notes:
+            content = f"{text}\n\nSpeaker notes:\n{notes}" if text else f"Speaker notes:\n{notes}"
+        if not content.strip():
+            continue
+        yield _documents.Document(
+            page_content=content,
+            metadata={
+                "source": path.name,
+                "slide": idx,
+                "file_type": ".pptx",
+                "has_notes": bool(notes),
+            },
+        )
@@ -2,124 +2,384 @@
 Multi-format Document Uploader for ChromaDB
 Supports: PDF, TXT, MD, DOCX, PY, CSV, PPTX
 """
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import math
+import mmap
 import os
+import shutil
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Any, Iterator, List, Optional, Sequence
+
+from ..catalog import file_sha256, get_catalog
+from ..lazy import lazy_import
+from ..metrics import CHROMA_SECONDS
+from ..tenancy import TenantQuotaExceeded, check_quota, collection_name_for, get_collection
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# Loaders and the splitter are imported per file type on first use
+_documents = lazy_import("langchain_core.documents")
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md", ".docx", ".py", ".csv", ".pptx")
+UPSERT_BATCH_SIZE = int(os.getenv("CHROMA_UPSERT_BATCH_SIZE", "256"))
+# Text is decoded from the memory-mapped file in segments of this many bytes
+TEXT_SEGMENT_BYTES = int(os.getenv("TEXT_SEGMENT_BYTES", str(1 << 20)))
+STREAM_CHUNK_BYTES = 1 << 20
+# CSV ingestion: "batched" groups rows into size-bounded chunks, "row" = one chunk per row
+CSV_INGEST_MODE = os.getenv("CSV_INGEST_MODE", "batched").strip().lower()
+CSV_CHUNK_CHARS = int(os.getenv("CSV_CHUNK_CHARS", "2000"))
+# progress of these is measured in characters consumed; PDFs and decks in pages
+_TEXT_EXTENSIONS = (".txt", ".md", ".py", ".csv")
+
+
+def make_ids(filepath: str, n: int, start: int = 0) -> List[str]:
+    """Generate unique IDs for document chunks (keyed by file name, so lecture.pdf and lecture.pptx don't collide)"""
+    name = Path(filepath).name
+    return [f"{name}_{i}" for i in range(start, start + n)]
+
+
+def save_upload_stream(fileobj: BinaryIO, dest: Path, chunk_size: int = STREAM_CHUNK_BYTES) -> int:
+    """
+    Copy an uploaded file-like object to disk in fixed-size chunks.
+    Writes to a temp file first so a half-written upload is never indexed.
+    """
+    dest = Path(dest)
+    tmp = dest.with_name(dest.name + ".part")
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    with open(tmp, "wb") as out:
+        shutil.copyfileobj(fileobj, out, length=chunk_size)
+    os.replace(tmp, dest)
+    return dest.stat().st_size
+
+
+def iter_text_segments(filepath: str, segment_bytes: int = TEXT_SEGMENT_BYTES,
+                       max_chars: Optional[int] = None) -> Iterator[str]:
+    """
+    Incrementally decode a memory-mapped UTF-8 file.
+    Segments end on a line boundary (when one exists) so lines are never split,
+    and only one segment is held in memory at a time. A line longer than
+    `max_chars` (default 4 segments) is split anyway, at its last space when
+    it has one, so a file without newlines does not end up in memory whole.
+    """
+    max_chars = max_chars or 4 * segment_bytes
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+            carry = ""
+            pos, size = 0, len(mm)
+            while pos < size:
+                end = min(pos + segment_bytes, size)
+                text = carry + decoder.decode(mm[pos:end], final=end == size)
+                pos = end
+                cut = text.rfind("\n") + 1 if pos < size else len(text)
+                if cut <= 0:
+                    if len(text) < max_chars:
+                        carry = text
+                        continue
+                    cut = text.rfind(" ") + 1 or len(text)
+                carry = text[cut:]
+                if text[:cut]:
+                    yield text[:cut]
+            if carry:
+                yield carry
+
+
+def iter_text_lines(filepath: str) -> Iterator[str]:
+    """Lines (with line endings) of a memory-mapped text file."""
+    for segment in iter_text_segments(filepath):
+        yield from segment.splitlines(keepends=True)
+
+
+def iter_text_documents(filepath: str) -> Iterator[Document]:
+    """One Document per decoded segment of a text file."""
+    path = Path(filepath)
+    for idx, segment in enumerate(iter_text_segments(filepath)):
+        yield _documents.Document(
+            page_content=segment,
+            metadata={"source": path.name, "file_type": path.suffix.lower(), "segment": idx},
+        )
+
+
+def iter_csv_documents(filepath: str) -> Iterator[Document]:
+    """One Document per CSV row (same content layout as langchain's CSVLoader)."""
+    path = Path(filepath)
+    reader = csv.DictReader(iter_text_lines(filepath))
+    for row_idx, row in enumerate(reader):
+        content = "\n".join(
+            f"{(k or '').strip()}: {(v if isinstance(v, str) else ','.join(v or [])).strip()}"
+            for k, v in row.items()
+        )
+        yield _documents.Document(
+            page_content=content,
+            metadata={"source": path.name, "file_type": ".csv", "row": row_idx},
+        )
+
+
+def iter_csv_row_batches(filepath: str, max_chars: int = CSV_CHUNK_CHARS) -> Iterator[Document]:
+    """
+    Group CSV rows into size-bounded chunks, each starting with the header line.
+    Rows are streamed through the csv module; chunk metadata records the row
+    range so results can still be traced back to the source rows.
+    """
+    path = Path(filepath)
+    reader = csv.reader(iter_text_lines(filepath))
+    header = next(reader, None)
+    if header is None:
+        return
 
-import chromadb
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredWordDocumentLoader,
-    CSVLoader,
-)
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+    def to_line(row: List[str]) -> str:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerow(row)
+        return buf.getvalue()
 
-CHROMA_HOST = os.getenv("CHROMA_HOST", "chromadb")
-CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
-COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "ml_materials")
+    header_line = to_line(header)
+    lines: List[str] = []
+    size = len(header_line)
+    row_start = 0
 
+    def make_doc(row_end: int) -> Document:
+        content = header_line + "".join(lines)
+        return _documents.Document(
+            page_content=content,
+            metadata={
+                "source": path.name,
+                "file_type": ".csv",
+                "row": row_start,
+                "row_end": row_end,
+                "rows": row_end - row_start + 1,
+                "csv_header": header_line.strip()[:500],
+                # a single oversized row still goes through the splitter
+                "prechunked": len(content) <= max_chars,
+            },
+        )
 
-def make_ids(filepath: str, n: int) -> List[str]:
-    """Generate unique IDs for document chunks"""
-    stem = Path(filepath).stem
-    return [f"{stem}_{i}" for i in range(n)]
+    row_idx = -1
+    for row_idx, row in enumerate(reader):
+        if not any(cell.strip() for cell in row):
+            continue
+        line = to_line(row)
+        if lines and size + len(line) > max_chars:
+            yield make_doc(row_idx - 1)
+            lines, size, row_start = [], len(header_line), row_idx
+        lines.append(line)
+        size += len(line)
+    if lines:
+        yield make_doc(row_idx)
 
 
 def load_pptx(filepath: str) -> List[Document]:
-    """Extract text from PowerPoint presentations"""
+    """Extract text (shapes, groups, tables, speaker notes) from PowerPoint presentations"""
     try:
-        from pptx import Presentation
-        
-        prs = Presentation(filepath)
-        documents = []
-        path = Path(filepath)
-        
-        for slide_idx, slide in enumerate(prs.slides, 1):
-            slide_text = []
-            
-            # Extract text from all shapes
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text = shape.text.strip()
-                    if text:
-                        slide_text.append(text)
-            
-            # Create document for slide
-            if slide_text:
-                content = "\n".join(slide_text)
-                doc = Document(
-                    page_content=content,
-                    metadata={
-                        "source": path.name,
-                        "slide": slide_idx,
-                        "file_type": ".pptx"
-                    }
-                )
-                documents.append(doc)
-        
-        return documents if documents else []
-    
-    except ImportError:
-        raise ImportError("python-pptx not installed. Run: pip install python-pptx")
+        from .pptx_loader import iter_pptx_documents
+        return list(iter_pptx_documents(filepath))
     except Exception as e:
         raise ValueError(f"Failed to parse PPTX: {str(e)}")
 
 
-def load_document(filepath: str) -> List[Document]:
-    """Load document based on file extension"""
+def iter_documents(filepath: str) -> Iterator[Document]:
+    """Lazily load a document based on file extension"""
     path = Path(filepath)
     extension = path.suffix.lower()
     
     try:
         if extension == ".pdf":
-            loader = PyPDFLoader(filepath)
-            return loader.load()
-        
-        elif extension in [".txt", ".md", ".py"]:
-            # Text-based files
-            loader = TextLoader(filepath, encoding="utf-8")
-            return loader.load()
+            from langchain_community.document_loaders import PyPDFLoader
+            yield from PyPDFLoader(filepath).lazy_load()
         
         elif extension == ".docx":
             # Word documents
+            from langchain_community.document_loaders import UnstructuredWordDocumentLoader
             loader = UnstructuredWordDocumentLoader(filepath)
-            return loader.load()
+            yield from loader.load()
         
         elif extension == ".pptx":
-            # PowerPoint presentations
-            return load_pptx(filepath)
+            # PowerPoint presentations, streamed slide by slide
+            from .pptx_loader import iter_pptx_documents
+            yield from iter_pptx_documents(filepath)
         
         elif extension == ".csv":
-            # CSV files (each row becomes a document)
-            loader = CSVLoader(filepath, encoding="utf-8")
-            return loader.load()
+            # CSV files: rows grouped into size-bounded chunks (or one document
+            # per row in "row" mode), streamed from the mmap
+            if CSV_INGEST_MODE == "row":
+                yield from iter_csv_documents(filepath)
+            else:
+                yield from iter_csv_row_batches(filepath)
         
         else:
-            # Fallback: try to read as text
-            with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-            return [Document(
-                page_content=content,
-                metadata={"source": path.name, "file_type": extension}
-            )]
+            # Text-based files (.txt, .md, .py) and the fallback: memory-mapped text
+            yield from iter_text_documents(filepath)
     
     except Exception as e:
         raise ValueError(f"Failed to load {path.name}: {str(e)}")
 
 
-def upload_document_to_chromadb(filepath: str) -> Dict[str, Any]:
+def load_document(filepath: str) -> List[Document]:
+    """Load document based on file extension"""
+    return list(iter_documents(filepath))
+
+
+def count_source_pages(filepath: str) -> int:
+    """Pages of a PDF or slides of a deck, read without extracting text (0 = other type or unreadable)."""
+    ext = Path(filepath).suffix.lower()
+    try:
+        if ext == ".pdf":
+            from pypdf import PdfReader
+            return len(PdfReader(filepath).pages)
+        if ext == ".pptx":
+            import zipfile
+
+            from .pptx_loader import list_slide_parts
+            with zipfile.ZipFile(filepath) as zf:
+                return len(list_slide_parts(zf))
+    except Exception:
+        return 0
+    return 0
+
+
+def iter_chunks(filepath: str, counts: Optional[Dict[str, int]] = None, **chunking: Any) -> Iterator[Document]:
+    """
+    Split a document into index chunks as it is read; `counts["pages"]` tallies pages/rows.
+    The split depends on the file type (see chunking.py); `chunking` overrides
+    strategy / chunk_tokens / overlap_tokens.
+    """
+    from .chunking import iter_structured_chunks
+
+    def pages() -> Iterator[Document]:
+        for page in iter_documents(filepath):
+            if counts is not None:
+                counts["pages"] = counts.get("pages", 0) + int(page.metadata.get("rows", 1))
+            yield page
+
+    yield from iter_structured_chunks(filepath, pages(), **chunking)
+
+
+def chunk_metadata(path: Path, chunk: Document) -> Dict[str, Any]:
+    return {
+        "source": path.name,
+        "file_type": path.suffix,
+        "page": chunk.metadata.get("page", chunk.metadata.get("slide", 0)),
+        "row": chunk.metadata.get("row", None),  # For CSV
+        "row_end": chunk.metadata.get("row_end", None),
+        # structure from the chunker (markdown heading path, python symbols and lines)
+        **{k: chunk.metadata[k] for k in ("section", "symbol", "line", "line_end")
+           if chunk.metadata.get(k) is not None},
+    }
+
+
+def upload_document_to_chromadb(
+    filepath: str,
+    tenant_id: Optional[str] = None,
+    batch_size: int = UPSERT_BATCH_SIZE,
+    start_batch: int = 0,
+    on_batch: Optional[Callable[[int, int, int], None]] = None,
+) -> Dict[str, Any]:
     """
-    Upload any supported document type to ChromaDB
+    Upload any supported document type to the tenant's ChromaDB collection
     Supported: .pdf, .txt, .md, .docx, .py, .csv, .pptx
+
+    Loading, splitting and upserting are streamed: pages are split as they are
+    read and chunks are upserted in batches of `batch_size`, so memory stays flat
+    regardless of file size. After each batch `on_batch(batches_done,
+    total_batches, chunks_done)` is called so callers can checkpoint
+    (total_batches is 0 while the total is still unknown); `start_batch` skips
+    batches that were already written. Until the last batch, total_batches is
+    extrapolated from the share of pages (PDF, PPTX) or characters (text)
+    consumed so far.
+
+    The tenant's chunk quota is checked before every batch is written. If a
+    later batch would exceed it, the batches already written are deleted
+    again, so no partly indexed document is left behind.
+
+    With near-duplicate detection on (DEDUP_MODE, see dedup.py), chunks that
+    repeat an indexed chunk are stored as references instead of being embedded;
+    the result reports them as `duplicates` / `embeddings_saved`.
     """
     try:
         path = Path(filepath)
-        
-        # Load document
-        pages = load_document(filepath)
-        if not pages:
+        collection = get_collection(tenant_id)
+        batch_size = max(1, int(batch_size))
+
+        dedup = _dedup_index()
+
+        n_chunks = 0
+        duplicates = 0
+        batches_done = 0
+        batch: List[Document] = []
+        counts = {"pages": 0}
+        ext = path.suffix.lower()
+        total_pages = count_source_pages(filepath)
+        size = path.stat().st_size
+        chars = 0
+
+        def estimated_batches() -> int:
+            """Total batches extrapolated from how much of the file was consumed (0 = unknown)."""
+            if total_pages:
+                done = counts["pages"] / total_pages
+            elif ext in _TEXT_EXTENSIONS and size:
+                done = chars / size
+            else:
+                return 0
+            if done <= 0:
+                return 0
+            return max(batches_done + 1, math.ceil(n_chunks / min(done, 1.0) / batch_size))
+
+        def flush(final: bool) -> None:
+            nonlocal batches_done, batch, duplicates
+            if not batch:
+                if final and on_batch and batches_done:
+                    on_batch(batches_done, batches_done, n_chunks)
+                return
+            if batches_done >= start_batch:
+                lo = batches_done * batch_size
+                ids = make_ids(filepath, len(batch), start=lo)
+                documents = [c.page_content for c in batch]
+                metadatas = [chunk_metadata(path, c) for c in batch]
+                plan = None
+                if dedup is not None:
+                    plan = dedup.plan(tenant_id, ids, documents, metadatas, collection=collection)
+                    duplicates += plan.duplicates
+                    ids = [ids[i] for i in plan.keep]
+                    documents = [documents[i] for i in plan.keep]
+                    metadatas = [metadatas[i] for i in plan.keep]
+                if ids:
+                    # quota checked before every write
+                    with CHROMA_SECONDS.time(op="get"):
+                        existing = len(collection.get(ids=ids, include=[])["ids"])
+                    with CHROMA_SECONDS.time(op="count"):
+                        current = collection.count()
+                    try:
+                        check_quota(tenant_id, new_chunks=len(ids) - existing, current_chunks=current)
+                    except TenantQuotaExceeded as e:
+                        if lo:
+                            _remove_source(path, tenant_id, collection, dedup)
+                        raise TenantQuotaExceeded(f"{e}; {path.name} was not indexed") from e
+                    with CHROMA_SECONDS.time(op="upsert"):
+                        collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+                if plan is not None:
+                    dedup.commit(plan)
+            batches_done += 1
+            batch = []
+            if on_batch:
+                on_batch(batches_done, batches_done if final else estimated_batches(), n_chunks)
+
+        for chunk in iter_chunks(filepath, counts):
+            batch.append(chunk)
+            n_chunks += 1
+            chars += len(chunk.page_content)
+            if len(batch) >= batch_size:
+                flush(final=False)
+        flush(final=True)
+        n_pages = counts["pages"]
+
+        if n_chunks == 0:
             return {
                 "success": False,
                 "message": f"No content in {path.suffix} file.",
@@ -127,36 +387,25 @@ def upload_document_to_chromadb(filepath: str) -> Dict[str, Any]:
                 "pages": 0
             }
 
-        # Split into chunks
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        chunks = splitter.split_documents(pages)
-
-        # Prepare data for ChromaDB
-        ids = make_ids(filepath, len(chunks))
-        documents = [c.page_content for c in chunks]
-        metadatas = [
-            {
-                "source": path.name,
-                "file_type": path.suffix,
-                "page": c.metadata.get("page", c.metadata.get("slide", 0)),
-                "row": c.metadata.get("row", None),  # For CSV
-            }
-            for c in chunks
-        ]
-
-        # Upload to ChromaDB
-        client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        collection = client.get_or_create_collection(name=COLLECTION_NAME)
-        collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+        stored = None
+        stale: List[str] = []
+        if dedup is not None:
+            stored, stale = _dedup_ids(dedup, tenant_id, path, n_chunks)
+        _update_catalog(path, tenant_id, collection, n_chunks, n_pages, stored=stored, stale=stale)
+        if dedup is not None:
+            _repair_references(dedup, tenant_id, path, collection)
 
+        message = f"Indexed {path.name} into {collection_name_for(tenant_id)}"
+        if duplicates:
+            message += f" ({duplicates} near-duplicate chunks stored as references instead of embedded)"
         return {
             "success": True,
-            "message": f"Indexed {path.name} into {COLLECTION_NAME}",
-            "chunks": len(chunks),
-            "pages": len(pages),
+            "message": message,
+            "chunks": n_chunks,
+            "pages": n_pages,
+            "batches": batches_done,
+            "duplicates": duplicates,
+            "embeddings_saved": duplicates,
         }
     
     except Exception as e:
@@ -168,5 +417,81 @@ def upload_document_to_chromadb(filepath: str) -> Dict[str, Any]:
         }
 
 
+def _dedup_index():
+    """The near-duplicate index, or None when DEDUP_MODE=off."""
+    from ..dedup import dedup_enabled, get_dedup_index
+
+    return get_dedup_index() if dedup_enabled() else None
+
+
+def _dedup_ids(dedup, tenant_id: Optional[str], path: Path, n_chunks: int):
+    """(embedded chunk count, IDs to delete) once every chunk of `path` went through the index."""
+    previous_ids = dedup.finish_source(tenant_id, path.name, make_ids(str(path), n_chunks))
+    stored, refs = dedup.source_ids(tenant_id, path.name)
+    # an ID that is now a reference may still hold its previous version's embedding
+    stale = sorted((set(previous_ids) | set(refs)) - set(stored))
+    return len(stored), stale
+
+
+def _repair_references(dedup, tenant_id: Optional[str], path: Path, collection) -> None:
+    """Re-check other sources' references to the chunks of a re-indexed file."""
+    try:
+        counts = dedup.repair(tenant_id, path.name, collection)
+        if counts["moved"] or counts["restored"]:
+            print(f"♻️ {path.name}: {counts['moved']} references moved to another copy, "
+                  f"{counts['restored']} re-embedded")
+    except Exception as e:
+        print(f"⚠️ Could not repair near-duplicate references to {path.name}: {e}")
+
+
+def _remove_source(path: Path, tenant_id: Optional[str], collection, dedup=None) -> None:
+    """Delete every chunk and the catalog row of a source that failed part-way through indexing."""
+    try:
+        with CHROMA_SECONDS.time(op="delete"):
+            collection.delete(where={"source": path.name})
+        get_catalog().remove(tenant_id, path.name)
+        if dedup is not None:
+            dedup.forget_source(tenant_id, path.name)
+            _repair_references(dedup, tenant_id, path, collection)
+        print(f"🧹 Removed the partly indexed {path.name}")
+    except Exception as e:
+        print(f"⚠️ Could not remove the partly indexed {path.name}: {e}")
+
+
+def _update_catalog(path: Path, tenant_id: Optional[str], collection, n_chunks: int, n_pages: int,
+                    content_hash: Optional[str] = None, stored: Optional[int] = None,
+                    stale: Sequence[str] = ()) -> None:
+    """
+    Record the source in the catalog and drop chunks left over from a longer
+    previous version (or stored under older IDs). `stored` is the number of
+    chunks actually embedded when near-duplicates were stored as references;
+    `stale` are further IDs to drop.
+    """
+    try:
+        catalog = get_catalog()
+        # only this source's chunks: another file's IDs are never touched. Runs
+        # even without a catalog row so stem-keyed IDs from older uploads go too.
+        keep = set(make_ids(str(path), n_chunks))
+        with CHROMA_SECONDS.time(op="get"):
+            held = collection.get(where={"source": path.name}, include=[])["ids"]
+        drop = list(stale) + [i for i in held if i not in keep]
+        if drop:
+            with CHROMA_SECONDS.time(op="delete"):
+                collection.delete(ids=sorted(set(drop)))
+        stat = path.stat()
+        catalog.record(
+            tenant_id,
+            path.name,
+            chunks=n_chunks if stored is None else stored,
+            pages=n_pages,
+            file_type=path.suffix,
+            nbytes=stat.st_size,
+            content_hash=content_hash or file_sha256(str(path)),
+            mtime=stat.st_mtime,
+        )
+    except Exception as e:
+        print(f"⚠️ Could not update source catalog for {path.name}: {e}")
+
+
 # Backward compatibility aliases
 upload_pdf_to_chromadb = upload_document_to_chromadb
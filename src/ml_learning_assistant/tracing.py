@@ -0,0 +1,391 @@
+"""
+Offline per-stage latency tracing.
+
+Spans cover the request pipeline: the rate-limit wait, crew construction, every
+kickoff and the response cleaning. Listeners on the CrewAI event bus add the
+work done inside a kickoff, meaning agent executions, tool calls and LLM calls
+with token counts. Each finished span is appended as one JSON line to
+TRACE_FILE (default ./data/traces/spans.jsonl). The stats page reads this file
+to draw a waterfall. Nothing is sent to an external service.
+
+Spans are always timed and handed to the listeners (the metrics registry), so
+TRACING_ENABLED=false only stops writing the file; metrics keep working.
+
+The current span is a context variable. The CrewAI event bus runs handlers in
+a copy of the emitting thread's context, so event spans become children of
+the kickoff that emitted them. Code that hands crew work to another thread
+runs it in `contextvars.copy_context()` (API executor, batch pool) to keep the
+trace; work without a current span starts a trace of its own.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("ml_trace_span", default=None)
+_write_lock = threading.Lock()
+_state_lock = threading.Lock()
+# (agent id, task id) -> agent span / pending LLM start
+_agent_spans: Dict[tuple, "Span"] = {}
+_llm_starts: Dict[tuple, Dict[str, Any]] = {}
+_listeners_installed = False
+_span_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def tracing_enabled() -> bool:
+    return os.getenv("TRACING_ENABLED", "true").strip().lower() != "false"
+
+
+def trace_file() -> Path:
+    return Path(os.getenv("TRACE_FILE", "./data/traces/spans.jsonl")).resolve()
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    """One timed stage. Written to the sink when it ends."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attrs")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 start: Optional[float] = None, **attrs: Any):
+        self.trace_id = trace_id
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start if start is not None else time.time()
+        self.end: Optional[float] = None
+        self.attrs: Dict[str, Any] = attrs
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def finish(self, end: Optional[float] = None) -> None:
+        self.end = end if end is not None else time.time()
+        record = self.to_dict()
+        if tracing_enabled():
+            _write(record)
+        for fn in list(_span_listeners):
+            try:
+                fn(record)
+            except Exception as e:
+                print(f"⚠️ Span listener failed: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.time()
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attrs": self.attrs,
+        }
+
+
+def _write(record: Dict[str, Any]) -> None:
+    path = trace_file()
+    line = json.dumps(record, default=str) + "\n"
+    try:
+        with _write_lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists() and path.stat().st_size > TRACE_MAX_BYTES:
+                os.replace(path, path.with_suffix(path.suffix + ".1"))
+            with path.open("a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"⚠️ Could not write trace span: {e}")
+
+
+def add_listener(fn: Callable[[Dict[str, Any]], None]) -> None:
+    """Call `fn(span_record)` for every finished span (e.g. the metrics registry)."""
+    if fn not in _span_listeners:
+        _span_listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[Dict[str, Any]], None]) -> None:
+    """Undo `add_listener` (no-op if `fn` is not registered)."""
+    if fn in _span_listeners:
+        _span_listeners.remove(fn)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def mark_error(error: Any) -> None:
+    """Flag the current span as failed (for errors that are caught and turned into messages)."""
+    s = _current.get()
+    if s is not None:
+        s.set(error=str(error)[:200])
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    Time a block as a child of the current span. With no current span a new
+    trace is started.
+    """
+    parent = _current.get()
+    s = Span(name, trace_id=parent.trace_id if parent else _new_id(),
+             parent_id=parent.span_id if parent else None, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.set(error=str(e)[:200])
+        raise
+    finally:
+        _current.reset(token)
+        s.finish()
+
+
+def record_span(name: str, start: float, end: float, parent: Optional[Span] = None,
+                **attrs: Any) -> Span:
+    """Write an already-finished span (used for event-bus timings)."""
+    parent = parent or _current.get()
+    s = Span(name, trace_id=parent.trace_id if parent else _new_id(),
+             parent_id=parent.span_id if parent else None, start=start, **attrs)
+    s.finish(end)
+    return s
+
+
+def _ts(value: Any) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value or time.time())
+
+
+def _approx_tokens(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, list):
+        value = " ".join(str(m.get("content", "")) if isinstance(m, dict) else str(m) for m in value)
+    return max(0, len(str(value)) // 4)
+
+
+# -----------------------------
+# CrewAI event bus listeners
+# -----------------------------
+def install_crewai_listeners() -> bool:
+    """Subscribe to agent / tool / LLM events once per process."""
+    global _listeners_installed
+    if _listeners_installed:
+        return True
+    try:
+        from crewai.events import (
+            AgentExecutionCompletedEvent,
+            AgentExecutionErrorEvent,
+            AgentExecutionStartedEvent,
+            LLMCallCompletedEvent,
+            LLMCallFailedEvent,
+            LLMCallStartedEvent,
+            MemoryQueryCompletedEvent,
+            MemoryRetrievalCompletedEvent,
+            ToolUsageErrorEvent,
+            ToolUsageFinishedEvent,
+            crewai_event_bus,
+        )
+    except Exception as e:
+        print(f"⚠️ Tracing: CrewAI events unavailable ({e})")
+        return False
+
+    def _agent_key(event) -> tuple:
+        agent = getattr(event, "agent", None)
+        task = getattr(event, "task", None)
+        agent_id = str(getattr(agent, "id", "")) if agent is not None else (event.agent_id or "")
+        task_id = str(getattr(task, "id", "")) if task is not None else (event.task_id or "")
+        return agent_id, task_id
+
+    @crewai_event_bus.on(AgentExecutionStartedEvent)
+    def _on_agent_started(source, event):
+        parent = _current.get()
+        role = str(getattr(event.agent, "role", "agent")).strip()
+        s = Span(f"agent: {role}", trace_id=parent.trace_id if parent else _new_id(),
+                 parent_id=parent.span_id if parent else None, start=_ts(event.timestamp),
+                 kind="agent", agent=role)
+        cutoff = time.time() - 300
+        with _state_lock:
+            # finished agent spans stay resolvable for a while: their last LLM /
+            # tool events can be handled after the agent's completion event
+            for key in [k for k, v in _agent_spans.items() if v.end is not None and v.end < cutoff]:
+                del _agent_spans[key]
+            _agent_spans[_agent_key(event)] = s
+
+    def _end_agent(event, **attrs):
+        with _state_lock:
+            s = _agent_spans.get(_agent_key(event))
+        if s is not None and s.end is None:
+            s.set(**attrs)
+            s.finish(_ts(event.timestamp))
+
+    @crewai_event_bus.on(AgentExecutionCompletedEvent)
+    def _on_agent_completed(source, event):
+        _end_agent(event, output_chars=len(event.output or ""))
+
+    @crewai_event_bus.on(AgentExecutionErrorEvent)
+    def _on_agent_error(source, event):
+        _end_agent(event, error=str(event.error)[:200])
+
+    def _agent_parent(event) -> Optional[Span]:
+        current = _current.get()
+        with _state_lock:
+            for (agent_id, task_id), s in _agent_spans.items():
+                if event.agent_id:
+                    if agent_id == event.agent_id and (not event.task_id or task_id == event.task_id):
+                        return s
+                elif (event.agent_role and current is not None and s.trace_id == current.trace_id
+                      and s.attrs.get("agent") == event.agent_role.strip()):
+                    # tool events do not always carry the agent id: match the role within this trace only
+                    return s
+        return current
+
+    def _usage(source) -> Optional[Dict[str, int]]:
+        try:
+            return source.get_token_usage_summary().model_dump()
+        except Exception:
+            return None
+
+    @crewai_event_bus.on(LLMCallStartedEvent)
+    def _on_llm_started(source, event):
+        with _state_lock:
+            _llm_starts[(event.agent_id, event.task_id, id(source))] = {
+                "start": _ts(event.timestamp), "usage": _usage(source), "prompt": event.messages,
+            }
+
+    def _end_llm(source, event, **attrs):
+        with _state_lock:
+            started = _llm_starts.pop((event.agent_id, event.task_id, id(source)), None)
+        end = _ts(event.timestamp)
+        start = started["start"] if started else end
+        record_span(
+            f"llm: {event.model or getattr(source, 'model', 'llm')}", start, end,
+            parent=_agent_parent(event), kind="llm", agent=event.agent_role, **attrs,
+        )
+
+    @crewai_event_bus.on(LLMCallCompletedEvent)
+    def _on_llm_completed(source, event):
+        with _state_lock:
+            started = _llm_starts.get((event.agent_id, event.task_id, id(source))) or {}
+        before, after = started.get("usage"), _usage(source)
+        if before and after and after.get("total_tokens", 0) > before.get("total_tokens", 0):
+            tokens = {
+                "prompt_tokens": after.get("prompt_tokens", 0) - before.get("prompt_tokens", 0),
+                "completion_tokens": after.get("completion_tokens", 0) - before.get("completion_tokens", 0),
+                "tokens_estimated": False,
+            }
+        else:
+            tokens = {
+                "prompt_tokens": _approx_tokens(started.get("prompt") or event.messages),
+                "completion_tokens": _approx_tokens(event.response),
+                "tokens_estimated": True,
+            }
+        _end_llm(source, event, call_type=getattr(event.call_type, "value", str(event.call_type)), **tokens)
+
+    @crewai_event_bus.on(LLMCallFailedEvent)
+    def _on_llm_failed(source, event):
+        _end_llm(source, event, error=str(event.error)[:200])
+
+    @crewai_event_bus.on(ToolUsageFinishedEvent)
+    def _on_tool_finished(source, event):
+        record_span(
+            f"tool: {event.tool_name}", _ts(event.started_at), _ts(event.finished_at),
+            parent=_agent_parent(event), kind="tool", agent=event.agent_role,
+            from_cache=bool(event.from_cache),
+        )
+
+    @crewai_event_bus.on(ToolUsageErrorEvent)
+    def _on_tool_error(source, event):
+        now = _ts(event.timestamp)
+        record_span(f"tool: {event.tool_name}", now, now, parent=_agent_parent(event),
+                    kind="tool", agent=event.agent_role, error=str(event.error)[:200])
+
+    @crewai_event_bus.on(MemoryRetrievalCompletedEvent)
+    def _on_memory_retrieval(source, event):
+        # whole contextual-memory lookup before an agent runs
+        end = _ts(event.timestamp)
+        record_span("memory_retrieval", end - event.retrieval_time_ms / 1000, end,
+                    parent=_agent_parent(event), kind="memory", source="all",
+                    agent=event.agent_role, chars=len(event.memory_content or ""))
+
+    @crewai_event_bus.on(MemoryQueryCompletedEvent)
+    def _on_memory_query(source, event):
+        end = _ts(event.timestamp)
+        source_type = event.source_type or "memory"
+        record_span(f"memory_query: {source_type}", end - event.query_time_ms / 1000, end,
+                    parent=_agent_parent(event), kind="memory", source=source_type,
+                    results=len(event.results) if isinstance(event.results, list) else None)
+
+    _listeners_installed = True
+    return True
+
+
+# -----------------------------
+# Reading traces back (stats page)
+# -----------------------------
+def load_traces(limit: int = 20, tail_bytes: int = 4 * 1024 * 1024) -> List[Dict[str, Any]]:
+    """
+    Group the most recent spans into traces, newest first. Only the tail of the
+    sink is read so a large file stays cheap.
+    """
+    path = trace_file()
+    if not path.exists():
+        return []
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - tail_bytes))
+        data = f.read().decode("utf-8", errors="ignore")
+    lines = data.splitlines()
+    if size > tail_bytes and lines:
+        lines = lines[1:]  # first line may be cut
+
+    by_trace: Dict[str, List[Dict[str, Any]]] = {}
+    for line in lines:
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        by_trace.setdefault(rec["trace_id"], []).append(rec)
+
+    traces = []
+    for trace_id, spans in by_trace.items():
+        spans.sort(key=lambda s: s["start"])
+        roots = [s for s in spans if not s.get("parent_id")]
+        root = roots[0] if roots else spans[0]
+        start = min(s["start"] for s in spans)
+        end = max(s["start"] + s["duration_ms"] / 1000 for s in spans)
+        traces.append({
+            "trace_id": trace_id,
+            "name": root["name"],
+            "start": start,
+            "duration_ms": round((end - start) * 1000, 3),
+            "spans": spans,
+        })
+    traces.sort(key=lambda t: t["start"], reverse=True)
+    return traces[:limit]
+
+
+def span_depths(spans: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Nesting depth of every span in a trace (for indenting the waterfall)."""
+    parents = {s["span_id"]: s.get("parent_id") for s in spans}
+    depths: Dict[str, int] = {}
+    for sid in parents:
+        depth, cur, seen = 0, parents.get(sid), set()
+        while cur and cur in parents and cur not in seen:
+            seen.add(cur)
+            depth += 1
+            cur = parents[cur]
+        depths[sid] = depth
+    return depths
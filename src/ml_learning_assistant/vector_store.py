@@ -0,0 +1,131 @@
+"""
+Pluggable vector-store backends.
+
+All document collections come from `tenancy.get_collection()`, which asks the
+configured `VectorStore` for them. VECTOR_STORE selects the backend:
+
+* `http` (default): a Chroma server at CHROMA_HOST:CHROMA_PORT, for clustered
+  deployments and for several processes sharing one index (app, API workers,
+  ingest CLI).
+* `persistent`: Chroma embedded in the process, storing to CHROMA_DB_PATH.
+  There is no HTTP hop or JSON serialization per query and per upsert. Only
+  one process may open the directory at a time, so this suits single-node
+  setups that run the app or a single API worker.
+* `local`: the in-process NumPy engine in local_vector_store.py, storing to
+  LOCAL_VECTOR_DIR. Search is exact, run as blocked matrix products over
+  memory-mapped vectors; above LOCAL_HNSW_THRESHOLD chunks an HNSW graph is
+  used if hnswlib is installed. Single process, like `persistent`.
+
+Collections returned by a store support the part of the Chroma Collection API
+the app uses: `add`, `upsert`, `get`, `query`, `delete`, `count`. Every
+backend computes embeddings client side with the same embedding function, so
+a snapshot taken in one mode restores into the other (snapshot.py).
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+VECTOR_STORE_MODES = ("http", "persistent", "local")
+
+
+class VectorStore(ABC):
+    """Where tenant collections live."""
+
+    mode = "custom"
+
+    @abstractmethod
+    def collection(self, name: str, embedding_function: Any = None) -> Any:
+        """Get or create the named collection."""
+
+    @abstractmethod
+    def delete_collection(self, name: str) -> None:
+        """Drop the named collection; raises if it does not exist."""
+
+    def max_batch_size(self) -> int:
+        return 5000
+
+    def heartbeat(self) -> bool:
+        return True
+
+    def describe(self) -> Dict[str, str]:
+        return {"mode": self.mode}
+
+
+class ChromaVectorStore(VectorStore):
+    """A Chroma client: HTTP server, embedded persistent, or any client passed in."""
+
+    def __init__(self, client: Any, mode: str = "custom", location: str = ""):
+        self.client = client
+        self.mode = mode
+        self.location = location
+
+    @classmethod
+    def http(cls, host: Optional[str] = None, port: Optional[int] = None) -> "ChromaVectorStore":
+        import chromadb
+
+        host = host or os.getenv("CHROMA_HOST", "chromadb")
+        port = int(port or os.getenv("CHROMA_PORT", "8000"))
+        return cls(chromadb.HttpClient(host=host, port=port), mode="http", location=f"{host}:{port}")
+
+    @classmethod
+    def persistent(cls, path: Optional[str] = None) -> "ChromaVectorStore":
+        import chromadb
+        from chromadb.config import Settings
+
+        path = os.path.abspath(path or os.getenv("CHROMA_DB_PATH", "./data/chroma_db"))
+        os.makedirs(path, exist_ok=True)
+        client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        return cls(client, mode="persistent", location=path)
+
+    def collection(self, name: str, embedding_function: Any = None) -> Any:
+        kwargs = {"embedding_function": embedding_function} if embedding_function is not None else {}
+        return self.client.get_or_create_collection(name=name, **kwargs)
+
+    def delete_collection(self, name: str) -> None:
+        self.client.delete_collection(name)
+
+    def max_batch_size(self) -> int:
+        try:
+            return int(self.client.get_max_batch_size())
+        except Exception:
+            return super().max_batch_size()
+
+    def heartbeat(self) -> bool:
+        try:
+            self.client.heartbeat()
+            return True
+        except Exception:
+            return False
+
+    def describe(self) -> Dict[str, str]:
+        return {"mode": self.mode, "location": self.location}
+
+
+def vector_store_mode() -> str:
+    mode = os.getenv("VECTOR_STORE", "http").strip().lower()
+    if mode not in VECTOR_STORE_MODES:
+        raise ValueError(f"VECTOR_STORE must be one of {', '.join(VECTOR_STORE_MODES)} (got {mode!r})")
+    return mode
+
+
+def configured_location(mode: Optional[str] = None) -> str:
+    """Where the configured backend points, without connecting to it."""
+    mode = (mode or os.getenv("VECTOR_STORE", "http")).strip().lower()
+    if mode == "persistent":
+        return os.path.abspath(os.getenv("CHROMA_DB_PATH", "./data/chroma_db"))
+    if mode == "local":
+        return os.path.abspath(os.getenv("LOCAL_VECTOR_DIR", "./data/vectors"))
+    return f"{os.getenv('CHROMA_HOST', 'chromadb')}:{os.getenv('CHROMA_PORT', '8000')}"
+
+
+def create_vector_store(mode: Optional[str] = None) -> VectorStore:
+    """Backend for `mode` (default: VECTOR_STORE)."""
+    mode = (mode or vector_store_mode()).strip().lower()
+    if mode == "persistent":
+        return ChromaVectorStore.persistent()
+    if mode == "http":
+        return ChromaVectorStore.http()
+    if mode == "local":
+        from .local_vector_store import LocalVectorStore
+        return LocalVectorStore()
+    raise ValueError(f"Unknown vector store {mode!r}")